@@ -22,6 +22,8 @@ from courses.models import (
     EmailTemplateImage,
     CertificateTemplate,
     Coupon,
+    PayPalOrder,
+    WatchProgress,
 )
 
 
@@ -195,6 +197,22 @@ class RunUsersAdmin(admin.ModelAdmin):
     search_fields = ["user__email", "user__first_name", "user__last_name", "user__username"]
 
 
+@admin.register(PayPalOrder)
+class PayPalOrderAdmin(admin.ModelAdmin):
+    list_display = ("order_id", "run_user", "state", "amount", "currency", "attempts", "timestamp_modified")
+    list_filter = ("state",)
+    search_fields = ["order_id", "run_user__user__email"]
+    readonly_fields = ("amount", "currency", "attempts", "error", "event", "timestamp_added", "timestamp_modified")
+
+
+@admin.register(WatchProgress)
+class WatchProgressAdmin(admin.ModelAdmin):
+    list_display = ("run", "user", "lecture", "watched_seconds", "watched_percent", "last_seen")
+    list_filter = ("run",)
+    search_fields = ["user__email", "lecture__title"]
+    raw_id_fields = ("run", "user", "lecture")
+
+
 class CouponUsageInline(admin.TabularInline):
     model = RunUsers
     fields = ("id", "user", "run")
@@ -225,7 +243,7 @@ class RunAdmin(admin.ModelAdmin):
     list_filter = ("start", "manager", "course")
     search_fields = ["title"]
     autocomplete_fields = ["manager"]
-    readonly_fields = ("end",)
+    readonly_fields = ("end", "users_count")
     inlines = (
         MeetingDetailInline,
         RunUsersDetailInline,
@@ -243,7 +261,7 @@ class RunAdmin(admin.ModelAdmin):
     view_submissions_link.short_description = _("Submissions")
 
     def view_users_link(self, obj):
-        count = obj.users.count()
+        count = obj.users_count
         users = ngettext("%(count)d User", "%(count)d Users", count,) % {
             "count": count,
         }
@@ -0,0 +1,143 @@
+from django.db.models import BooleanField, Case, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from courses.app_logic.pagination import get_keyset_page
+from courses.app_logic.watch_progress import watched_percent_expression
+from courses.models import Certificate, Chapter, Lecture, RunUsers, Submission
+from courses.settings import COURSES_ATTENDEES_PAGE_SIZE
+
+# Keyset of each sort, the last field has to be unique
+ATTENDEES_ORDERINGS = {
+    "name": ("user__last_name", "user__first_name", "id"),
+    "email": ("user__email", "id"),
+    "subscribed": ("id",),
+    "-subscribed": ("-id",),
+}
+ATTENDEES_FILTERS = {
+    "passed": ("1", "0"),
+    "payment": ("free", "paid", "unpaid"),
+    "certificate": ("1", "0"),
+}
+
+
+def get_attendees_params(params):
+    """
+    Returns (ordering, filters) of the attendees table from request GET params, invalid values are ignored.
+    """
+    ordering = params.get("sort")
+
+    if ordering not in ATTENDEES_ORDERINGS:
+        ordering = "name"
+
+    filters = {name: params.get(name) for name, choices in ATTENDEES_FILTERS.items() if params.get(name) in choices}
+
+    if params.get("q", "").strip():
+        filters["q"] = params["q"].strip()
+
+    return ordering, filters
+
+
+def count_submitted(run, field, ids):
+    if not ids:
+        # Django does not compile an empty IN (EmptyResultSet), nothing can be submitted anyway
+        return Value(0, output_field=IntegerField())
+
+    return Coalesce(
+        Subquery(
+            Submission.objects_no_relations.filter(run=run, author_id=OuterRef("user_id"), **{f"{field}__in": ids})
+            .order_by()
+            .values("author_id")
+            .annotate(count=Count(field, distinct=True))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def get_attendees(run):
+    """
+    Returns RunUsers of the run annotated with `passed`, `has_certificate` and `watched_percent` (of all the videos),
+    evaluated by the database, so they can be filtered and paginated (same rules as Run.get_eligibility).
+    """
+    required_chapters = list(
+        Chapter.objects_no_relations.filter(course_id=run.course_id)
+        .filter(require_submission__in=("C", "E"))
+        .values_list("id", flat=True)
+    )
+    required_lectures = list(
+        Lecture.objects_no_relations.filter(chapter__course_id=run.course_id)
+        .filter(require_submission__in=("C", "E"))
+        .values_list("id", flat=True)
+    )
+
+    if required_chapters or required_lectures:
+        passed = Case(
+            When(
+                Q(submitted_chapters=len(required_chapters)) & Q(submitted_lectures=len(required_lectures)),
+                then=Value(True),
+            ),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    else:
+        passed = Value(True, output_field=BooleanField())
+
+    return (
+        RunUsers.objects.filter(run=run)
+        .select_related("user", "subscription_level", "discount_coupon")
+        .annotate(
+            submitted_chapters=count_submitted(run, "chapter_id", required_chapters),
+            submitted_lectures=count_submitted(run, "lecture_id", required_lectures),
+            passed=passed,
+            has_certificate=Exists(Certificate.objects_no_relations.filter(run=run, user_id=OuterRef("user_id"))),
+            watched_percent=watched_percent_expression(run),
+        )
+    )
+
+
+def filter_attendees(attendees, filters):
+    if "passed" in filters:
+        attendees = attendees.filter(passed=filters["passed"] == "1")
+
+    if "certificate" in filters:
+        attendees = attendees.filter(has_certificate=filters["certificate"] == "1")
+
+    if filters.get("payment") == "free":
+        attendees = attendees.filter(price=0)
+    elif filters.get("payment") == "paid":
+        attendees = attendees.filter(price__gt=0, payment__gte=F("price"))
+    elif filters.get("payment") == "unpaid":
+        attendees = attendees.filter(payment__lt=F("price"))
+
+    if "q" in filters:
+        for term in filters["q"].split():
+            attendees = attendees.filter(
+                Q(user__username__icontains=term)
+                | Q(user__email__icontains=term)
+                | Q(user__first_name__icontains=term)
+                | Q(user__last_name__icontains=term)
+            )
+
+    return attendees
+
+
+def get_attendees_page(run, ordering="name", filters=None, cursor=None, page_size=COURSES_ATTENDEES_PAGE_SIZE):
+    """
+    Returns (attendees, next_cursor) page of the run's attendees (keyset pagination), next_cursor is None on the last
+    page. Certificates of the page are prefetched to `attendee.certificates`.
+    """
+    attendees, next_cursor = get_keyset_page(
+        filter_attendees(get_attendees(run), filters or {}), ATTENDEES_ORDERINGS[ordering], cursor, page_size
+    )
+
+    certificates = {}
+
+    for certificate in Certificate.objects_no_relations.filter(
+        run=run, user_id__in=[attendee.user_id for attendee in attendees]
+    ):
+        certificates.setdefault(certificate.user_id, []).append(certificate)
+
+    for attendee in attendees:
+        attendee.certificates = certificates.get(attendee.user_id, [])
+
+    return attendees, next_cursor
@@ -0,0 +1,83 @@
+from django.core.files.base import ContentFile
+from django.template import Context
+from django.template.loader import get_template
+
+from wkhtmltopdf.utils import render_pdf_from_template
+
+from courses.app_logic.template_cache import get_compiled_template
+from courses.models import Certificate
+from courses.utils import send_certificate_email
+
+# Only a "blank" template where the real template (CertificateTemplate) is inserted
+CERTIFICATE_WRAPPER_TEMPLATE = "courses/certificate.html"
+CERTIFICATE_PDF_CMD_OPTIONS = {
+    "margin-top": 3,
+}
+
+
+def render_certificate_content(cert):
+    template = get_compiled_template(cert.certificate_template, "html")
+    return template.render(Context({"cert": cert}))
+
+
+def render_certificate_pdf(cert, request=None):
+    """
+    Renders the certificate PDF with wkhtmltopdf and stores it to Certificate.data.
+    """
+    pdf = render_pdf_from_template(
+        get_template(CERTIFICATE_WRAPPER_TEMPLATE),
+        None,
+        None,
+        context={"cert": cert, "cert_content": render_certificate_content(cert)},
+        request=request,
+        cmd_options=CERTIFICATE_PDF_CMD_OPTIONS,
+    )
+
+    if cert.data:
+        cert.data.delete(save=False)
+
+    cert.data.save(f"{cert.uuid}.pdf", ContentFile(pdf), save=False)
+    cert.data_template_modified = cert.certificate_template.timestamp_modified
+    cert.save(update_fields=["data", "data_template_modified"])
+
+    return cert.data
+
+
+def get_certificate_pdf(cert, request=None):
+    """
+    Returns stored certificate PDF, (re-)renders it first if it is missing or the certificate template has changed.
+    """
+    if cert.is_pdf_stale:
+        return render_certificate_pdf(cert, request=request)
+
+    return cert.data
+
+
+def setup_certificate_worker():
+    """
+    Initializer of certificate pipeline worker processes (see generate_certificate --pipeline).
+    """
+    import django
+
+    # No-op in forked workers, configures Django in spawned ones
+    django.setup()
+
+
+def process_generated_certificate(certificate_id, render_pdf=True, notify=True):
+    """
+    Pre-renders the PDF and notifies the user about a freshly generated certificate.
+
+    Runs in a worker process, so only the (picklable) ID is passed. Returns (certificate_id, error message or None).
+    """
+    try:
+        cert = Certificate.objects.select_related("run__course", "certificate_template").get(id=certificate_id)
+
+        if render_pdf and cert.certificate_template:
+            render_certificate_pdf(cert)
+
+        if notify:
+            send_certificate_email(cert)
+    except Exception as e:
+        return certificate_id, f"{e.__class__.__name__}: {e}"
+
+    return certificate_id, None
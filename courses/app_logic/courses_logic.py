@@ -1,7 +1,13 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F, Q, prefetch_related_objects
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from courses.models import Course, Category, Lecture, Chapter, Coupon, RunUsers
+from courses.models import Course, Category, Lecture, Chapter, Coupon, Run, RunUsers, Certificate
 
 
 def get_course(course_slug):
@@ -24,6 +30,130 @@ def get_public_courses(category_slug=None):
     return courses
 
 
+class RunSubscriptionState:
+    """
+    Subscription state of a user in a course run, resolved in bulk by resolve_subscription_states().
+    """
+
+    def __init__(self, user_id, run_users, certificates, course_has_active_runs):
+        self.user_id = user_id
+        self.run_users = run_users
+        self.certificates = certificates
+        self.course_has_active_runs = course_has_active_runs
+
+    @property
+    def subscribed(self):
+        return len(self.run_users) > 0
+
+    @property
+    def payment(self):
+        return sum(run_user.payment for run_user in self.run_users if run_user.payment)
+
+    @property
+    def payment_status(self):
+        """
+        "Free", "Paid" or "Unpaid" (None if user is not subscribed), see courses_extra.check_payment.
+        """
+        if not self.run_users:
+            return None
+
+        price = self.run_users[0].price
+
+        if price == 0:
+            return "Free"
+        elif self.payment >= price:
+            return "Paid"
+        else:
+            return "Unpaid"
+
+
+def resolve_subscription_states(runs, user):
+    """
+    Loads subscriptions, payments and certificates of the user for all the runs in constant number of queries and
+    attaches them to each run as `run.subscription_state` (used by courses_extra template filters).
+    """
+    runs = list(runs)
+    run_ids = [run.id for run in runs]
+    run_users = defaultdict(list)
+    certificates = defaultdict(list)
+
+    if user.is_authenticated:
+        for run_user in RunUsers.objects.filter(run_id__in=run_ids, user=user).order_by("id"):
+            run_users[run_user.run_id].append(run_user)
+
+        for certificate in Certificate.objects_no_relations.filter(run_id__in=run_ids, user=user):
+            certificates[certificate.run_id].append(certificate)
+
+    active_course_ids = set(
+        Run.objects_no_relations.filter(course_id__in={run.course_id for run in runs}, course__state="O")
+        .filter(Q(end__gte=datetime.today()) | Q(end=None))
+        .values_list("course_id", flat=True)
+    )
+
+    prefetch_related_objects(runs, "meeting_set__lecture", "course__chapter_set")
+
+    for run in runs:
+        run.subscription_state = RunSubscriptionState(
+            user_id=user.id,
+            run_users=run_users[run.id],
+            certificates=certificates[run.id],
+            course_has_active_runs=run.course_id in active_course_ids,
+        )
+
+    return runs
+
+
+class Enrollment(RunSubscriptionState):
+    """
+    Enrollment of the request user in a run (the Run and user's RunUsers with subscription levels), loaded once per
+    request by get_enrollment() and reused by verify_payment, views and template filters (as `run.subscription_state`).
+    """
+
+    def __init__(self, run, user):
+        if user.is_authenticated:
+            run_users = list(
+                RunUsers.objects.filter(run=run, user=user).select_related("subscription_level").order_by("id")
+            )
+        else:
+            run_users = []
+
+        # Certificates and active runs are not resolved, filters fall back to their own queries
+        super().__init__(user_id=user.id, run_users=run_users, certificates=None, course_has_active_runs=None)
+        self.run = run
+
+    @property
+    def subscription_levels(self):
+        """
+        List of (RunUsers ID, SubscriptionLevel), same as Run.get_subscription_level().
+        """
+        return [
+            (run_user.id, run_user.subscription_level) for run_user in self.run_users if run_user.subscription_level
+        ]
+
+    @property
+    def unpaid(self):
+        """
+        Whether any of the subscribed levels has not been payed yet.
+        """
+        return any(
+            run_user.subscription_level and run_user.price > run_user.payment for run_user in self.run_users
+        )
+
+
+def get_enrollment(request, run_slug):
+    """
+    Returns Enrollment of the request user in the run (raises Http404 if the run does not exist). It is loaded only
+    once per request, following calls (eg. decorator and then the view) reuse it.
+    """
+    enrollments = request.__dict__.setdefault("courses_enrollments", {})
+
+    if run_slug not in enrollments:
+        run = get_object_or_404(Run, slug=run_slug)
+        enrollments[run_slug] = run.subscription_state = Enrollment(run, request.user)
+
+    return enrollments[run_slug]
+
+
 class DuplicateCourse:
     def __init__(self, course):
         self.course = course
@@ -77,20 +207,47 @@ class ApplyCoupon:
         if coupon.valid_to < timezone.now().date():
             raise CouponNotValidException(_("Specified coupon is not valid anymore."))
 
-        if coupon.count_usages() >= coupon.limit:
+        if coupon.usages_count >= coupon.limit:
             raise CouponNotValidException(_("Specified coupon is not valid anymore."))
 
         if self.run_user.discount_coupon or self.run_user.price_before_discount:
             raise CouponAlreadyAppliedException(_("A discount has already been applied to this registration."))
 
-        self.run_user.discount_coupon = coupon
-        self.run_user.price_before_discount = self.run_user.price
+        price_before_discount = self.run_user.price
 
         if coupon.discount_type == coupon.FLAT_DISCOUNT:
-            self.run_user.price = max(0, self.run_user.price - coupon.discount)
+            price = max(0, price_before_discount - coupon.discount)
         elif coupon.discount_type == coupon.PERCENTAGE_DISCOUNT:
-            self.run_user.price = self.run_user.price * (100-coupon.discount)/100
-
-        self.run_user.price = round(self.run_user.price, 2)  # round to two decimal places
+            price = price_before_discount * (100-coupon.discount)/100
+        else:
+            price = price_before_discount
+
+        price = round(price, 2)  # round to two decimal places
+
+        # Checks above are repeated as conditional UPDATEs, concurrent checkouts can not over-redeem the coupon
+        # (nor apply two coupons to one registration). Exception rolls back the whole redemption.
+        with transaction.atomic():
+            redeemed = Coupon.objects.filter(id=coupon.id, usages_count__lt=F("limit")).update(
+                usages_count=F("usages_count") + 1
+            )
+
+            if not redeemed:
+                raise CouponNotValidException(_("Specified coupon is not valid anymore."))
+
+            applied = (
+                RunUsers.objects.filter(id=self.run_user.id, discount_coupon__isnull=True)
+                .filter(Q(price_before_discount__isnull=True) | Q(price_before_discount=0))
+                .update(
+                    discount_coupon=coupon,
+                    price_before_discount=price_before_discount,
+                    price=price,
+                    timestamp_modified=timezone.now(),
+                )
+            )
+
+            if not applied:
+                raise CouponAlreadyAppliedException(_("A discount has already been applied to this registration."))
 
-        self.run_user.save()
+        self.run_user.discount_coupon = coupon
+        self.run_user.price_before_discount = price_before_discount
+        self.run_user.price = price
@@ -0,0 +1,93 @@
+import csv
+
+from courses.app_logic.watch_progress import get_watched_percent
+from courses.models import Certificate, RunUsers
+from courses.settings import COURSES_EXPORT_CHUNK_SIZE
+
+ATTENDEES_HEADER = (
+    "User ID",
+    "Username",
+    "Email",
+    "First Name",
+    "Last Name",
+    "Subscribed",
+    "Subscription Level",
+    "Price",
+    "Price Before Discount",
+    "Payment",
+    "Coupon",
+    "Passed",
+    "Certificate",
+    "Watched (%)",
+)
+
+# Cells starting with these characters are evaluated as formulas by spreadsheet applications
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class Echo:
+    """
+    Pseudo buffer for csv.writer, returns the written row instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_run_attendees(run, chunk_size=COURSES_EXPORT_CHUNK_SIZE):
+    """
+    Yields ATTENDEES_HEADER and a row for each subscription (RunUsers) of the run.
+
+    Per user data (eligibility, certificates and watched percent) is aggregated upfront in a few queries,
+    subscriptions are read with a server-side cursor, so the memory does not grow with the number of rows.
+    """
+    yield ATTENDEES_HEADER
+
+    eligibility = run.get_eligibility()
+    certificates = dict(Certificate.objects.filter(run=run).values_list("user_id", "uuid"))
+    watched_percent = get_watched_percent(run)
+
+    for row in (
+        RunUsers.objects.filter(run=run)
+        .order_by("id")
+        .values_list(
+            "user_id",
+            "user__username",
+            "user__email",
+            "user__first_name",
+            "user__last_name",
+            "timestamp_added",
+            "subscription_level__title",
+            "price",
+            "price_before_discount",
+            "payment",
+            "discount_coupon__title",
+        )
+        .iterator(chunk_size=chunk_size)
+    ):
+        user_id = row[0]
+        user_eligibility = eligibility.get(user_id)
+
+        yield row + (
+            bool(user_eligibility and user_eligibility.passed),
+            certificates.get(user_id, ""),
+            watched_percent.get(user_id, 0),
+        )
+
+
+def escape_formula(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+
+    return value
+
+
+def iter_csv(rows):
+    """
+    Yields the rows encoded as CSV lines (with a BOM, so spreadsheet applications detect UTF-8).
+    """
+    writer = csv.writer(Echo())
+    yield "\ufeff"
+
+    for row in rows:
+        yield writer.writerow(["" if value is None else escape_formula(value) for value in row])
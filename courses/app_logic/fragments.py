@@ -0,0 +1,131 @@
+import hashlib
+import time
+
+from datetime import date, datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+from courses.app_logic.courses_logic import get_enrollment
+from courses.settings import COURSES_FRAGMENT_CACHE_TIMEOUT
+
+CONTENT_VERSION_CACHE_KEY = "courses:content_version:{course_id}"
+FRAGMENT_CACHE_KEY = "courses:fragment:{digest}"
+
+
+def get_content_version(course_id):
+    """
+    Version (timestamp in milliseconds) of the last change of the course content: course, its runs, chapters,
+    lectures and FAQs. Bumped by courses.signals.
+    """
+    cache_key = CONTENT_VERSION_CACHE_KEY.format(course_id=course_id)
+    version = cache.get(cache_key)
+
+    if version is None:
+        version = int(time.time() * 1000)
+
+        # Another process might have set it meanwhile
+        if not cache.add(cache_key, version, None):
+            version = cache.get(cache_key, version)
+
+    return version
+
+
+def bump_content_version(course_id):
+    cache_key = CONTENT_VERSION_CACHE_KEY.format(course_id=course_id)
+    # Strictly increasing even for changes within the same millisecond
+    version = max(int(time.time() * 1000), (cache.get(cache_key) or 0) + 1)
+    cache.set(cache_key, version, None)
+
+
+def get_fragment_digest(name, enrollment):
+    """
+    Digest of everything a run tab fragment depends on: the run, content version of its course, enrollment state of
+    the user, language and date (chapters are unlocked day by day).
+    """
+    run = enrollment.run
+    parts = (
+        name,
+        run.id,
+        get_content_version(run.course_id),
+        enrollment.subscribed,
+        get_language(),
+        date.today().isoformat(),
+    )
+
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def get_fragment(name, enrollment, render_fragment):
+    """
+    Returns the rendered run tab fragment from cache, `render_fragment()` is called only on a miss.
+    """
+    cache_key = FRAGMENT_CACHE_KEY.format(digest=get_fragment_digest(name, enrollment))
+    content = cache.get(cache_key)
+
+    if content is None:
+        content = render_fragment()
+        cache.set(cache_key, content, COURSES_FRAGMENT_CACHE_TIMEOUT)
+
+    return content
+
+
+def render_run_tab(request, name, enrollment, get_context, template_name, partial_template_name):
+    """
+    Renders the run tab view, htmx partial is served from the fragment cache (context is not even built on a hit).
+    """
+    if not request.GET.get("partial", False):
+        return render(request, template_name, get_context())
+
+    response = HttpResponse(
+        get_fragment(name, enrollment, lambda: render_to_string(partial_template_name, get_context(), request))
+    )
+    # Browser has to revalidate (ETag) before reusing it, shared caches must not store it at all
+    patch_cache_control(response, private=True, no_cache=True)
+
+    return response
+
+
+def run_tab_condition(name):
+    """
+    Decorator of htmx run tab views, adds ETag and Last-Modified to partial responses and answers conditional
+    requests with 304 Not Modified. Full pages (with messages, user menu...) are always rendered.
+    """
+
+    def etag(request, run_slug, **kwargs):
+        if not request.GET.get("partial", False):
+            return None
+
+        return f'"{get_fragment_digest(name, get_enrollment(request, run_slug))}"'
+
+    def last_modified(request, run_slug, **kwargs):
+        if not request.GET.get("partial", False):
+            return None
+
+        version = get_content_version(get_enrollment(request, run_slug).run.course_id)
+        modified = datetime.fromtimestamp(version / 1000, tz=timezone.utc)
+        # Chapters are unlocked day by day
+        today = datetime.combine(date.today(), datetime.min.time()).astimezone(timezone.utc)
+
+        return max(modified, today)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+async def render_run_tab_async(request, name, enrollment, get_context, template_name, partial_template_name):
+    """
+    Async variant of a run tab view (render_run_tab decorated by run_tab_condition). Conditional request, fragment
+    cache and rendering all touch the database or cache, so they are run in one thread (sync_to_async).
+    """
+
+    @run_tab_condition(name)
+    def view(request, run_slug):
+        return render_run_tab(request, name, enrollment, get_context, template_name, partial_template_name)
+
+    return await sync_to_async(view)(request, run_slug=enrollment.run.slug)
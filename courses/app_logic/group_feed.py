@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.utils.translation import get_language
+
+from courses.app_logic.fragments import get_content_version
+from courses.app_logic.pagination import get_keyset_page
+from courses.models import Submission
+from courses.settings import COURSES_FRAGMENT_CACHE_TIMEOUT, COURSES_GROUP_PAGE_SIZE
+from courses.utils import submissions_get_video_links
+
+GROUP_FEED_CACHE_KEY = "courses:group_feed:{run_id}"
+
+
+def get_group_submissions(run):
+    """
+    Public project submissions of the run ("My group" feed).
+    """
+    if not run.allow_public_submission:
+        return Submission.objects.none()
+
+    return (
+        Submission.objects.filter(run=run)
+        .filter(lecture__public_submission=True)
+        .filter(lecture__lecture_type="P")
+        .select_related("lecture__chapter", "author__profile")
+    )
+
+
+def get_group_page(run, cursor=None, page_size=COURSES_GROUP_PAGE_SIZE):
+    """
+    Returns (submissions, next_cursor) page of the group feed, newest first (IDs follow the time of submission).
+    """
+    submissions, next_cursor = get_keyset_page(get_group_submissions(run), ("-id",), cursor, page_size)
+
+    return submissions_get_video_links(submissions), next_cursor
+
+
+def get_group_first_page(run, render_page):
+    """
+    Returns the rendered first page of the group feed from cache, `render_page()` is called only on a miss.
+    Cache is dropped by saving or deleting any submission of the run (see courses.signals).
+    """
+    cache_key = GROUP_FEED_CACHE_KEY.format(run_id=run.id)
+    # Course content (eg. lecture public_submission) and language are checked too
+    version = (get_content_version(run.course_id), get_language())
+    cached = cache.get(cache_key)
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    content = render_page()
+    cache.set(cache_key, (version, content), COURSES_FRAGMENT_CACHE_TIMEOUT)
+
+    return content
+
+
+def invalidate_group_feed(run_id):
+    cache.delete(GROUP_FEED_CACHE_KEY.format(run_id=run_id))
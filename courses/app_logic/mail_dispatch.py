@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from django.core.mail import get_connection
+from django.db import connections
+
+from courses.utils import construct_templated_email
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, allows bursts of up to `capacity` tokens and `rate` tokens per second on average.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.timestamp = monotonic()
+
+    def consume(self, tokens=1):
+        while True:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+
+            sleep((tokens - self.tokens) / self.rate)
+
+
+class DispatchResult:
+    def __init__(self, user, success, error=None):
+        self.user = user
+        self.success = success
+        self.error = error
+
+
+class MailDispatcher:
+    """
+    Collects templated emails and sends them in batches, each batch over one (reused) email backend connection.
+
+    Messages are rendered in a pool of `workers` threads while the already rendered ones are being sent. Sending is
+    rate limited by a token bucket (`rate` emails per second, unlimited if None). The limit is applied between the
+    batches (a connection is never held open while waiting), so batches are not bigger than the bucket capacity.
+    """
+
+    def __init__(self, workers=1, batch_size=100, rate=None):
+        self.workers = workers
+        self.bucket = TokenBucket(rate) if rate else None
+        self.batch_size = min(batch_size, int(self.bucket.capacity)) if self.bucket else batch_size
+        self.queue = []
+
+    def add(self, user, mail_subject, mail_body_html, template_variables):
+        self.queue.append((user, mail_subject, mail_body_html, dict(template_variables)))
+
+    def render(self, item):
+        user, mail_subject, mail_body_html, template_variables = item
+
+        try:
+            return (
+                user,
+                construct_templated_email(
+                    user,
+                    mail_subject=mail_subject,
+                    mail_body_html=mail_body_html,
+                    template_variables=template_variables,
+                ),
+                None,
+            )
+        except Exception as e:
+            return user, None, e
+        finally:
+            # Worker threads have their own DB connections (if template touches DB)
+            if self.workers > 1:
+                connections.close_all()
+
+    def rendered(self):
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                yield from executor.map(self.render, self.queue)
+        else:
+            yield from map(self.render, self.queue)
+
+    def send_batch(self, batch):
+        results = []
+
+        if self.bucket:
+            self.bucket.consume(len(batch))
+
+        with get_connection() as connection:
+            for user, email_message in batch:
+                try:
+                    sent = connection.send_messages([email_message])
+                except Exception as e:
+                    results.append(DispatchResult(user, False, e))
+                else:
+                    results.append(DispatchResult(user, bool(sent)))
+
+        return results
+
+    def dispatch(self):
+        """
+        Renders and sends all queued emails, returns list of DispatchResult (one per recipient).
+        """
+        results = []
+        batch = []
+
+        for user, email_message, error in self.rendered():
+            if error is not None:
+                results.append(DispatchResult(user, False, error))
+                continue
+
+            batch.append((user, email_message))
+
+            if len(batch) >= self.batch_size:
+                results += self.send_batch(batch)
+                batch = []
+
+        if batch:
+            results += self.send_batch(batch)
+
+        self.queue = []
+
+        return results
@@ -0,0 +1,67 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        return None
+
+    if not isinstance(values, list) or len(values) != length:
+        return None
+
+    return values
+
+
+def seek(queryset, fields, values):
+    """
+    Keyset condition, rows following the one with `values` in `fields` ordering:
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)...
+    """
+    condition = Q()
+
+    for i, field in enumerate(fields):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        equal = {other.lstrip("-"): value for other, value in zip(fields[:i], values[:i])}
+        condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+
+    return queryset.filter(condition)
+
+
+def get_value(instance, path):
+    for name in path.split("__"):
+        instance = getattr(instance, name)
+
+    return instance
+
+
+def get_keyset_page(queryset, fields, cursor=None, page_size=20):
+    """
+    Returns (items, next_cursor) page of the queryset ordered by `fields` (keyset pagination), next_cursor is None on
+    the last page. The last of the fields has to be unique and values of all the fields JSON serializable.
+    """
+    values = decode_cursor(cursor, len(fields)) if cursor else None
+
+    if values is not None:
+        try:
+            queryset = seek(queryset, fields, values)
+        except (TypeError, ValueError):
+            # Tampered cursor, start from the first page
+            pass
+
+    items = list(queryset.order_by(*fields)[: page_size + 1])
+    next_cursor = None
+
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([get_value(items[-1], field.lstrip("-")) for field in fields])
+
+    return items, next_cursor
@@ -0,0 +1,200 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from invoices.models import PaymentProfile
+
+from courses.app_logic.paypal import PayPalClient, PayPalError
+from courses.models import PayPalOrder, RunUsers
+from courses.settings import COURSES_PAYPAL_MAX_ATTEMPTS, COURSES_PAYPAL_WEBHOOK_IDS
+
+logger = logging.getLogger(__name__)
+
+# Webhook events of an order being paid, their resource is the order (or the capture)
+PAYPAL_ORDER_EVENTS = ("CHECKOUT.ORDER.APPROVED", "CHECKOUT.ORDER.COMPLETED", "PAYMENT.CAPTURE.COMPLETED")
+
+
+def get_event_order(event):
+    """
+    Returns (order_id, reference_id) of a (verified) PayPal webhook event, or None if the event is not about a paid
+    order. The order is verified by PayPal API before it is paid anyway.
+    """
+    if not isinstance(event, dict) or event.get("event_type") not in PAYPAL_ORDER_EVENTS:
+        return None
+
+    resource = event.get("resource") or {}
+
+    if event["event_type"] == "PAYMENT.CAPTURE.COMPLETED":
+        order_id = ((resource.get("supplementary_data") or {}).get("related_ids") or {}).get("order_id")
+        reference_id = None
+    else:
+        order_id = resource.get("id")
+        reference_id = ((resource.get("purchase_units") or [{}])[0]).get("reference_id")
+
+    if not order_id or not isinstance(order_id, str):
+        return None
+
+    return order_id[:64], reference_id
+
+
+def verify_paypal_webhook(payment_profile_id, headers, body):
+    """
+    Returns whether the webhook event (raw request body) has been sent by PayPal to the webhook configured for the
+    PaymentProfile (see COURSES_PAYPAL_WEBHOOK_IDS). Raises PayPalError if PayPal API is not available.
+    """
+    webhook_id = COURSES_PAYPAL_WEBHOOK_IDS.get(payment_profile_id)
+
+    if not webhook_id:
+        return False
+
+    paypal = PayPalClient.from_payment_profile(PaymentProfile.objects.filter(id=payment_profile_id).first())
+
+    if paypal is None:
+        return False
+
+    return paypal.verify_webhook_signature(webhook_id, headers, body)
+
+
+def record_paypal_order(order_id, run_user_id=None, event=None):
+    """
+    Stores the order in the ledger (once, repeated webhooks and browser verifications are deduplicated by order ID),
+    returns the PayPalOrder. Order reported by the browser is paired with the RunUser only if it is not paired yet,
+    (verified) webhook event pairs a pending order even if it has been paired with a different RunUser.
+    """
+    defaults = {"run_user_id": run_user_id, "event": event}
+
+    try:
+        with transaction.atomic():
+            paypal_order, created = PayPalOrder.objects.get_or_create(order_id=order_id, defaults=defaults)
+    except IntegrityError:
+        # Webhook and browser reported the same order at once
+        paypal_order, created = PayPalOrder.objects.get(order_id=order_id), False
+
+    if not created:
+        changed = {}
+
+        if run_user_id and not paypal_order.run_user_id:
+            changed["run_user_id"] = run_user_id
+        elif (
+            run_user_id
+            and event is not None
+            and paypal_order.run_user_id != run_user_id
+            and paypal_order.state == PayPalOrder.PENDING
+        ):
+            # Browser reported the order for a different RunUser, the (verified) event carries the RunUser the order
+            # has been created for, so the order is verified again from scratch
+            changed.update(run_user_id=run_user_id, attempts=0, error=None)
+        if event is not None:
+            changed["event"] = event
+
+        if changed:
+            PayPalOrder.objects.filter(id=paypal_order.id).update(**changed, timestamp_modified=timezone.now())
+            paypal_order.refresh_from_db()
+
+    return paypal_order
+
+
+def record_paypal_event(event):
+    """
+    Stores the order of a webhook event (verified by verify_paypal_webhook) in the ledger, returns the PayPalOrder or
+    None if the event is ignored.
+    """
+    event_order = get_event_order(event)
+
+    if event_order is None:
+        return None
+
+    order_id, reference_id = event_order
+    run_user_id = None
+
+    if reference_id is not None and str(reference_id).isdigit():
+        run_user_id = RunUsers.objects.filter(id=int(reference_id)).values_list("id", flat=True).first()
+
+    return record_paypal_order(order_id, run_user_id=run_user_id, event=event)
+
+
+def fail(paypal_order, error, final=False):
+    """
+    Records the error, order stays pending (will be retried) until it fails COURSES_PAYPAL_MAX_ATTEMPTS times.
+    """
+    paypal_order.attempts = F("attempts") + 1
+    paypal_order.error = error
+    paypal_order.save(update_fields=["attempts", "error", "timestamp_modified"])
+    paypal_order.refresh_from_db(fields=["attempts"])
+
+    if final or paypal_order.attempts >= COURSES_PAYPAL_MAX_ATTEMPTS:
+        PayPalOrder.objects.filter(id=paypal_order.id, state=PayPalOrder.PENDING).update(state=PayPalOrder.FAILED)
+        paypal_order.state = PayPalOrder.FAILED
+        logger.error("PayPal Order %s failed: %s", paypal_order.order_id, error)
+
+    return False
+
+
+def process_paypal_order(paypal_order):
+    """
+    Verifies the pending order with PayPal API and updates the RunUser payment. Idempotent, the payment is stored
+    only by the process that completes the order. Returns whether the order has been completed.
+    """
+    if paypal_order.state != PayPalOrder.PENDING:
+        return paypal_order.state == PayPalOrder.COMPLETED
+
+    if not paypal_order.run_user_id:
+        # Webhook of a capture event does not carry reference_id, the order is paired once the browser reports it
+        return False
+
+    run_user = RunUsers.objects.select_related("run__course__payment_profile").get(id=paypal_order.run_user_id)
+    paypal = PayPalClient.from_payment_profile(run_user.run.course.payment_profile)
+
+    if paypal is None:
+        return fail(paypal_order, "PayPal is not configured.", final=True)
+
+    try:
+        order = paypal.get_order(paypal_order.order_id)
+    except PayPalError as e:
+        return fail(paypal_order, str(e))
+
+    if not order.get("purchase_units"):
+        return fail(paypal_order, f"Invalid order: {order}")
+
+    purchase_unit = order["purchase_units"][0]
+
+    # RunUsers.id == reference_id
+    if str(purchase_unit.get("reference_id")) != str(run_user.id):
+        # Order has been reported for a different RunUser (eg. someone else's order ID), it is not an attempt of the
+        # order. Order is unpaired, so its webhook event or its own RunUser's browser can pair it again.
+        PayPalOrder.objects.filter(id=paypal_order.id, state=PayPalOrder.PENDING, run_user_id=run_user.id).update(
+            run_user=None,
+            error=f"Order reference_id {purchase_unit.get('reference_id')} does not match RunUser ID {run_user.id}.",
+            timestamp_modified=timezone.now(),
+        )
+        paypal_order.refresh_from_db()
+
+        return False
+
+    if order.get("status") != "COMPLETED":
+        return fail(paypal_order, f"Order is {order.get('status')}.")
+
+    amount = float(purchase_unit["amount"]["value"])
+    currency = purchase_unit["amount"].get("currency_code")
+
+    with transaction.atomic():
+        completed = PayPalOrder.objects.filter(id=paypal_order.id, state=PayPalOrder.PENDING).update(
+            state=PayPalOrder.COMPLETED, amount=amount, currency=currency, error=None, timestamp_modified=timezone.now()
+        )
+
+        if completed:
+            RunUsers.objects.filter(id=run_user.id).update(payment=amount, timestamp_modified=timezone.now())
+
+    paypal_order.refresh_from_db()
+
+    if completed:
+        logger.info(
+            "PayPal Order %s was matched with RunUser ID %s and updated with payment of %s %s",
+            paypal_order.order_id,
+            run_user.id,
+            amount,
+            currency,
+        )
+
+    return paypal_order.state == PayPalOrder.COMPLETED
@@ -0,0 +1,171 @@
+import json
+import logging
+
+from threading import Lock
+from urllib.parse import quote
+
+import requests
+
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from courses.settings import COURSES_PAYPAL_RETRIES, COURSES_PAYPAL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_CACHE_KEY = "courses:paypal_token:{client_id}"
+# Token is dropped from cache a bit sooner than it expires at PayPal
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+# Headers of webhook events required to verify their signature (see PayPalClient.verify_webhook_signature)
+WEBHOOK_SIGNATURE_HEADERS = {
+    "auth_algo": "PayPal-Auth-Algo",
+    "cert_url": "PayPal-Cert-Url",
+    "transmission_id": "PayPal-Transmission-Id",
+    "transmission_sig": "PayPal-Transmission-Sig",
+    "transmission_time": "PayPal-Transmission-Time",
+}
+
+_session = None
+_session_lock = Lock()
+
+
+class PayPalError(Exception):
+    pass
+
+
+def get_session():
+    """
+    Process wide requests.Session, connections (and TLS sessions) to PayPal are kept alive and reused.
+    Failed connections and 429/5xx responses are retried with a backoff.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=COURSES_PAYPAL_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "POST"),
+                raise_on_status=False,
+            )
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=10))
+            session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=10))
+            _session = session
+
+    return _session
+
+
+class PayPalClient:
+    """
+    Client of PayPal REST API, OAuth access tokens are cached (keyed by client_id) until they expire.
+    """
+
+    def __init__(self, base_url, client_id, secret, session=None, timeout=COURSES_PAYPAL_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id
+        self.secret = secret
+        self.session = session or get_session()
+        self.timeout = timeout
+
+    @classmethod
+    def from_payment_profile(cls, payment_profile):
+        """
+        Returns client of the PayPal configured in the PaymentProfile, or None if it is not configured (or disabled).
+        """
+        paypal = payment_profile.paypal if payment_profile else None
+
+        if not paypal or not paypal.enabled or not paypal.base_url or not paypal.client_id or not paypal.secret:
+            return None
+
+        return cls(paypal.base_url, paypal.client_id, paypal.secret)
+
+    @property
+    def token_cache_key(self):
+        return ACCESS_TOKEN_CACHE_KEY.format(client_id=self.client_id)
+
+    def send(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            logger.warning("PayPal request %s %s failed: %s", method, path, e)
+            raise PayPalError(str(e)) from e
+
+        return response
+
+    def get_access_token(self):
+        token = cache.get(self.token_cache_key)
+
+        if token is not None:
+            return token
+
+        response = self.send(
+            "POST",
+            "/v1/oauth2/token",
+            auth=(self.client_id, self.secret),
+            data={"grant_type": "client_credentials"},
+        )
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+
+        if "access_token" not in data:
+            raise PayPalError(f"Access token missing (HTTP {response.status_code}).")
+
+        expires_in = int(data.get("expires_in", 0)) - ACCESS_TOKEN_EXPIRY_MARGIN
+
+        if expires_in > 0:
+            cache.set(self.token_cache_key, data["access_token"], expires_in)
+
+        return data["access_token"]
+
+    def request(self, method, path, headers=None, **kwargs):
+        """
+        Authorized API request, returns the decoded JSON response. Revoked (cached) token is renewed once.
+        """
+        for _attempt in range(2):
+            request_headers = {
+                **(headers or {}),
+                "Accept": "application/json",
+                "Authorization": f"Bearer {self.get_access_token()}",
+            }
+            response = self.send(method, path, headers=request_headers, **kwargs)
+
+            if response.status_code != 401:
+                break
+
+            cache.delete(self.token_cache_key)
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise PayPalError(f"Invalid response (HTTP {response.status_code}).") from e
+
+    def get_order(self, order_id):
+        return self.request("GET", f"/v2/checkout/orders/{quote(order_id, safe='')}")
+
+    def verify_webhook_signature(self, webhook_id, headers, body):
+        """
+        Verifies the signature of a webhook event (raw request body) with PayPal API, returns whether it is valid.
+        """
+        data = {key: headers.get(header) for key, header in WEBHOOK_SIGNATURE_HEADERS.items()}
+
+        if not all(data.values()):
+            return False
+
+        data["webhook_id"] = webhook_id
+        # Event is passed as it has been received, re-encoding it could change it and break the signature
+        payload = json.dumps(data)[:-1] + ', "webhook_event": ' + body.decode(errors="replace") + "}"
+
+        response = self.request(
+            "POST",
+            "/v1/notifications/verify-webhook-signature",
+            headers={"Content-Type": "application/json"},
+            data=payload.encode(),
+        )
+
+        return response.get("verification_status") == "SUCCESS"
@@ -0,0 +1,39 @@
+from courses import settings as course_settings
+
+
+class RunSettings:
+    """
+    Settings of a Run merged once from: Run metadata options > Course metadata options > courses.settings.
+
+    Settings are accessed as attributes (eg. `run.settings.COURSES_SHOW_FUTURE_CHAPTERS`), a resolved setting is
+    stored on the instance, so following lookups are plain attribute access.
+    """
+
+    def __init__(self, run):
+        self._options = {}
+
+        for metadata in (run.course.metadata, run.metadata):
+            if metadata and "options" in metadata:
+                self._options.update(metadata["options"])
+
+    def __getattr__(self, option):
+        # Called only when the option has not been resolved yet
+        if option.startswith("_"):
+            raise AttributeError(option)
+
+        if option in self._options:
+            value = self._options[option]
+        elif hasattr(course_settings, option):
+            value = getattr(course_settings, option)
+        else:
+            raise AttributeError(f"Unknown setting {option}!")
+
+        setattr(self, option, value)
+
+        return value
+
+    def get(self, option):
+        try:
+            return getattr(self, option)
+        except AttributeError:
+            raise ValueError("Unknown setting!")
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from courses.models import Chapter
+
+CHAPTER_OFFSETS_CACHE_KEY = "courses:chapter_offsets:{course_id}"
+
+
+def get_chapter_offsets(course_id):
+    """
+    Returns {chapter_id: (offset_days, length)} for all chapters of the course.
+
+    Offsets are computed in one pass over the chapters of the course (single query) by following the `previous` links
+    in memory. Result is cached until any chapter of the course is changed (see courses.signals).
+    """
+    cache_key = CHAPTER_OFFSETS_CACHE_KEY.format(course_id=course_id)
+    offsets = cache.get(cache_key)
+
+    if offsets is None:
+        chapters = {
+            chapter_id: (previous_id, length)
+            for chapter_id, previous_id, length in Chapter.objects_no_relations.filter(course_id=course_id)
+            .order_by("order", "id")
+            .values_list("id", "previous_id", "length")
+        }
+        offsets = {}
+
+        for chapter_id in chapters:
+            # Walk back until we hit a chapter with already known offset (or the first chapter)
+            chain = []
+            current_id = chapter_id
+
+            while current_id in chapters and current_id not in offsets and current_id not in chain:
+                chain.append(current_id)
+                current_id = chapters[current_id][0]
+
+            total_days = offsets[current_id][0] + offsets[current_id][1] if current_id in offsets else 0
+
+            for chain_id in reversed(chain):
+                offsets[chain_id] = (total_days, chapters[chain_id][1])
+                total_days += chapters[chain_id][1]
+
+        cache.set(cache_key, offsets, None)
+
+    return offsets
+
+
+def invalidate_chapter_offsets(course_id):
+    cache.delete(CHAPTER_OFFSETS_CACHE_KEY.format(course_id=course_id))
+
+
+class RunSchedule:
+    """
+    Start and end dates of all chapters within the course run.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.offsets = get_chapter_offsets(run.course_id)
+
+    def get_dates(self, chapter, raise_wrong_dates=False):
+        if chapter.id in self.offsets:
+            offset, length = self.offsets[chapter.id]
+        else:
+            # Chapter from different course (e.g. mixed up URL), use its own course to calculate the offset
+            offset, length = get_chapter_offsets(chapter.course_id)[chapter.id]
+
+        start = self.run.start + timedelta(days=offset)
+        end = self.run.start + timedelta(days=offset + length - 1)
+
+        if raise_wrong_dates:
+            Chapter.verify_course_dates(start, end)
+
+        return start, end
+
+    def __getitem__(self, chapter):
+        return self.get_dates(chapter)
@@ -0,0 +1,209 @@
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from courses.models import Chapter, Course, Faq, Lecture, SearchEntry
+from courses.settings import COURSES_SEARCH_MAX_RESULTS
+
+# Only FAQs displayed on the public course page are searchable
+PUBLIC_FAQ_STATES = ("C", "B")
+
+# Created by migration 0028 (only if the SQLite build supports FTS5)
+SQLITE_FTS_TABLE = "courses_searchentry_fts"
+SQLITE_SEARCH_SQL = f"""
+    SELECT entry.id, bm25({SQLITE_FTS_TABLE}, 10.0, 1.0) AS rank
+    FROM {SQLITE_FTS_TABLE}
+    JOIN courses_searchentry entry ON entry.id = {SQLITE_FTS_TABLE}.rowid
+    JOIN courses_course course ON course.id = entry.course_id
+    WHERE {SQLITE_FTS_TABLE} MATCH %s AND course.state = 'O'
+    ORDER BY rank
+    LIMIT %s
+"""
+
+# Same expression as the GIN index created by migration 0028
+POSTGRESQL_DOCUMENT = (
+    "(setweight(to_tsvector('simple', entry.title), 'A') || setweight(to_tsvector('simple', entry.body), 'B'))"
+)
+POSTGRESQL_SEARCH_SQL = f"""
+    SELECT entry.id, ts_rank({POSTGRESQL_DOCUMENT}, query) AS rank
+    FROM courses_searchentry entry
+    JOIN courses_course course ON course.id = entry.course_id, to_tsquery('simple', %s) query
+    WHERE {POSTGRESQL_DOCUMENT} @@ query AND course.state = 'O'
+    ORDER BY rank DESC
+    LIMIT %s
+"""
+
+
+def get_terms(query):
+    return re.findall(r"\w+", query.lower())[:10]
+
+
+def search_sqlite(terms, limit):
+    # Every term is quoted (no FTS5 query syntax from users) and matched as a prefix
+    match = " ".join(f'"{term}"*' for term in terms)
+
+    with connection.cursor() as cursor:
+        cursor.execute(SQLITE_SEARCH_SQL, [match, limit])
+        return cursor.fetchall()
+
+
+def search_postgresql(terms, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRESQL_SEARCH_SQL, [" & ".join(f"{term}:*" for term in terms), limit])
+        return cursor.fetchall()
+
+
+def search_fallback(terms, limit):
+    """
+    Search without full-text index (other databases), entries matching all the terms in the title rank first.
+    """
+    entries = SearchEntry.objects.filter(course__state="O")
+    title_match = Q()
+
+    for term in terms:
+        entries = entries.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        title_match &= Q(title__icontains=term)
+
+    return list(
+        entries.annotate(rank=Case(When(title_match, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        .order_by("-rank", "id")
+        .values_list("id", "rank")[:limit]
+    )
+
+
+def get_backend():
+    if connection.vendor == "postgresql":
+        return search_postgresql
+
+    if connection.vendor == "sqlite" and SQLITE_FTS_TABLE in connection.introspection.table_names():
+        return search_sqlite
+
+    return search_fallback
+
+
+class SearchResults:
+    """
+    Ranked search hits, SearchEntries are loaded only for the sliced part (eg. the page of a Paginator).
+    """
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def __len__(self):
+        return len(self.hits)
+
+    def __getitem__(self, index):
+        hits = self.hits[index] if isinstance(index, slice) else [self.hits[index]]
+        entries = SearchEntry.objects.select_related("course").in_bulk([entry_id for entry_id, _rank in hits])
+
+        return [entries[entry_id] for entry_id, _rank in hits if entry_id in entries]
+
+
+def search(query, limit=COURSES_SEARCH_MAX_RESULTS):
+    """
+    Full-text search in public courses (and their chapters, lectures and FAQs), returns ranked SearchResults.
+    """
+    terms = get_terms(query)
+
+    if not terms:
+        return SearchResults([])
+
+    try:
+        # Savepoint, failed query must not break the outer transaction (PostgreSQL)
+        with transaction.atomic():
+            return SearchResults(get_backend()(terms, limit))
+    except DatabaseError:
+        # eg. FTS5 missing in the SQLite build
+        return SearchResults(search_fallback(terms, limit))
+
+
+def get_document(instance, chapter_course_ids=None):
+    """
+    Returns (kind, course_id, title, body) of the instance, or None if it should not be searchable.
+    Course IDs of lectures are looked up in `chapter_course_ids` ({chapter_id: course_id}) if given.
+    """
+    if isinstance(instance, Course):
+        return "course", instance.id, instance.title, join_text(instance.perex, instance.description)
+
+    if isinstance(instance, Chapter):
+        return "chapter", instance.course_id, instance.title, join_text(instance.perex, instance.description)
+
+    if isinstance(instance, Lecture):
+        if chapter_course_ids is None:
+            course_id = (
+                Chapter.objects_no_relations.filter(id=instance.chapter_id).values_list("course_id", flat=True).first()
+            )
+        else:
+            course_id = chapter_course_ids.get(instance.chapter_id)
+
+        if course_id is None:
+            return None
+
+        return "lecture", course_id, instance.title, join_text(instance.subtitle, instance.description)
+
+    if isinstance(instance, Faq) and instance.state in PUBLIC_FAQ_STATES:
+        return "faq", instance.course_id, instance.question, instance.answer
+
+    return None
+
+
+def join_text(*texts):
+    return "\n".join(text for text in texts if text)
+
+
+def get_kind(instance):
+    return {Course: "course", Chapter: "chapter", Lecture: "lecture", Faq: "faq"}[type(instance)]
+
+
+def index_instance(instance):
+    document = get_document(instance)
+
+    if document is None:
+        remove_instance(instance)
+        return
+
+    kind, course_id, title, body = document
+    SearchEntry.objects.update_or_create(
+        kind=kind, object_id=instance.id, defaults={"course_id": course_id, "title": title[:250], "body": body}
+    )
+
+    if kind == "chapter":
+        # Chapter might have been moved to another course
+        SearchEntry.objects.filter(
+            kind="lecture", object_id__in=Lecture.objects_no_relations.filter(chapter=instance).values("id")
+        ).exclude(course_id=course_id).update(course_id=course_id)
+
+
+def remove_instance(instance):
+    SearchEntry.objects.filter(kind=get_kind(instance), object_id=instance.id).delete()
+
+
+def rebuild_index():
+    """
+    Re-creates all the SearchEntries, returns their count.
+    """
+    chapter_course_ids = dict(Chapter.objects_no_relations.values_list("id", "course_id"))
+    entries = []
+
+    for queryset in (
+        Course.objects_no_relations.all(),
+        Chapter.objects_no_relations.all(),
+        Lecture.objects_no_relations.all(),
+        Faq.objects.all(),
+    ):
+        for instance in queryset.iterator():
+            document = get_document(instance, chapter_course_ids=chapter_course_ids)
+
+            if document is not None:
+                kind, course_id, title, body = document
+                entries.append(
+                    SearchEntry(kind=kind, object_id=instance.id, course_id=course_id, title=title[:250], body=body)
+                )
+
+    # Searches see the old entries until the new ones are committed, failed rebuild keeps the old ones
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+    return len(entries)
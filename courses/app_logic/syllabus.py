@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.db.models import Count, FloatField, Sum
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+from courses.models import Lecture
+
+SYLLABUS_STATS_CACHE_KEY = "courses:syllabus_stats:{course_id}"
+
+
+def get_syllabus_stats(course_id):
+    """
+    Returns {"lecture_count", "lecture_types": {lecture_type: count}, "video_duration"} for all lectures of the course.
+
+    Stats are aggregated in a single query (grouped by lecture type), video duration is summed from the lecture
+    metadata. Result is cached until any chapter or lecture of the course is changed (see courses.signals).
+    """
+    cache_key = SYLLABUS_STATS_CACHE_KEY.format(course_id=course_id)
+    stats = cache.get(cache_key)
+
+    if stats is None:
+        stats = {"lecture_count": 0, "lecture_types": {}, "video_duration": 0}
+
+        for lecture_type, count, video_duration in (
+            Lecture.objects_no_relations.filter(chapter__course_id=course_id)
+            .order_by()
+            .values("lecture_type")
+            .annotate(
+                count=Count("id"),
+                video_duration=Sum(Cast(KeyTextTransform("video_duration", "metadata"), FloatField())),
+            )
+            .values_list("lecture_type", "count", "video_duration")
+        ):
+            stats["lecture_count"] += count
+            stats["lecture_types"][lecture_type] = count
+            stats["video_duration"] += video_duration or 0
+
+        cache.set(cache_key, stats, None)
+
+    return stats
+
+
+def invalidate_syllabus_stats(course_id):
+    cache.delete(SYLLABUS_STATS_CACHE_KEY.format(course_id=course_id))
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from threading import Lock
+
+from django.template import Template
+
+from courses.settings import COURSES_TEMPLATE_CACHE_SIZE
+
+
+class CompiledTemplateCache:
+    """
+    Process level LRU cache of compiled templates stored in DB (EmailTemplate, CertificateTemplate).
+
+    Templates are keyed by (model, pk, timestamp_modified, field) so a changed template is never served from cache,
+    entries of saved/deleted templates are also dropped by courses.signals.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, instance, field):
+        key = (instance._meta.label, instance.pk, instance.timestamp_modified, field)
+
+        with self.lock:
+            if key in self.templates:
+                self.hits += 1
+                self.templates.move_to_end(key)
+                return self.templates[key]
+
+            self.misses += 1
+
+        template = Template(getattr(instance, field))
+
+        with self.lock:
+            self.templates[key] = template
+
+            while len(self.templates) > self.maxsize:
+                self.templates.popitem(last=False)
+
+        return template
+
+    def invalidate(self, instance):
+        with self.lock:
+            for key in [key for key in self.templates if key[:2] == (instance._meta.label, instance.pk)]:
+                del self.templates[key]
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.templates), "maxsize": self.maxsize}
+
+
+template_cache = CompiledTemplateCache(maxsize=COURSES_TEMPLATE_CACHE_SIZE)
+
+
+def get_compiled_template(instance, field):
+    return template_cache.get(instance, field)
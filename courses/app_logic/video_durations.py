@@ -0,0 +1,92 @@
+import logging
+
+import requests
+
+from django.utils.module_loading import import_string
+from embed_video.backends import VimeoBackend
+
+from courses.app_logic.video_tracking import invalidate_video_durations, store_video_duration
+from courses.models import Lecture
+from courses.settings import COURSES_VIDEO_DURATION_PROVIDER
+
+logger = logging.getLogger(__name__)
+
+VIMEO_OEMBED_URL = "https://vimeo.com/api/oembed.json"
+VIMEO_OEMBED_TIMEOUT = 10
+
+
+def vimeo_video_durations(urls):
+    """
+    Video duration provider, resolves Vimeo videos by oEmbed API (no credentials needed) over one pooled session.
+    Other videos (eg. YouTube, its API requires a key) are left unresolved. Returns {url: duration in seconds}.
+    """
+    durations = {}
+
+    with requests.Session() as session:
+        for url in urls:
+            if not VimeoBackend.is_valid(url):
+                continue
+
+            try:
+                response = session.get(VIMEO_OEMBED_URL, params={"url": url}, timeout=VIMEO_OEMBED_TIMEOUT)
+                response.raise_for_status()
+                duration = response.json().get("duration")
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Duration of video %s could not be resolved: %s", url, e)
+                continue
+
+            if duration:
+                durations[url] = duration
+
+    return durations
+
+
+def get_video_duration_provider(path=None):
+    """
+    Returns callable resolving durations of a list of video URLs, see COURSES_VIDEO_DURATION_PROVIDER.
+    """
+    return import_string(path or COURSES_VIDEO_DURATION_PROVIDER)
+
+
+def get_lectures_without_duration():
+    return (
+        Lecture.objects_no_relations.exclude(video__isnull=True)
+        .exclude(video="")
+        .exclude(metadata__has_key="video_duration")
+        .order_by("id")
+    )
+
+
+def backfill_video_durations(provider, batch_size=100):
+    """
+    Resolves durations of all lectures with a video but unknown duration, videos are passed to the provider in
+    batches. Durations are stored write-once (not overwriting those reported by viewers meanwhile) and the caches of
+    affected courses are invalidated at the end. Returns (stored, unresolved) number of lectures.
+    """
+    stored = unresolved = 0
+    course_ids = set()
+    last_id = 0
+
+    while True:
+        lectures = list(
+            get_lectures_without_duration()
+            .filter(id__gt=last_id)
+            .values_list("id", "video", "chapter__course_id")[:batch_size]
+        )
+
+        if not lectures:
+            break
+
+        last_id = lectures[-1][0]
+        durations = provider(sorted({video for _lecture_id, video, _course_id in lectures}))
+
+        for lecture_id, video, course_id in lectures:
+            if store_video_duration(lecture_id, durations.get(video)):
+                stored += 1
+                course_ids.add(course_id)
+            else:
+                unresolved += 1
+
+    invalidate_video_durations(course_ids)
+
+    return stored, unresolved
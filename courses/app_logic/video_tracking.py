@@ -0,0 +1,119 @@
+import datetime
+
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.utils.translation import gettext_lazy as _
+
+from courses.app_logic.fragments import bump_content_version
+from courses.app_logic.syllabus import invalidate_syllabus_stats
+from courses.models import Submission, Lecture, VideoPing
+from courses.utils import get_run_chapter_context, update_video_watched_metadata
+from courses.settings import (
+    COURSES_ALLOW_SUBMISSION_TO_PASSED_CHAPTERS,
+    COURSES_VIDEO_PING_BUFFERED,
+)
+
+# How many times is the conditional update of lecture metadata retried if the metadata changes meanwhile
+VIDEO_DURATION_UPDATE_ATTEMPTS = 3
+
+
+def get_video_lecture(request, run_slug, chapter_slug, lecture_slug):
+    """
+    Returns (lecture, run chapter context), raises Http404 / PermissionDenied same as the chapter views.
+    """
+    lecture = get_object_or_404(Lecture, slug=lecture_slug)
+    context = get_run_chapter_context(request, run_slug, chapter_slug)
+
+    return lecture, context
+
+
+def is_video_duration(duration):
+    return isinstance(duration, (int, float)) and not isinstance(duration, bool) and duration > 0
+
+
+def store_video_duration(lecture_id, duration):
+    """
+    Stores video duration to the lecture metadata only if it is not known yet (write-once). Metadata is replaced by
+    a conditional UPDATE (only if it has not changed since it was read), so concurrent writers do not overwrite each
+    other. Caches depending on the duration are not invalidated. Returns whether the duration has been stored.
+    """
+    if not is_video_duration(duration):
+        return False
+
+    lectures = Lecture.objects_no_relations.filter(id=lecture_id)
+
+    for _attempt in range(VIDEO_DURATION_UPDATE_ATTEMPTS):
+        metadata = lectures.values_list("metadata", flat=True).first()
+
+        if metadata and metadata.get("video_duration"):
+            return False
+
+        if metadata is None:
+            unchanged = lectures.filter(metadata__isnull=True)
+        else:
+            unchanged = lectures.filter(metadata=metadata)
+
+        if unchanged.update(metadata={**(metadata or {}), "video_duration": duration}):
+            return True
+
+    return False
+
+
+def invalidate_video_durations(course_ids):
+    """
+    Drops caches depending on video durations (lecture metadata is updated without signals by store_video_duration).
+    """
+    for course_id in set(course_ids):
+        invalidate_syllabus_stats(course_id)
+        bump_content_version(course_id)
+
+
+def save_video_duration(request, run_slug, chapter_slug, lecture_slug, duration):
+    """
+    Stores video duration reported by video_tracking.js (see get_video_duration) to the lecture metadata, only the
+    first report is stored. Returns whether it has been stored.
+    """
+    lecture, context = get_video_lecture(request, run_slug, chapter_slug, lecture_slug)
+
+    if lecture.metadata and lecture.metadata.get("video_duration"):
+        # Known already (browser has an old page), no write at all
+        return False
+
+    stored = store_video_duration(lecture.id, duration)
+
+    if stored:
+        invalidate_video_durations([context["run"].course_id])
+
+    return stored
+
+
+def save_video_ping(request, run_slug, chapter_slug, lecture_slug, time_range):
+    """
+    Merges video watched time range reported by video_tracking.js (validated by get_video_watched_time_range) in to
+    the user's submission (or just appends it to the buffer, see COURSES_VIDEO_PING_BUFFERED). Returns "Buffered" or
+    "Saved".
+    """
+    lecture, context = get_video_lecture(request, run_slug, chapter_slug, lecture_slug)
+
+    if datetime.date.today() > context["end"] and not COURSES_ALLOW_SUBMISSION_TO_PASSED_CHAPTERS:
+        raise PermissionDenied(_("Chapter has already ended...") + " " + _("Submission is not allowed."))
+
+    if COURSES_VIDEO_PING_BUFFERED:
+        # Just append to buffer, it is merged to the Submission by `flush_video_pings` management command
+        VideoPing.objects.create(run=context["run"], lecture=lecture, author=request.user, time_range=time_range)
+
+        return "Buffered"
+
+    user_submissions = (
+        Submission.objects.filter(author=request.user).filter(run=context["run"]).filter(lecture=lecture).all()
+    )
+
+    if len(user_submissions) == 1:
+        submission = user_submissions[0]
+    else:
+        submission = Submission(lecture=lecture, run=context["run"], author=request.user)
+
+    update_video_watched_metadata(submission, lecture, time_range)
+    submission.save()
+
+    return "Saved"
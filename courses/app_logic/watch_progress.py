@@ -0,0 +1,159 @@
+from django.db.models import FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from courses.models import Lecture, WatchProgress
+from courses.utils import IntervalSet, is_video_watched_time_range
+
+WATCH_PROGRESS_FIELDS = ("watched_seconds", "watched_percent", "last_seen")
+WATCH_PROGRESS_METADATA = ("video_watched_time_range", "video_watched_percent")
+
+
+def has_watch_progress(submission):
+    return bool(submission.lecture_id and isinstance(submission.metadata, dict)) and any(
+        key in submission.metadata for key in WATCH_PROGRESS_METADATA
+    )
+
+
+def get_watch_progress_values(submission):
+    """
+    Returns WatchProgress field values of the video watched time range (and percent) in the submission metadata.
+    Metadata written by older versions is not validated, malformed time range counts as nothing watched and the
+    percent is clamped to 0 - 100 (None if it is not a number).
+    """
+    metadata = submission.metadata or {}
+    time_range = metadata.get("video_watched_time_range", [])
+    percent = metadata.get("video_watched_percent")
+
+    if not is_video_watched_time_range(time_range):
+        time_range = []
+
+    if isinstance(percent, bool) or not isinstance(percent, (int, float)) or not percent >= 0:
+        percent = None
+
+    return {
+        "watched_seconds": IntervalSet(time_range).total,
+        "watched_percent": None if percent is None else min(percent, 100.0),
+        "last_seen": submission.timestamp_modified or timezone.now(),
+    }
+
+
+def save_watch_progress(submission):
+    """
+    Stores watch progress of a (saved) video lecture submission, called on every save (see courses.signals).
+    """
+    WatchProgress.objects.update_or_create(
+        run_id=submission.run_id,
+        user_id=submission.author_id,
+        lecture_id=submission.lecture_id,
+        defaults=get_watch_progress_values(submission),
+    )
+
+
+def delete_watch_progress(submission):
+    """
+    Deletes watch progress of a deleted video lecture submission (see courses.signals).
+    """
+    WatchProgress.objects.filter(
+        run_id=submission.run_id, user_id=submission.author_id, lecture_id=submission.lecture_id
+    ).delete()
+
+
+def save_watch_progress_bulk(submissions):
+    """
+    Stores watch progress of many (saved) video lecture submissions in a constant number of queries, for bulk saves
+    that do not send signals.
+    """
+    progress = {
+        (submission.run_id, submission.author_id, submission.lecture_id): get_watch_progress_values(submission)
+        for submission in submissions
+        if has_watch_progress(submission)
+    }
+
+    if not progress:
+        return
+
+    existing = {
+        (watch_progress.run_id, watch_progress.user_id, watch_progress.lecture_id): watch_progress
+        for watch_progress in WatchProgress.objects.filter(
+            run_id__in={key[0] for key in progress},
+            user_id__in={key[1] for key in progress},
+            lecture_id__in={key[2] for key in progress},
+        )
+    }
+    new_progress = []
+    updated_progress = []
+
+    for key, values in progress.items():
+        if key in existing:
+            watch_progress = existing[key]
+
+            for field, value in values.items():
+                setattr(watch_progress, field, value)
+
+            updated_progress.append(watch_progress)
+        else:
+            run_id, user_id, lecture_id = key
+            new_progress.append(WatchProgress(run_id=run_id, user_id=user_id, lecture_id=lecture_id, **values))
+
+    WatchProgress.objects.bulk_update(updated_progress, WATCH_PROGRESS_FIELDS)
+    WatchProgress.objects.bulk_create(new_progress, ignore_conflicts=True)
+
+
+def watched_percent_sum():
+    """
+    Sum of the watched percent of lectures, each lecture counts at most 100 % (the percent might be computed from a
+    stale video duration).
+    """
+    return Sum(Least(Coalesce("watched_percent", Value(0.0)), Value(100.0), output_field=FloatField()))
+
+
+def get_video_count(run):
+    return Lecture.objects_no_relations.filter(chapter__course_id=run.course_id, lecture_type="V").count()
+
+
+def get_watched_percent(run, user_ids=None):
+    """
+    Returns {user_id: percent} of all the video lectures of the run's course watched by each user (or just the
+    selected ones), aggregated by the database.
+    """
+    video_count = get_video_count(run)
+
+    if not video_count:
+        return {}
+
+    progress = WatchProgress.objects.filter(run=run, lecture__lecture_type="V")
+
+    if user_ids is not None:
+        progress = progress.filter(user_id__in=user_ids)
+
+    watched = (
+        progress.order_by().values("user_id").annotate(watched=watched_percent_sum()).values_list("user_id", "watched")
+    )
+
+    return {user_id: round(min(total / video_count, 100), 1) for user_id, total in watched if total}
+
+
+def watched_percent_expression(run, user_field="user_id"):
+    """
+    Expression of the percent of all the video lectures of the run's course watched by the user in `user_field` of
+    the outer query (eg. to annotate RunUsers), aggregated by the database.
+    """
+    video_count = get_video_count(run)
+
+    if not video_count:
+        return Value(0.0, output_field=FloatField())
+
+    watched = Coalesce(
+        Subquery(
+            WatchProgress.objects.filter(run=run, user_id=OuterRef(user_field), lecture__lecture_type="V")
+            .order_by()
+            .values("user_id")
+            .annotate(watched=watched_percent_sum())
+            .values("watched")
+        ),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+    return Least(watched / Value(float(video_count)), Value(100.0), output_field=FloatField())
@@ -1,9 +1,13 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
 
-from courses.models import RunUsers
+from courses.app_logic.courses_logic import get_enrollment
 
 
 def verify_payment(func):
@@ -15,16 +19,53 @@ def verify_payment(func):
         request = args[0]
 
         if "run_slug" in kwargs:
-            subscriptions = RunUsers.objects.filter(run__slug=kwargs["run_slug"]).filter(user=request.user)
+            # Enrollment is cached on the request, the view reuses it
+            enrollment = get_enrollment(request, kwargs["run_slug"])
 
-            if subscriptions.count() == 0 and request.user.is_staff is False:
+            if not enrollment.subscribed and request.user.is_staff is False:
                 raise PermissionDenied(_("You are not subscribed to this course!"))
 
-            for subscription in subscriptions.all():
-                if subscription.subscription_level and subscription.price > subscription.payment:
-                    messages.error(request, _("You need to finish the payment in order to continue to the course."))
-                    return redirect("run_payment_instructions", run_slug=kwargs["run_slug"])
+            if enrollment.unpaid:
+                messages.error(request, _("You need to finish the payment in order to continue to the course."))
+                return redirect("run_payment_instructions", run_slug=kwargs["run_slug"])
 
         return func(*args, **kwargs)
 
     return wrapper
+
+
+def async_login_required(func):
+    """
+    login_required for async views, the user is loaded from the session in a thread (Django ORM is sync only).
+    """
+
+    @wraps(func)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+
+        return await func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_verify_payment(func):
+    """
+    verify_payment for async views, the enrollment is loaded in a thread and cached on the request for the view.
+    """
+
+    @wraps(func)
+    async def wrapper(request, *args, **kwargs):
+        if "run_slug" in kwargs:
+            enrollment = await sync_to_async(get_enrollment)(request, kwargs["run_slug"])
+
+            if not enrollment.subscribed and request.user.is_staff is False:
+                raise PermissionDenied(_("You are not subscribed to this course!"))
+
+            if enrollment.unpaid:
+                messages.error(request, _("You need to finish the payment in order to continue to the course."))
+                return redirect("run_payment_instructions", run_slug=kwargs["run_slug"])
+
+        return await func(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from courses.app_logic.video_durations import backfill_video_durations, get_video_duration_provider
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve video durations of all lectures with a video whose duration is not known yet (it is otherwise "
+        "reported by the first viewer). Durations are resolved by COURSES_VIDEO_DURATION_PROVIDER in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--provider", help="Dotted path of the provider (default COURSES_VIDEO_DURATION_PROVIDER).", default=None
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of videos passed to the provider at once.", default=100
+        )
+
+    def handle(self, *args, **options):
+        provider = get_video_duration_provider(options["provider"])
+        stored, unresolved = backfill_video_durations(provider, options["batch_size"])
+
+        if options["verbosity"] >= 2 and unresolved:
+            self.stdout.write(self.style.WARNING(f"Duration of {unresolved} lecture video(s) could not be resolved."))
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Total: {stored}"), ending="")
+            self.stdout.write(" lecture duration(s) has been stored.")
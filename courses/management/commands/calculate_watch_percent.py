@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from courses.models import Submission
+from courses.utils import IntervalSet
 
 
 class Command(BaseCommand):
@@ -18,12 +19,10 @@ class Command(BaseCommand):
 
             if submission.metadata and "video_watched_time_range" in submission.metadata:
                 if submission.lecture.metadata and "video_duration" in submission.lecture.metadata:
-                    video_watched = 0
+                    video_watched = IntervalSet(submission.metadata["video_watched_time_range"])
+                    submission.metadata["video_watched_time_range"] = video_watched.to_list()
 
-                    for video_range in submission.metadata["video_watched_time_range"]:
-                        video_watched += video_range[1] - video_range[0]
-
-                    video_watched_percent = video_watched / submission.lecture.metadata["video_duration"] * 100
+                    video_watched_percent = video_watched.total / submission.lecture.metadata["video_duration"] * 100
                     submission.metadata["video_watched_percent"] = round(video_watched_percent, 1)
                     submission.save()
 
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.app_logic.export import iter_csv, iter_run_attendees
+from courses.models import Run
+
+
+class Command(BaseCommand):
+    help = (
+        "Export attendees of the run (subscription level, price, payment, coupon, passed status, certificate and "
+        "watched percent) as CSV. Rows are streamed, so the memory does not grow with the number of attendees."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("run_slug", type=str, help="Slug of the Run to export.")
+        parser.add_argument("--output", type=str, help="Path of the CSV file (default: standard output).")
+
+    def handle(self, *args, **options):
+        try:
+            run = Run.objects.get(slug=options["run_slug"])
+        except Run.DoesNotExist:
+            raise CommandError(f"Run {options['run_slug']} does not exist!")
+
+        lines = iter_csv(iter_run_attendees(run))
+
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        rows = 0
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            for line in lines:
+                output.write(line)
+                rows += 1
+
+        if options["verbosity"] >= 1:
+            # BOM and header are not counted
+            self.stdout.write(self.style.SUCCESS(f"Total: {rows - 2}"), ending="")
+            self.stdout.write(f" row(s) has been exported to {options['output']}.")
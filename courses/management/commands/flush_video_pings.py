@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from courses.app_logic.watch_progress import save_watch_progress_bulk
+from courses.models import Lecture, Submission, VideoPing
+from courses.utils import is_video_watched_time_range, update_video_watched_metadata
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge buffered video pings (see COURSES_VIDEO_PING_BUFFERED) in to the users' lecture Submissions. "
+        "Should be run periodically (eg. every minute from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of pings processed in one transaction.", default=10000
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            with transaction.atomic():
+                # Pings locked by another (concurrent) flush are left to it
+                pings = list(
+                    VideoPing.objects.select_for_update(skip_locked=True)
+                    .order_by("id")
+                    .values_list("id", "author_id", "run_id", "lecture_id", "time_range")[: options["batch_size"]]
+                )
+
+                if not pings:
+                    break
+
+                submissions_count = self.flush(pings)
+
+            if submissions_count is None:
+                # Merged by another flush meanwhile (databases without row locks), read the buffer again
+                continue
+
+            total += len(pings)
+
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"Merged {len(pings)} ping(s) in to {submissions_count} submission(s).")
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Total: {total}"), ending="")
+            self.stdout.write(" ping(s) has been merged.")
+
+    @staticmethod
+    def flush(pings):
+        """
+        Merge pings (id, author_id, run_id, lecture_id, time_range) in to Submissions and delete them from buffer.
+        Returns number of updated/created submissions, or None if the pings have been merged by another flush.
+        """
+        time_ranges = defaultdict(list)
+
+        for _ping_id, author_id, run_id, lecture_id, time_range in pings:
+            # Invalid pings (stored before they were validated) are just dropped from the buffer
+            if is_video_watched_time_range(time_range):
+                time_ranges[(author_id, run_id, lecture_id)] += time_range
+
+        lectures = Lecture.objects_no_relations.in_bulk({key[2] for key in time_ranges})
+        user_submissions = defaultdict(list)
+
+        for submission in Submission.objects_no_relations.filter(
+            author_id__in={key[0] for key in time_ranges},
+            run_id__in={key[1] for key in time_ranges},
+            lecture_id__in=lectures.keys(),
+        ).order_by("id"):
+            user_submissions[(submission.author_id, submission.run_id, submission.lecture_id)].append(submission)
+
+        new_submissions = []
+        updated_submissions = []
+        now = timezone.now()
+
+        for key, time_range in time_ranges.items():
+            author_id, run_id, lecture_id = key
+
+            if lecture_id not in lectures:
+                continue
+
+            if len(user_submissions[key]) == 1:
+                submission = user_submissions[key][0]
+                submission.timestamp_modified = now
+                updated_submissions.append(submission)
+            else:
+                submission = Submission(lecture_id=lecture_id, run_id=run_id, author_id=author_id)
+                new_submissions.append(submission)
+
+            update_video_watched_metadata(submission, lectures[lecture_id], time_range)
+
+        with transaction.atomic():
+            deleted, _deleted_per_model = VideoPing.objects.filter(id__in=[ping[0] for ping in pings]).delete()
+
+            if deleted != len(pings):
+                # Another flush has deleted (merged) some of them meanwhile
+                transaction.set_rollback(True)
+                return None
+
+            Submission.objects_no_relations.bulk_create(new_submissions)
+            Submission.objects_no_relations.bulk_update(updated_submissions, ["metadata", "timestamp_modified"])
+            save_watch_progress_bulk(new_submissions + updated_submissions)
+
+        return len(new_submissions) + len(updated_submissions)
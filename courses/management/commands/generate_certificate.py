@@ -1,5 +1,9 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta, datetime
 
+from django.db import connections
+
+from courses.app_logic.certificates import process_generated_certificate, setup_certificate_worker
 from courses.management.notify_cmd import NotifyCommand
 from courses.models import Run, Certificate
 
@@ -24,6 +28,12 @@ class Command(NotifyCommand):
         parser.add_argument(
             "--fake", action="store_true", help="Fake run. Does not store anything to DB, and wont send any emails."
         )
+        parser.add_argument(
+            "--pipeline",
+            action="store_true",
+            help="Bulk mode for large runs: certificates are created in bulk, PDFs are pre-rendered and emails are "
+            "sent by a pool of --workers processes. Implies --confirm.",
+        )
 
     def handle(self, *args, **options):
         if options["time_delta"]:
@@ -46,7 +56,9 @@ class Command(NotifyCommand):
         if run_ids:
             runs = runs.filter(id__in=run_ids)
 
-        if runs.count() > 0:
+        if options["pipeline"]:
+            self.handle_pipeline(runs, user_ids, options)
+        elif runs.count() > 0:
             if options["verbosity"] >= 2:
                 self.stdout.write(f"Found {runs.count()} active run(s).")
 
@@ -59,9 +71,11 @@ class Command(NotifyCommand):
                 if options["verbosity"] >= 3:
                     self.stdout.write(self.style.WARNING(run))
 
+                eligibility = run.get_eligibility()
+
                 for user in run.users.all():
 
-                    if str(user.id) in user_ids or run.passed(user.id):
+                    if str(user.id) in user_ids or eligibility[user.id].passed:
                         user_certificates = Certificate.objects.filter(run=run).filter(user=user)
 
                         if user_certificates.count() == 0:
@@ -90,7 +104,6 @@ class Command(NotifyCommand):
                                     user,
                                     run,
                                     verbosity=options["verbosity"],
-                                    delay=options["delay"],
                                     confirm=options["confirm"],
                                 )
 
@@ -114,3 +127,83 @@ class Command(NotifyCommand):
             self.stdout.write(self.style.ERROR("FAKE: Nothing has been stored to DB and NO email was send!"))
 
         super().handle(*args, **options)
+
+    def handle_pipeline(self, runs, user_ids, options):
+        certificate_ids = []
+        # Fake mode creates no certificates, it just counts the ones it would create
+        fake_count = 0
+
+        for run in runs.select_related("course"):
+            eligibility = run.get_eligibility()
+            existing = set(Certificate.objects_no_relations.filter(run=run).values_list("user_id", flat=True))
+            new_user_ids = [
+                user_id
+                for user_id, user_eligibility in eligibility.items()
+                if (str(user_id) in user_ids or user_eligibility.passed) and user_id not in existing
+            ]
+
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"{run}: ", ending="")
+                self.stdout.write(self.style.SUCCESS(len(new_user_ids)), ending="")
+                self.stdout.write(" new certificate(s).")
+
+            if not new_user_ids:
+                continue
+
+            if options["fake"]:
+                fake_count += len(new_user_ids)
+                continue
+
+            # Conflicts (certificates created meanwhile eg. by the user) are skipped
+            Certificate.objects_no_relations.bulk_create(
+                [
+                    Certificate(run=run, user_id=user_id, certificate_template=run.course.certificate_template)
+                    for user_id in new_user_ids
+                ],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            certificate_ids += Certificate.objects_no_relations.filter(run=run, user_id__in=new_user_ids).values_list(
+                "id", flat=True
+            )
+
+        if options["verbosity"] >= 1:
+            total = fake_count if options["fake"] else len(certificate_ids)
+            self.stdout.write(self.style.SUCCESS(f"Total: {total}"), ending="")
+            self.stdout.write(" (new) certificates has been generated.")
+
+        if options["fake"]:
+            if options["verbosity"] >= 1:
+                self.stdout.write(self.style.ERROR("FAKE: Nothing has been stored to DB and NO email was send!"))
+            return
+
+        failed = 0
+
+        for done, (certificate_id, error) in enumerate(
+            self.process_certificates(certificate_ids, options["workers"]), 1
+        ):
+            if error:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Certificate {certificate_id} failed: {error}"))
+
+            if options["verbosity"] >= 2 or (options["verbosity"] >= 1 and done == len(certificate_ids)):
+                self.stdout.write(f"Processed {done}/{len(certificate_ids)} certificate(s)", ending="")
+                self.stdout.write(self.style.ERROR(f" ({failed} failed).") if failed else ".")
+
+    @staticmethod
+    def process_certificates(certificate_ids, workers):
+        """
+        Pre-renders PDFs and sends notifications, yields (certificate_id, error) in order of completion.
+        """
+        if workers <= 1:
+            yield from map(process_generated_certificate, certificate_ids)
+            return
+
+        # Forked workers must not share the parent's DB connections
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_certificate_worker) as executor:
+            futures = [executor.submit(process_generated_certificate, cert_id) for cert_id in certificate_ids]
+
+            for future in as_completed(futures):
+                yield future.result()
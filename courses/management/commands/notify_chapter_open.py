@@ -24,7 +24,7 @@ class Command(NotifyCommand):
                 counter = 0
 
                 for chapter in run.course.chapter_set.all():
-                    start, end = chapter.get_run_dates(run)
+                    start, end = run.schedule.get_dates(chapter)
 
                     self.mail_template = chapter.mail_chapter_open
 
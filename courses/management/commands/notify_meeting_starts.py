@@ -37,7 +37,6 @@ class Command(NotifyCommand):
                         meeting.organizer,
                         meeting.run,
                         verbosity=options["verbosity"],
-                        delay=options["delay"],
                         confirm=options["confirm"],
                     )
 
@@ -50,7 +49,6 @@ class Command(NotifyCommand):
                         meeting.leader,
                         meeting.run,
                         verbosity=options["verbosity"],
-                        delay=options["delay"],
                         confirm=options["confirm"],
                     )
 
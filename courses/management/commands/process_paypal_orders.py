@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from courses.app_logic.payments import process_paypal_order
+from courses.models import PayPalOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify pending PayPal orders (reported by webhook or browser, see COURSES_PAYPAL_ORDERS_BUFFERED) with PayPal "
+        "API and update the payments of subscribed users. Should be run periodically (eg. every minute from cron)."
+    )
+
+    def handle(self, *args, **options):
+        pending = PayPalOrder.objects.filter(state=PayPalOrder.PENDING, run_user__isnull=False).order_by("id")
+        completed = 0
+
+        for paypal_order in pending:
+            if process_paypal_order(paypal_order):
+                completed += 1
+            elif options["verbosity"] >= 2:
+                self.stdout.write(f"{paypal_order.order_id}: ", ending="")
+                self.stdout.write(self.style.WARNING(paypal_order.error or ""))
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Total: {completed}"), ending="")
+            self.stdout.write(" order(s) has been completed.")
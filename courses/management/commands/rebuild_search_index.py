@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from courses.app_logic.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-create the full-text search index of courses, chapters, lectures and FAQs. The index is maintained "
+        "automatically, it has to be rebuilt only after the installation or changes that bypass signals."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Total: {count}"), ending="")
+            self.stdout.write(" entries has been indexed.")
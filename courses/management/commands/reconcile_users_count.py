@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from courses.models import Run, RunUsers
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile denormalized Run.users_count with the real number of subscribed users (eg. after raw SQL changes "
+        "or bulk updates that bypass signals)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run_ids", type=str, help="Comma separated list of Run IDs to reconcile (default: all runs)."
+        )
+        parser.add_argument("--fake", action="store_true", help="Fake run. Only reports the differences.")
+
+    def handle(self, *args, **options):
+        runs = Run.objects_no_relations.annotate(real_users_count=Count("runusers")).order_by("id")
+
+        if options["run_ids"]:
+            runs = runs.filter(id__in=options["run_ids"].split(","))
+
+        fixed = 0
+
+        for run_id, title, users_count, real_users_count in runs.values_list(
+            "id", "title", "users_count", "real_users_count"
+        ):
+            if users_count == real_users_count:
+                continue
+
+            if options["verbosity"] >= 1:
+                self.stdout.write(f"{title} (ID: {run_id}): ", ending="")
+                self.stdout.write(self.style.WARNING(f"{users_count} -> {real_users_count}"))
+
+            if not options["fake"]:
+                # Recount in the UPDATE itself, subscriptions might have changed meanwhile
+                Run.objects_no_relations.filter(id=run_id).update(
+                    users_count=Coalesce(
+                        Subquery(
+                            RunUsers.objects.filter(run_id=OuterRef("id"))
+                            .order_by()
+                            .values("run_id")
+                            .annotate(count=Count("id"))
+                            .values("count")
+                        ),
+                        0,
+                    )
+                )
+
+            fixed += 1
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Total: {fixed}"), ending="")
+            self.stdout.write(" run(s) has been reconciled.")
+
+        if options["fake"] and options["verbosity"] >= 1:
+            self.stdout.write(self.style.ERROR("FAKE: Nothing has been stored to DB!"))
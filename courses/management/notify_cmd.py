@@ -1,11 +1,10 @@
 import os
 import requests
 
-from time import sleep
-
 from django.core.management.base import BaseCommand
 
-from courses.utils import send_templated_email
+from courses.app_logic.mail_dispatch import MailDispatcher
+from courses.app_logic.template_cache import get_compiled_template
 
 
 class NotifyCommand(BaseCommand):
@@ -14,14 +13,37 @@ class NotifyCommand(BaseCommand):
     mail_body = None
     mail_body_html = None
     mail_template_variables = {}
+    dispatcher = None
 
     def add_arguments(self, parser):
         parser.add_argument("--time-delta", type=int, help="Time delta (in days) for comparasion adjustments.")
         parser.add_argument(
-            "--delay", nargs="?", type=int, help="Time delay (in seconds) between each email.", default=0
+            "--delay",
+            nargs="?",
+            type=float,
+            help="Time delay (in seconds) between each email. Deprecated, use --rate instead.",
+            default=0,
+        )
+        parser.add_argument("--rate", type=float, help="Max number of emails sent per second (default: unlimited).")
+        parser.add_argument("--workers", type=int, help="Number of threads rendering the emails.", default=4)
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of emails sent over one mail server connection.", default=100
         )
         parser.add_argument("--confirm", action="store_true", help="Confirm user prompt to send out emails.")
 
+    def execute(self, *args, **options):
+        rate = options.get("rate")
+
+        if not rate and options.get("delay"):
+            rate = 1 / options["delay"]
+
+        self.mail_template_variables = {}
+        self.dispatcher = MailDispatcher(
+            workers=options.get("workers", 4), batch_size=options.get("batch_size", 100), rate=rate
+        )
+
+        return super().execute(*args, **options)
+
     def notify_users(self, run, options):
         if options["verbosity"] >= 1:
             users_count = run.users.count()
@@ -36,26 +58,32 @@ class NotifyCommand(BaseCommand):
             self.stdout.write("Manager: ", ending="")
             self.stdout.write(self.style.WARNING(run.manager))
 
+        # Manager might be subscribed to the run too, everybody is notified only once
+        recipients = set()
+
         if run.manager.email:
+            recipients.add(run.manager.email.lower())
             self.prepare_and_send_email(
                 run.manager,
                 run,
                 verbosity=options["verbosity"],
-                delay=options["delay"],
                 confirm=options["confirm"],
             )
 
         for user in run.users.all():
-            if user.email:
+            if user.email and user.email.lower() not in recipients:
+                recipients.add(user.email.lower())
                 self.prepare_and_send_email(
                     user,
                     run,
                     verbosity=options["verbosity"],
-                    delay=options["delay"],
                     confirm=options["confirm"],
                 )
 
-    def prepare_and_send_email(self, user, run, verbosity=1, delay=0, confirm=False):
+    def prepare_and_send_email(self, user, run, verbosity=1, confirm=False):
+        """
+        Queue the email for the user, queued emails are sent out by send_emails() at the end of the command.
+        """
         if not confirm:
             self.stdout.write(f"Do you really want to send notification email to: {user} ?")
             user_input = input()
@@ -64,26 +92,43 @@ class NotifyCommand(BaseCommand):
                 self.stdout.write(self.style.WARNING("Confirmation failed! No email is send..."))
                 return
 
+        if self.mail_template is None:
+            self.stdout.write(self.style.ERROR(f"Email template is not specified, {user} will not be notified!"))
+            return
+
         self.mail_template_variables["user"] = user
         self.mail_template_variables["course_run"] = run
+        self.mail_subject = get_compiled_template(self.mail_template, "mail_subject")
+        self.mail_body_html = get_compiled_template(self.mail_template, "mail_body_html")
+
+        self.dispatcher.add(
+            user,
+            mail_subject=self.mail_subject,
+            mail_body_html=self.mail_body_html,
+            template_variables=self.mail_template_variables,
+        )
 
-        try:
-            self.mail_subject = self.mail_template.mail_subject
-            self.mail_body_html = self.mail_template.mail_body_html
-            send_templated_email(
-                user,
-                mail_subject=self.mail_subject,
-                mail_body_html=self.mail_body_html,
-                template_variables=self.mail_template_variables,
-            )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(e))
-            # TODO: Add email notification to admin when 'self.mail_template' is None!
-        else:
-            if verbosity >= 2:
-                self.stdout.write(self.style.SUCCESS(f"Notification email sent to {user}!"))
+    def send_emails(self, verbosity=1):
+        results = self.dispatcher.dispatch()
+        failed = 0
+
+        for result in results:
+            if not result.success:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Notification email to {result.user} failed: {result.error}"))
+            elif verbosity >= 2:
+                self.stdout.write(self.style.SUCCESS(f"Notification email sent to {result.user}!"))
+
+        if results and verbosity >= 1:
+            self.stdout.write(self.style.SUCCESS(f"Sent {len(results) - failed} email(s)"), ending="")
+
+            if failed:
+                self.stdout.write(", ", ending="")
+                self.stdout.write(self.style.ERROR(f"{failed} failed"), ending="")
+
+            self.stdout.write(".")
 
-        sleep(delay)
+        return results
 
     def notify_healthchecks(self):
         if os.getenv("HEALTHCHECKS", None):
@@ -92,4 +137,5 @@ class NotifyCommand(BaseCommand):
             self.stdout.write(self.style.SUCCESS(r.text))
 
     def handle(self, *args, **options):
+        self.send_emails(verbosity=options["verbosity"])
         self.notify_healthchecks()
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0023_auto_20221112_2158'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoPing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_range', models.JSONField(verbose_name='Video watched time range')),
+                ('timestamp_added', models.DateTimeField(auto_now_add=True, verbose_name='Added')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Author')),
+                ('lecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.lecture', verbose_name='Lecture')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.run', verbose_name='Run')),
+            ],
+            options={
+                'verbose_name': 'Video Ping',
+                'verbose_name_plural': 'Video Pings',
+            },
+        ),
+    ]
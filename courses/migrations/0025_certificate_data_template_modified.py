@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:00
+
+import courses.validators
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0024_videoping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='data_template_modified',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Modification time of the certificate template used to render the PDF.', null=True, verbose_name='Data template modified'),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='data',
+            field=models.FileField(blank=True, help_text='Rendered PDF of the certificate, it is generated automatically.', null=True, upload_to='certificates', validators=[django.core.validators.FileExtensionValidator(['pdf']), courses.validators.FileSizeValidator(2)], verbose_name='Data'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def count_run_users(apps, schema_editor):
+    Run = apps.get_model("courses", "Run")
+    RunUsers = apps.get_model("courses", "RunUsers")
+
+    for run_id, users_count in (
+        RunUsers.objects.order_by().values("run_id").annotate(count=models.Count("id")).values_list("run_id", "count")
+    ):
+        Run.objects.filter(id=run_id).update(users_count=users_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0025_certificate_data_template_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='users_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of subscribed users, it is maintained automatically.', verbose_name='Users count'),
+        ),
+        migrations.RunPython(count_run_users, migrations.RunPython.noop),
+    ]
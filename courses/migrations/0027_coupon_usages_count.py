@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+def count_coupon_usages(apps, schema_editor):
+    Coupon = apps.get_model("courses", "Coupon")
+    RunUsers = apps.get_model("courses", "RunUsers")
+
+    for coupon_id, usages_count in (
+        RunUsers.objects.filter(discount_coupon__isnull=False)
+        .order_by()
+        .values("discount_coupon_id")
+        .annotate(count=models.Count("id"))
+        .values_list("discount_coupon_id", "count")
+    ):
+        Coupon.objects.filter(id=coupon_id).update(usages_count=usages_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0026_run_users_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='usages_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='How many times the Coupon has been used, it is maintained automatically.', verbose_name='Usages count'),
+        ),
+        migrations.RunPython(count_coupon_usages, migrations.RunPython.noop),
+    ]
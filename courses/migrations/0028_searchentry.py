@@ -0,0 +1,92 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SQLITE_CREATE_INDEX = (
+    # External content FTS5 table, kept in sync with courses_searchentry by triggers
+    """CREATE VIRTUAL TABLE courses_searchentry_fts USING fts5(
+        title, body, content='courses_searchentry', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER courses_searchentry_fts_insert AFTER INSERT ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER courses_searchentry_fts_delete AFTER DELETE ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(courses_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER courses_searchentry_fts_update AFTER UPDATE ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(courses_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO courses_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+)
+SQLITE_DROP_INDEX = (
+    "DROP TRIGGER IF EXISTS courses_searchentry_fts_insert",
+    "DROP TRIGGER IF EXISTS courses_searchentry_fts_delete",
+    "DROP TRIGGER IF EXISTS courses_searchentry_fts_update",
+    "DROP TABLE IF EXISTS courses_searchentry_fts",
+)
+POSTGRESQL_CREATE_INDEX = (
+    """CREATE INDEX courses_searchentry_fts ON courses_searchentry USING GIN ((
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ))""",
+)
+POSTGRESQL_DROP_INDEX = ("DROP INDEX IF EXISTS courses_searchentry_fts",)
+
+
+def execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        execute(schema_editor, POSTGRESQL_CREATE_INDEX)
+    elif vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            fts5 = cursor.fetchone()[0]
+
+        # Without FTS5 the search falls back to (slow) icontains
+        if fts5:
+            execute(schema_editor, SQLITE_CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        execute(schema_editor, POSTGRESQL_DROP_INDEX)
+    elif vendor == "sqlite":
+        execute(schema_editor, SQLITE_DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0027_coupon_usages_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('chapter', 'Chapter'), ('lecture', 'Lecture'), ('faq', 'Frequently asked question')], max_length=7, verbose_name='Kind')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Object ID')),
+                ('title', models.CharField(max_length=250, verbose_name='Title')),
+                ('body', models.TextField(blank=True, verbose_name='Body')),
+                ('timestamp_modified', models.DateTimeField(auto_now=True, verbose_name='Modified')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Search Entry',
+                'verbose_name_plural': 'Search Entries',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
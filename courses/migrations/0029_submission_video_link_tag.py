@@ -0,0 +1,45 @@
+# Generated by Django 3.2.16 on 2026-10-18 15:00
+
+import re
+
+from django.db import migrations, models
+
+# Copy of courses.models.YOUTUBE_VIDEO_REGEX at the time of the migration
+YOUTUBE_VIDEO_REGEX = re.compile(
+    r'.*(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)'
+    r'/(watch\?v=|embed/|v/|.+\?v=)?(?P<id>[A-Za-z0-9\-=_]{11}).*', re.DOTALL
+)
+
+
+def extract_video_link_tags(apps, schema_editor):
+    Submission = apps.get_model("courses", "Submission")
+    submissions = []
+
+    for submission in (
+        Submission.objects.filter(models.Q(video_link__contains="youtu") | models.Q(description__contains="youtu"))
+        .only("id", "video_link", "description")
+        .iterator()
+    ):
+        match = YOUTUBE_VIDEO_REGEX.match(submission.video_link or submission.description or "")
+
+        if match:
+            submission.video_link_tag = match.group("id")
+            submissions.append(submission)
+
+    Submission.objects.bulk_update(submissions, ["video_link_tag"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0028_searchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='video_link_tag',
+            field=models.CharField(blank=True, editable=False, help_text='Extracted from the video link (or description) when the submission is saved.', max_length=11, null=True, verbose_name='YouTube video ID'),
+        ),
+        migrations.RunPython(extract_video_link_tags, migrations.RunPython.noop),
+    ]
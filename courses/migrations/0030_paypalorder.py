@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0029_submission_video_link_tag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayPalOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=64, unique=True, verbose_name='Order ID')),
+                ('state', models.CharField(choices=[('P', 'Pending'), ('C', 'Completed'), ('F', 'Failed')], db_index=True, default='P', max_length=1, verbose_name='State')),
+                ('amount', models.FloatField(blank=True, null=True, verbose_name='Amount')),
+                ('currency', models.CharField(blank=True, max_length=3, null=True, verbose_name='Currency')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Error')),
+                ('event', models.JSONField(blank=True, help_text='Last webhook event received for the order.', null=True, verbose_name='Event')),
+                ('timestamp_added', models.DateTimeField(auto_now_add=True, verbose_name='Added')),
+                ('timestamp_modified', models.DateTimeField(auto_now=True, verbose_name='Modified')),
+                ('run_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courses.runusers', verbose_name='Run User')),
+            ],
+            options={
+                'verbose_name': 'PayPal Order',
+                'verbose_name_plural': 'PayPal Orders',
+            },
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:00
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def is_non_negative_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value >= 0
+
+
+def get_watched_seconds(time_range):
+    """
+    Total length of the (possibly overlapping) intervals, same as courses.utils.IntervalSet.total. Metadata used to be
+    stored as sent by the browser, malformed intervals (see courses.utils.is_video_watched_time_range) are skipped.
+    """
+    if not isinstance(time_range, list):
+        return 0
+
+    intervals = [
+        interval
+        for interval in time_range
+        if isinstance(interval, list)
+        and len(interval) == 2
+        and all(is_non_negative_number(value) for value in interval)
+        and interval[0] <= interval[1]
+    ]
+    total = 0
+    end = None
+
+    for start, stop in sorted(intervals):
+        if end is None or start > end:
+            total += stop - start
+            end = stop
+        elif stop > end:
+            total += stop - end
+            end = stop
+
+    return total
+
+
+def get_watched_percent(percent):
+    """
+    Watched percent clamped to 0 - 100, None if it is not a number.
+    """
+    if not is_non_negative_number(percent):
+        return None
+
+    return min(percent, 100.0)
+
+
+def backfill_watch_progress(apps, schema_editor):
+    Submission = apps.get_model("courses", "Submission")
+    WatchProgress = apps.get_model("courses", "WatchProgress")
+    progress = []
+
+    # Latest submission wins if the user has more of them for the same lecture
+    for submission in (
+        Submission.objects.filter(lecture__isnull=False)
+        .filter(metadata__has_any_keys=("video_watched_time_range", "video_watched_percent"))
+        .only("run_id", "author_id", "lecture_id", "metadata", "timestamp_modified")
+        .order_by("-timestamp_modified", "-id")
+        .iterator()
+    ):
+        progress.append(
+            WatchProgress(
+                run_id=submission.run_id,
+                user_id=submission.author_id,
+                lecture_id=submission.lecture_id,
+                watched_seconds=get_watched_seconds(submission.metadata.get("video_watched_time_range")),
+                watched_percent=get_watched_percent(submission.metadata.get("video_watched_percent")),
+                last_seen=submission.timestamp_modified,
+            )
+        )
+
+        if len(progress) >= 500:
+            WatchProgress.objects.bulk_create(progress, ignore_conflicts=True)
+            progress = []
+
+    WatchProgress.objects.bulk_create(progress, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0030_paypalorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watched_seconds', models.FloatField(default=0, verbose_name='Watched seconds')),
+                ('watched_percent', models.FloatField(blank=True, help_text='Unknown until the video duration is known.', null=True, verbose_name='Watched percent')),
+                ('last_seen', models.DateTimeField(verbose_name='Last seen')),
+                ('lecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.lecture', verbose_name='Lecture')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.run', verbose_name='Run')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Watch Progress',
+                'verbose_name_plural': 'Watch Progress',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='watchprogress',
+            index=models.Index(fields=['run', 'lecture', 'watched_percent'], name='courses_wp_run_lecture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchprogress',
+            index=models.Index(fields=['run', 'last_seen'], name='courses_wp_run_last_seen_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='watchprogress',
+            unique_together={('run', 'user', 'lecture')},
+        ),
+        migrations.RunPython(backfill_watch_progress, migrations.RunPython.noop),
+    ]
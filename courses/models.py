@@ -1,5 +1,7 @@
+import re
 import uuid
 
+from collections import namedtuple
 from datetime import datetime, date, timedelta
 from time import gmtime
 from time import strftime
@@ -7,8 +9,8 @@ from time import strftime
 from django.conf import settings
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.core.validators import FileExtensionValidator
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.utils.translation import gettext_lazy as _
 
 from autoslug import AutoSlugField
@@ -43,6 +45,14 @@ SUBMISSION_TYPE = (
 )
 
 
+Eligibility = namedtuple("Eligibility", ("passed", "missing_chapters", "missing_lectures"))
+
+YOUTUBE_VIDEO_REGEX = re.compile(
+    r'.*(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)'
+    r'/(watch\?v=|embed/|v/|.+\?v=)?(?P<id>[A-Za-z0-9\-=_]{11}).*', re.DOTALL
+)
+
+
 class CourseManager(models.Manager):
     """
     Manager at pre-select all related items for each query set.
@@ -313,20 +323,7 @@ class Chapter(models.Model):
             raise PermissionDenied(_("Chapter hasnt started yet...") + " " + _("Please come back later."))
 
     def get_run_dates(self, run, raise_wrong_dates=False):
-        total_days = 0
-        previous_chapter = self.previous
-
-        while previous_chapter is not None:
-            total_days += previous_chapter.length
-            previous_chapter = previous_chapter.previous
-
-        start = run.start + timedelta(days=total_days)
-        end = run.start + timedelta(days=total_days + self.length - 1)
-
-        if raise_wrong_dates:
-            self.verify_course_dates(start, end)
-
-        return start, end
+        return run.schedule.get_dates(self, raise_wrong_dates=raise_wrong_dates)
 
     def clean(self):
         if self.previous and self.previous.course != self.course:
@@ -501,6 +498,12 @@ class Run(models.Model):
             "have no limit."
         ),
     )
+    users_count = models.PositiveIntegerField(
+        verbose_name=_("Users count"),
+        default=0,
+        editable=False,
+        help_text=_("Number of subscribed users, it is maintained automatically."),
+    )
     metadata = models.JSONField(verbose_name=_("Metadata"), blank=True, null=True, help_text=_("Metadata about run."))
     manager = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -535,7 +538,7 @@ class Run(models.Model):
 
     @property
     def is_full(self):
-        if self.limit != 0 and self.limit <= self.users.count():
+        if self.limit != 0 and self.limit <= self.users_count:
             return True
         return False
 
@@ -543,6 +546,36 @@ class Run(models.Model):
     def self_paced(self):
         return self.course.self_paced()
 
+    @property
+    def schedule(self):
+        """
+        Start and end dates of all the chapters in this run (computed once per instance).
+        """
+        if getattr(self, "_schedule", None) is None:
+            from courses.app_logic.schedule import RunSchedule
+
+            self._schedule = RunSchedule(self)
+
+        return self._schedule
+
+    @property
+    def settings(self):
+        """
+        Run settings merged with Course metadata options and courses.settings (computed once per instance, again
+        only if the Run or Course metadata is replaced).
+        """
+        sources = (self.metadata, self.course.metadata)
+
+        if getattr(self, "_settings", None) is None or any(
+            current is not previous for current, previous in zip(sources, self._settings_sources)
+        ):
+            from courses.app_logic.run_settings import RunSettings
+
+            self._settings = RunSettings(self)
+            self._settings_sources = sources
+
+        return self._settings
+
     def is_subscribed(self, user, raise_unsubscribed=False):
         if user.id is None:
             # AnonymousUser, a.k.a. not logged in...
@@ -557,6 +590,30 @@ class Run(models.Model):
         else:
             return False
 
+    def enroll(self, user, through_defaults=None):
+        """
+        Subscribes the user to the run if the limit has not been reached yet, returns whether the user was subscribed.
+
+        The capacity check is a conditional UPDATE of the run row, that locks the row until the end of transaction,
+        concurrent enrollments wait and re-evaluate the condition with already incremented users_count.
+        """
+        with transaction.atomic():
+            available = (
+                Run.objects_no_relations.filter(id=self.id)
+                .filter(Q(limit=0) | Q(users_count__lt=F("limit")))
+                .update(users_count=F("users_count"))
+            )
+
+            if not available:
+                return False
+
+            # users_count is incremented by courses.signals
+            self.users.add(user, through_defaults=through_defaults)
+
+        self.refresh_from_db(fields=["users_count"])
+
+        return True
+
     def is_subscribed_in_different_active_run(self, user):
         for run in (
             self.course.run_set.filter(Q(end__gte=datetime.today()) | Q(end=None))
@@ -569,44 +626,55 @@ class Run(models.Model):
         return False
 
     def passed(self, user_id):
-        passed = True
-        required_chapters, required_lectures = self.course.get_required_submissions(lecture=True, chapter=True)
-        submissions = self.submission_set.filter(author_id=user_id).all()
-
-        for chapter in required_chapters:
-            has_submissoin = False
-
-            for submission in submissions:
-                if chapter == submission.lecture:
-                    has_submissoin = True
-
-            if not has_submissoin:
-                passed = False
+        return self.get_eligibility(user_ids=[user_id])[int(user_id)].passed
+
+    def get_eligibility(self, user_ids=None):
+        """
+        Evaluates required submissions for all users of the run (or just the selected ones) at once.
+        Returns {user_id: Eligibility(passed, missing_chapters, missing_lectures)} with IDs of missing chapters and
+        lectures.
+        """
+        required_chapters = set(
+            Chapter.objects_no_relations.filter(course_id=self.course_id)
+            .filter(require_submission__in=("C", "E"))
+            .values_list("id", flat=True)
+        )
+        required_lectures = set(
+            Lecture.objects_no_relations.filter(chapter__course_id=self.course_id)
+            .filter(require_submission__in=("C", "E"))
+            .values_list("id", flat=True)
+        )
 
-        for lecture in required_lectures:
-            has_submissoin = False
+        if user_ids is None:
+            user_ids = RunUsers.objects.filter(run=self).values_list("user_id", flat=True).distinct()
 
-            for submission in submissions:
-                if lecture == submission.lecture:
-                    has_submissoin = True
+        submitted = {int(user_id): (set(), set()) for user_id in user_ids}
 
-            if not has_submissoin:
-                passed = False
+        if submitted and (required_chapters or required_lectures):
+            for author_id, chapter_id, lecture_id in (
+                Submission.objects_no_relations.filter(run=self, author_id__in=submitted.keys())
+                .filter(Q(chapter_id__in=required_chapters) | Q(lecture_id__in=required_lectures))
+                .values_list("author_id", "chapter_id", "lecture_id")
+                .distinct()
+            ):
+                submitted[author_id][0].add(chapter_id)
+                submitted[author_id][1].add(lecture_id)
+
+        eligibility = {}
+
+        for user_id, (chapters, lectures) in submitted.items():
+            missing_chapters = required_chapters - chapters
+            missing_lectures = required_lectures - lectures
+            eligibility[user_id] = Eligibility(
+                passed=not missing_chapters and not missing_lectures,
+                missing_chapters=missing_chapters,
+                missing_lectures=missing_lectures,
+            )
 
-        return passed
+        return eligibility
 
     def get_setting(self, option):
-        if self.metadata and "options" in self.metadata and option in self.metadata["options"]:
-            option_value = self.metadata["options"][option]
-        elif self.course.metadata and "options" in self.course.metadata and option in self.course.metadata["options"]:
-            option_value = self.course.metadata["options"][option]
-        else:
-            option_value = getattr(course_settings, option, "__NOT_FOUND__")
-
-            if option_value == "__NOT_FOUND__":
-                raise ValueError("Unknown setting!")
-
-        return option_value
+        return self.settings.get(option)
 
     def get_subscription_level(self, user):
         level = []
@@ -630,7 +698,20 @@ class Run(models.Model):
         if self.length != 0:
             self.end = self.start + timedelta(days=self.length - 1)
 
+        if self.pk is None:
+            # New run (or a copy of one, `run.pk = None`) has no users yet
+            self.users_count = 0
+        elif not self._state.adding and not args and kwargs.get("update_fields") is None:
+            # users_count is maintained by atomic updates only, never overwrite it with a (possibly stale) value
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "users_count"
+            ]
+
         super().save(*args, **kwargs)
+        self._schedule = None
+        self._settings = None
 
 
 class Faq(models.Model):
@@ -746,6 +827,12 @@ class Coupon(models.Model):
         help_text=_("Coupon can be used to this date."),
     )
     limit = models.IntegerField(default=0, help_text=_("How many times the Coupon can be used."))
+    usages_count = models.PositiveIntegerField(
+        verbose_name=_("Usages count"),
+        default=0,
+        editable=False,
+        help_text=_("How many times the Coupon has been used, it is maintained automatically."),
+    )
     discount_type = models.CharField(verbose_name=_("Discount Type"), max_length=1, choices=DISCOUNT_TYPES)
     discount = models.FloatField(
         blank=True,
@@ -763,8 +850,9 @@ class Coupon(models.Model):
         return self.title
 
     def count_usages(self):
-        run_users = RunUsers.objects.filter(discount_coupon=self)
-        return run_users.count()
+        return self.usages_count
+
+    count_usages.short_description = _("Usages")
 
 
 class MeetingManager(models.Manager):
@@ -835,7 +923,7 @@ class Meeting(models.Model):
         # if self.run not in self.lecture.chapter.course.get_active_runs():
         #     raise ValidationError({"lecture": _("Lecture does not belong to this course (and its chapters).")})
 
-        start, end = self.lecture.chapter.get_run_dates(self.run)
+        start, end = self.run.schedule.get_dates(self.lecture.chapter)
 
         if self.start.date() < start:
             raise ValidationError({"start": _(f"Meeting is scheduled before the lecture's chapter starts: {start}.")})
@@ -896,6 +984,14 @@ class Submission(models.Model):
         ],
     )
     video_link = models.CharField(verbose_name=_("Video link"), max_length=250, null=True, blank=True)
+    video_link_tag = models.CharField(
+        verbose_name=_("YouTube video ID"),
+        max_length=11,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Extracted from the video link (or description) when the submission is saved."),
+    )
     lecture = models.ForeignKey(Lecture, verbose_name=_("Lecture"), on_delete=models.CASCADE, null=True, blank=True)
     chapter = models.ForeignKey(Chapter, verbose_name=_("Chapter"), on_delete=models.CASCADE, null=True, blank=True)
     run = models.ForeignKey(Run, verbose_name=_("Run"), on_delete=models.CASCADE)
@@ -909,6 +1005,23 @@ class Submission(models.Model):
     def __str__(self):
         return f"{self.lecture}: {self.title}"
 
+    def get_video_link_tag(self):
+        """
+        Returns YouTube video ID from the video link or (if there is no video link) from the description.
+        """
+        # TODO: Add support for other platforms (such as Vimeo, OneDrive, ...)
+        match = YOUTUBE_VIDEO_REGEX.match(self.video_link or self.description or "")
+
+        return match.group("id") if match else None
+
+    def save(self, *args, **kwargs):
+        self.video_link_tag = self.get_video_link_tag()
+
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"video_link_tag"}
+
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.chapter:
 
@@ -929,6 +1042,99 @@ class Submission(models.Model):
                 raise ValidationError({"lecture": _("Selected lecture does not belong to submission's course.")})
 
 
+class VideoPing(models.Model):
+    """
+    Buffered video watched time range, merged to Submission by `flush_video_pings` management command.
+    """
+
+    class Meta:
+        verbose_name = _("Video Ping")
+        verbose_name_plural = _("Video Pings")
+
+    run = models.ForeignKey(Run, verbose_name=_("Run"), on_delete=models.CASCADE)
+    lecture = models.ForeignKey(Lecture, verbose_name=_("Lecture"), on_delete=models.CASCADE)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_("Author"), on_delete=models.CASCADE)
+    time_range = models.JSONField(verbose_name=_("Video watched time range"))
+    timestamp_added = models.DateTimeField(verbose_name=_("Added"), auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.lecture}: {self.author} {self.timestamp_added}"
+
+
+class WatchProgress(models.Model):
+    """
+    Video watch progress of a user in a lecture of a run, kept along with the watched time range in Submission
+    metadata (see courses.app_logic.watch_progress), so the progress can be filtered and aggregated by the database.
+    """
+
+    class Meta:
+        verbose_name = _("Watch Progress")
+        verbose_name_plural = _("Watch Progress")
+
+        unique_together = (
+            "run",
+            "user",
+            "lecture",
+        )
+        indexes = [
+            models.Index(fields=["run", "lecture", "watched_percent"], name="courses_wp_run_lecture_idx"),
+            models.Index(fields=["run", "last_seen"], name="courses_wp_run_last_seen_idx"),
+        ]
+
+    run = models.ForeignKey(Run, verbose_name=_("Run"), on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_("User"), on_delete=models.CASCADE)
+    lecture = models.ForeignKey(Lecture, verbose_name=_("Lecture"), on_delete=models.CASCADE)
+    watched_seconds = models.FloatField(verbose_name=_("Watched seconds"), default=0)
+    watched_percent = models.FloatField(
+        verbose_name=_("Watched percent"),
+        null=True,
+        blank=True,
+        help_text=_("Unknown until the video duration is known."),
+    )
+    last_seen = models.DateTimeField(verbose_name=_("Last seen"))
+
+    def __str__(self):
+        return f"{self.lecture}: {self.user} {self.watched_percent} %"
+
+
+class PayPalOrder(models.Model):
+    """
+    Ledger of PayPal orders reported by webhook or by the browser, one row per order. Orders are verified with
+    PayPal API and paid to the RunUser only once (see courses.app_logic.payments).
+    """
+
+    PENDING = "P"
+    COMPLETED = "C"
+    FAILED = "F"
+    STATE = (
+        (PENDING, _("Pending")),
+        (COMPLETED, _("Completed")),
+        (FAILED, _("Failed")),
+    )
+
+    class Meta:
+        verbose_name = _("PayPal Order")
+        verbose_name_plural = _("PayPal Orders")
+
+    order_id = models.CharField(verbose_name=_("Order ID"), max_length=64, unique=True)
+    run_user = models.ForeignKey(
+        RunUsers, verbose_name=_("Run User"), on_delete=models.SET_NULL, null=True, blank=True
+    )
+    state = models.CharField(verbose_name=_("State"), max_length=1, choices=STATE, default=PENDING, db_index=True)
+    amount = models.FloatField(verbose_name=_("Amount"), null=True, blank=True)
+    currency = models.CharField(verbose_name=_("Currency"), max_length=3, null=True, blank=True)
+    attempts = models.PositiveIntegerField(verbose_name=_("Attempts"), default=0)
+    error = models.TextField(verbose_name=_("Error"), null=True, blank=True)
+    event = models.JSONField(
+        verbose_name=_("Event"), null=True, blank=True, help_text=_("Last webhook event received for the order.")
+    )
+    timestamp_added = models.DateTimeField(verbose_name=_("Added"), auto_now_add=True)
+    timestamp_modified = models.DateTimeField(verbose_name=_("Modified"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.order_id}: {self.get_state_display()}"
+
+
 class ReviewManager(models.Manager):
     """
     Manager at pre-select all related items for each query set.
@@ -1005,7 +1211,14 @@ class Certificate(models.Model):
         validators=[FileExtensionValidator(["pdf"]), FileSizeValidator(course_settings.MAX_FILE_SIZE_UPLOAD_FRONTEND)],
         null=True,
         blank=True,
-        help_text=_("Field not used for now. Please ignore it."),
+        help_text=_("Rendered PDF of the certificate, it is generated automatically."),
+    )
+    data_template_modified = models.DateTimeField(
+        verbose_name=_("Data template modified"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Modification time of the certificate template used to render the PDF."),
     )
     run = models.ForeignKey(Run, verbose_name=_("Run"), on_delete=models.RESTRICT)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_("User"), on_delete=models.CASCADE)
@@ -1020,6 +1233,16 @@ class Certificate(models.Model):
     def __str__(self):
         return _("Certificate") + f": {self.run} - {self.user}"
 
+    @property
+    def is_pdf_stale(self):
+        """
+        Whether the stored PDF is missing or was rendered with an older version of the certificate template.
+        """
+        if not self.data or not self.certificate_template:
+            return True
+
+        return self.data_template_modified != self.certificate_template.timestamp_modified
+
 
 class EmailTemplate(models.Model):
     title = models.CharField(
@@ -1114,4 +1337,37 @@ class CertificateTemplate(models.Model):
     timestamp_modified = models.DateTimeField(verbose_name=_("Modified"), auto_now=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+class SearchEntry(models.Model):
+    """
+    Searchable document of a Course, Chapter, Lecture or Faq. Entries are maintained by courses.signals and indexed by
+    the full-text search backend of the database (see courses.app_logic.search).
+    """
+
+    KIND = (
+        ("course", _("Course")),
+        ("chapter", _("Chapter")),
+        ("lecture", _("Lecture")),
+        ("faq", _("Frequently asked question")),
+    )
+
+    class Meta:
+        verbose_name = _("Search Entry")
+        verbose_name_plural = _("Search Entries")
+
+        unique_together = (
+            "kind",
+            "object_id",
+        )
+
+    kind = models.CharField(verbose_name=_("Kind"), max_length=7, choices=KIND)
+    object_id = models.PositiveIntegerField(verbose_name=_("Object ID"))
+    course = models.ForeignKey(Course, verbose_name=_("Course"), on_delete=models.CASCADE)
+    title = models.CharField(verbose_name=_("Title"), max_length=250)
+    body = models.TextField(verbose_name=_("Body"), blank=True)
+    timestamp_modified = models.DateTimeField(verbose_name=_("Modified"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
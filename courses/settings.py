@@ -37,9 +37,56 @@ COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS = getattr(settings, "COURSES_ALLOW_ACCES
 # Wheather to show 404 or the details of the chapter if it has passed.
 COURSES_ALLOW_SUBMISSION_TO_PASSED_CHAPTERS = getattr(settings, "COURSES_ALLOW_SUBMISSION_TO_PASSED_CHAPTERS", False)
 
+# Whether to only store video watch pings to a buffer (VideoPing) and merge them to Submissions later with the
+# `flush_video_pings` management command instead of updating the Submission on every ping.
+COURSES_VIDEO_PING_BUFFERED = getattr(settings, "COURSES_VIDEO_PING_BUFFERED", False)
+
 # Path for Certificate that is generated uppon successfull course finish
 COURSES_CERTIFICATE_TEMPLATE_PATH = getattr(settings, "COURSES_CERTIFICATE_TEMPLATE_PATH", "courses/certificate.html")
 
+# Max number of compiled EmailTemplate and CertificateTemplate templates kept in memory (per process).
+COURSES_TEMPLATE_CACHE_SIZE = getattr(settings, "COURSES_TEMPLATE_CACHE_SIZE", 128)
+
+# Max number of ranked results of full-text search and number of results per page.
+COURSES_SEARCH_MAX_RESULTS = getattr(settings, "COURSES_SEARCH_MAX_RESULTS", 500)
+COURSES_SEARCH_PAGE_SIZE = getattr(settings, "COURSES_SEARCH_PAGE_SIZE", 20)
+
+# How long (seconds) are rendered htmx run tabs cached, they are invalidated by any change of the course content.
+COURSES_FRAGMENT_CACHE_TIMEOUT = getattr(settings, "COURSES_FRAGMENT_CACHE_TIMEOUT", 3600)
+
+# Number of submissions loaded at once in the "My group" feed.
+COURSES_GROUP_PAGE_SIZE = getattr(settings, "COURSES_GROUP_PAGE_SIZE", 10)
+
+# Number of attendees loaded at once in the staff attendees table.
+COURSES_ATTENDEES_PAGE_SIZE = getattr(settings, "COURSES_ATTENDEES_PAGE_SIZE", 50)
+
+# Number of rows fetched from the database at once by exports (eg. run attendees CSV).
+COURSES_EXPORT_CHUNK_SIZE = getattr(settings, "COURSES_EXPORT_CHUNK_SIZE", 2000)
+
+# Timeout (seconds) of each request to PayPal API and how many times are failed requests retried.
+COURSES_PAYPAL_TIMEOUT = getattr(settings, "COURSES_PAYPAL_TIMEOUT", 10)
+COURSES_PAYPAL_RETRIES = getattr(settings, "COURSES_PAYPAL_RETRIES", 2)
+
+# Whether PayPal orders (reported by webhook or browser) are only stored to the ledger (PayPalOrder) and verified
+# later by `process_paypal_orders` management command (has to be run periodically), and how many times is the
+# verification of an order tried.
+COURSES_PAYPAL_ORDERS_BUFFERED = getattr(settings, "COURSES_PAYPAL_ORDERS_BUFFERED", True)
+COURSES_PAYPAL_MAX_ATTEMPTS = getattr(settings, "COURSES_PAYPAL_MAX_ATTEMPTS", 10)
+
+# PayPal webhook IDs by PaymentProfile ID ({payment_profile_id: webhook_id}), webhook events are accepted only for
+# configured profiles and only if PayPal verifies their signature.
+COURSES_PAYPAL_WEBHOOK_IDS = getattr(settings, "COURSES_PAYPAL_WEBHOOK_IDS", {})
+
+# Callable (dotted path) resolving durations of a list of video URLs ({url: seconds}), used by
+# `backfill_video_durations` management command.
+COURSES_VIDEO_DURATION_PROVIDER = getattr(
+    settings, "COURSES_VIDEO_DURATION_PROVIDER", "courses.app_logic.video_durations.vimeo_video_durations"
+)
+
+# Whether the chatty AJAX (video pings) and htmx (run tabs) endpoints are served by async views, enable it only if
+# the project is served by ASGI.
+COURSES_ASYNC_VIEWS = getattr(settings, "COURSES_ASYNC_VIEWS", False)
+
 # Email settings
 COURSES_EMAIL_SUBJECT_PREFIX = getattr(settings, "COURSES_EMAIL_SUBJECT_PREFIX", "")
 COURSES_SUBSCRIBED_EMAIL_SUBJECT = getattr(
@@ -0,0 +1,191 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from courses.app_logic.fragments import bump_content_version
+from courses.app_logic.group_feed import invalidate_group_feed
+from courses.app_logic.schedule import invalidate_chapter_offsets
+from courses.app_logic.search import index_instance, remove_instance
+from courses.app_logic.syllabus import invalidate_syllabus_stats
+from courses.app_logic.template_cache import template_cache
+from courses.app_logic.watch_progress import delete_watch_progress, has_watch_progress, save_watch_progress
+from courses.models import (
+    Chapter,
+    CertificateTemplate,
+    Coupon,
+    Course,
+    EmailTemplate,
+    Faq,
+    Lecture,
+    Run,
+    RunUsers,
+    Submission,
+)
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    invalidate_chapter_offsets(instance.course_id)
+    invalidate_syllabus_stats(instance.course_id)
+    bump_content_version(instance.course_id)
+
+
+@receiver(post_save, sender=Lecture)
+@receiver(post_delete, sender=Lecture)
+def lecture_changed(sender, instance, **kwargs):
+    # Chapter might be already deleted (cascade), so it is not loaded through instance.chapter
+    course_id = Chapter.objects_no_relations.filter(id=instance.chapter_id).values_list("course_id", flat=True).first()
+
+    if course_id:
+        invalidate_syllabus_stats(course_id)
+        bump_content_version(course_id)
+
+
+@receiver(pre_save, sender=Lecture)
+def lecture_video_changed(sender, instance, raw=False, **kwargs):
+    # Video duration is stored only once (see store_video_duration), a replaced video has to be measured again
+    if raw or instance._state.adding or not isinstance(instance.metadata, dict):
+        return
+
+    if "video_duration" not in instance.metadata:
+        return
+
+    previous_video = Lecture.objects_no_relations.filter(id=instance.id).values_list("video", flat=True).first()
+
+    if previous_video != instance.video:
+        instance.metadata = {key: value for key, value in instance.metadata.items() if key != "video_duration"}
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Run)
+@receiver(post_delete, sender=Run)
+@receiver(post_save, sender=Faq)
+@receiver(post_delete, sender=Faq)
+def content_changed(sender, instance, **kwargs):
+    # Cached htmx run tabs (see courses.app_logic.fragments)
+    bump_content_version(instance.id if sender is Course else instance.course_id)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def submission_changed(sender, instance, **kwargs):
+    # Watching videos saves submissions all the time, only projects are displayed in the group feed
+    if not instance.lecture_id:
+        return
+
+    if Submission.lecture.is_cached(instance):
+        is_project = instance.lecture.lecture_type == "P"
+    else:
+        is_project = Lecture.objects_no_relations.filter(id=instance.lecture_id, lecture_type="P").exists()
+
+    if is_project:
+        invalidate_group_feed(instance.run_id)
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance, raw=False, **kwargs):
+    # Fixtures (raw) are loaded as they are, bulk saves (flush_video_pings) send no signals and store watch progress
+    # on their own
+    if not raw and has_watch_progress(instance):
+        save_watch_progress(instance)
+
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance, **kwargs):
+    if has_watch_progress(instance):
+        delete_watch_progress(instance)
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+@receiver(post_save, sender=CertificateTemplate)
+@receiver(post_delete, sender=CertificateTemplate)
+def template_changed(sender, instance, **kwargs):
+    template_cache.invalidate(instance)
+
+
+def update_users_count(run_ids, delta):
+    Run.objects_no_relations.filter(id__in=run_ids).update(users_count=F("users_count") + delta)
+
+
+@receiver(post_save, sender=RunUsers)
+def run_user_saved(sender, instance, created, raw=False, **kwargs):
+    # Fixtures (raw) carry their own users_count
+    if created and not raw:
+        update_users_count([instance.run_id], 1)
+
+
+@receiver(m2m_changed, sender=RunUsers)
+def run_users_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # Run.users.add() (and User.run_set.add()) bulk creates RunUsers without post_save, pk_set holds only new ones.
+    # Removal is handled by post_delete, which is sent for every deleted RunUsers.
+    if action != "post_add" or not pk_set:
+        return
+
+    if reverse:
+        update_users_count(pk_set, 1)
+    else:
+        update_users_count([instance.id], len(pk_set))
+
+
+def update_usages_count(coupon_id, delta):
+    coupons = Coupon.objects.filter(id=coupon_id)
+
+    if delta < 0:
+        coupons = coupons.filter(usages_count__gt=0)
+
+    coupons.update(usages_count=F("usages_count") + delta)
+
+
+@receiver(pre_save, sender=RunUsers)
+def run_user_changed(sender, instance, raw=False, **kwargs):
+    # Saves moving the RunUser to a different run or setting discount_coupon directly (admin). ApplyCoupon redeems
+    # coupons by UPDATE (no signals), new RunUsers are counted by run_user_saved.
+    if raw:
+        return
+
+    previous_run_id, previous_coupon_id = None, None
+
+    if not instance._state.adding:
+        previous = RunUsers.objects.filter(id=instance.id).values_list("run_id", "discount_coupon_id").first()
+
+        if previous:
+            previous_run_id, previous_coupon_id = previous
+
+    if previous_run_id and previous_run_id != instance.run_id:
+        update_users_count([previous_run_id], -1)
+        update_users_count([instance.run_id], 1)
+
+    if previous_coupon_id == instance.discount_coupon_id:
+        return
+
+    if previous_coupon_id:
+        update_usages_count(previous_coupon_id, -1)
+
+    if instance.discount_coupon_id:
+        update_usages_count(instance.discount_coupon_id, 1)
+
+
+@receiver(post_delete, sender=RunUsers)
+def run_user_deleted(sender, instance, **kwargs):
+    update_users_count([instance.run_id], -1)
+
+    if instance.discount_coupon_id:
+        update_usages_count(instance.discount_coupon_id, -1)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Chapter)
+@receiver(post_save, sender=Lecture)
+@receiver(post_save, sender=Faq)
+def searchable_saved(sender, instance, **kwargs):
+    index_instance(instance)
+
+
+@receiver(post_delete, sender=Chapter)
+@receiver(post_delete, sender=Lecture)
+@receiver(post_delete, sender=Faq)
+def searchable_deleted(sender, instance, **kwargs):
+    # Entries of deleted Course are deleted by cascade
+    remove_instance(instance)
@@ -13,7 +13,7 @@ register = template.Library()
 
 @register.filter
 def get_run_dates(chapter, run):
-    start, end = chapter.get_run_dates(run=run)
+    start, end = run.schedule.get_dates(chapter)
     return f"{start} - {end}"
 
 
@@ -51,13 +51,36 @@ def subtract(value, arg):
     return value - arg
 
 
+def get_subscription_state(run, user):
+    """
+    Returns subscription state resolved in bulk (see resolve_subscription_states) if it belongs to the user.
+    """
+    state = getattr(run, "subscription_state", None)
+
+    if state is not None and state.user_id == user.id:
+        return state
+
+    return None
+
+
 @register.filter
 def is_subscribed(run, user):
+    state = get_subscription_state(run, user)
+
+    if state is not None:
+        return state.subscribed
+
     return run.is_subscribed(user)
 
 
 @register.filter
 def has_passed(run, user):
+    # Eligibility might be evaluated upfront by the view (see views_staff.run_attendee_submissions)
+    eligibility = getattr(run, "eligibility", None)
+
+    if eligibility is not None and user.id in eligibility:
+        return eligibility[user.id].passed
+
     return run.passed(user.id)
 
 
@@ -67,6 +90,10 @@ def check_payment(run, user):
     Checks whether the RunUser (course registration) is "Free", "Paid" or "Unpaid"
     and returns a string with the current status.
     """
+    state = get_subscription_state(run, user)
+
+    if state is not None:
+        return state.payment_status
 
     run_user = RunUsers.objects.get(run=run, user=user)
     if run_user.price == 0:
@@ -84,9 +111,24 @@ def user_payment(run, user):
 
 @register.filter
 def get_certificates(run, user):
+    state = get_subscription_state(run, user)
+
+    if state is not None and state.certificates is not None:
+        return state.certificates
+
     return run.certificate_set.filter(user=user).all()
 
 
+@register.filter
+def has_active_runs(course, run=None):
+    state = getattr(run, "subscription_state", None)
+
+    if state is not None and state.course_has_active_runs is not None:
+        return state.course_has_active_runs
+
+    return course.has_active_runs()
+
+
 @register.filter()
 def lecture_type_icon(lecture_type):
     icon = ""
@@ -0,0 +1,272 @@
+"""
+Query count / latency benchmark of every named route in courses.urls.
+
+The synthetic dataset is scaled by COURSES_BENCHMARK_SCALE environment variable (default 1), budgets can be overridden
+by COURSES_BENCHMARK_BUDGETS (JSON, eg. '{"courses": {"queries": 20}}'). Budgets do not depend on the scale, a view
+whose query count grows with the dataset (N+1) sooner or later exceeds its budget.
+
+Set COURSES_BENCHMARK_REPORT=1 to print the measured query counts, wall time and rendered bytes of every request
+(wall time depends on the machine, so it is not asserted).
+
+Async video pings are sent by COURSES_BENCHMARK_VIEWERS simultaneous viewers (default 100 * scale, so scale 10 gives
+1,000 viewers). Test database serializes them, the actual concurrency gain shows only under an ASGI server.
+"""
+
+import asyncio
+import json
+import os
+
+from datetime import date, timedelta
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from courses import urls
+from courses.models import Certificate, Chapter, Course, Lecture, Run, RunUsers, Submission
+from courses.views import views_ajax_async
+
+BENCHMARK_SCALE = int(os.getenv("COURSES_BENCHMARK_SCALE", 1))
+BENCHMARK_REPORT = bool(os.getenv("COURSES_BENCHMARK_REPORT"))
+BENCHMARK_VIEWERS = int(os.getenv("COURSES_BENCHMARK_VIEWERS", 100 * BENCHMARK_SCALE))
+
+# Max number of SQL queries per request of any user (wall time depends on the machine, it is only reported)
+DEFAULT_BUDGET = {"queries": 30}
+BUDGETS = {
+    "courses": {"queries": 15},
+    "all_active_runs": {"queries": 15},
+    "all_closed_runs": {"queries": 15},
+    "all_subscribed_runs": {"queries": 15},
+    "all_subscribed_active_runs": {"queries": 15},
+    "all_subscribed_closed_runs": {"queries": 15},
+    "course_detail": {"queries": 20},
+    "course_run_detail": {"queries": 25},
+    "course_run_chapters": {"queries": 25},
+    "run_attendees": {"queries": 25},
+    "run_attendees_export": {"queries": 15},
+    "run_attendee_submissions": {"queries": 25},
+}
+BUDGETS.update(json.loads(os.getenv("COURSES_BENCHMARK_BUDGETS", "{}")))
+
+# Routes calling external services
+EXCLUDED_ROUTES = ("verify_paypal_order",)
+
+USERS = ("anonymous", "student", "staff")
+
+
+def get_budget(route):
+    return {**DEFAULT_BUDGET, **BUDGETS.get(route, {})}
+
+
+@tag("benchmark")
+class URLBenchmark(TestCase):
+    courses_count = 2 * BENCHMARK_SCALE
+    chapters_count = 4 * BENCHMARK_SCALE
+    lectures_count = 3 * BENCHMARK_SCALE
+    runs_count = 2
+    users_count = 10 * BENCHMARK_SCALE
+
+    @classmethod
+    def setUpTestData(cls):
+        # Rows referenced later are not bulk created, SQLite does not return their IDs
+        cls.staff = User.objects.create(username="bench-staff", is_staff=True)
+        cls.students = [
+            User.objects.create(username=f"bench-student-{i}", first_name="Student", last_name=str(i))
+            for i in range(cls.users_count)
+        ]
+        cls.student = cls.students[0]
+
+        today = date.today()
+        runs = []
+        lectures = []
+
+        for i in range(cls.courses_count):
+            course = Course.objects.create(
+                title=f"Course {i}", slug=f"bench-course-{i}", description="Benchmark", state="O", creator=cls.staff
+            )
+            previous = None
+
+            for j in range(cls.chapters_count):
+                previous = Chapter.objects.create(
+                    title=f"Chapter {j}",
+                    slug=f"bench-chapter-{i}-{j}",
+                    course=course,
+                    previous=previous,
+                    length=7,
+                    require_submission="E",
+                )
+                lectures += [
+                    Lecture.objects.create(
+                        title=f"Lecture {k}",
+                        slug=f"bench-lecture-{i}-{j}-{k}",
+                        chapter=previous,
+                        lecture_type="V",
+                        require_submission="N" if k else "E",
+                        metadata={"video_duration": 100},
+                    )
+                    for k in range(cls.lectures_count)
+                ]
+
+            for j in range(cls.runs_count):
+                # One active and one closed run per course
+                start = today - timedelta(days=7) if j == 0 else today - timedelta(days=365)
+                runs.append(
+                    Run.objects.create(
+                        title=f"Run {i}-{j}",
+                        slug=f"bench-run-{i}-{j}",
+                        course=course,
+                        start=start,
+                        end=start + timedelta(days=7 * cls.chapters_count),
+                        state="O",
+                        manager=cls.staff,
+                    )
+                )
+
+        RunUsers.objects.bulk_create([RunUsers(run=run, user=user, price=0) for run in runs for user in cls.students])
+        Submission.objects.bulk_create(
+            [
+                Submission(
+                    title="Benchmark",
+                    run=run,
+                    lecture=lecture,
+                    author=user,
+                    metadata={"video_watched_time_range": [[0, 50]], "video_watched_percent": 50.0},
+                )
+                for run in runs
+                for lecture in lectures
+                if lecture.chapter.course_id == run.course_id
+                for user in cls.students
+            ]
+        )
+
+        cls.bench_run = runs[0]
+        cls.chapter = Chapter.objects.filter(course=cls.bench_run.course).order_by("id").first()
+        cls.lecture = Lecture.objects.filter(chapter=cls.chapter).order_by("id").first()
+        cls.submission = Submission.objects.filter(run=cls.bench_run, lecture=cls.lecture, author=cls.student).first()
+        cls.certificate = Certificate.objects.create(run=runs[1], user=cls.student)
+        # The active run started a week ago, so only its second chapter is still open for video pings
+        cls.open_chapter = Chapter.objects.filter(course=cls.bench_run.course).order_by("id")[1]
+        cls.open_lecture = Lecture.objects.filter(chapter=cls.open_chapter).order_by("id").first()
+
+    def setUp(self):
+        cache.clear()
+
+    def get_route_kwargs(self):
+        run_kwargs = {"run_slug": self.bench_run.slug}
+        chapter_kwargs = {**run_kwargs, "chapter_slug": self.chapter.slug}
+        lecture_kwargs = {**chapter_kwargs, "lecture_slug": self.lecture.slug}
+        attendee_kwargs = {**run_kwargs, "user_id": self.student.id}
+
+        return {
+            "courses": {},
+            "all_active_runs": {},
+            "all_closed_runs": {},
+            "all_subscribed_runs": {},
+            "all_subscribed_active_runs": {},
+            "all_subscribed_closed_runs": {},
+            "search": {},
+            "course_detail": {"course_slug": self.bench_run.course.slug},
+            "course_run_detail": run_kwargs,
+            "course_run_overview": run_kwargs,
+            "course_run_chapters": run_kwargs,
+            "course_run_group": run_kwargs,
+            "course_run_help": run_kwargs,
+            "course_faq": run_kwargs,
+            "run_subscription_levels": run_kwargs,
+            "run_payment_instructions": run_kwargs,
+            "paypal_webhook": {"payment_profile_id": 1},
+            "subscribe_to_run": run_kwargs,
+            "unsubscribe_from_run": run_kwargs,
+            "chapter_detail": chapter_kwargs,
+            "chapter_submission": chapter_kwargs,
+            "chapter_lecture_types": {**chapter_kwargs, "lecture_type": "V"},
+            "lecture_detail": lecture_kwargs,
+            "video_duration": lecture_kwargs,
+            "video_ping": lecture_kwargs,
+            "certificate_pdf": {"uuid": self.certificate.uuid},
+            "certificate": {"uuid": self.certificate.uuid},
+            "runs": {},
+            "run_attendees": run_kwargs,
+            "run_attendees_export": run_kwargs,
+            "run_attendee_submissions": attendee_kwargs,
+            "run_attendee_generate_certificate": attendee_kwargs,
+            "lecture_submissions": lecture_kwargs,
+            "lecture_submission_review": {**lecture_kwargs, "submission_id": self.submission.id},
+            "email_nofification": {},
+        }
+
+    def login(self, user):
+        self.client.logout()
+
+        if user == "student":
+            self.client.force_login(self.student)
+        elif user == "staff":
+            self.client.force_login(self.staff)
+
+    def measure(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = self.client.get(url)
+
+            if response.streaming:
+                size = len(b"".join(response.streaming_content))
+            else:
+                size = len(response.content)
+
+            seconds = perf_counter() - start
+
+        return response, len(queries), seconds, size
+
+    def test_all_routes_are_benchmarked(self):
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern) and pattern.name}
+
+        self.assertEqual(names - set(EXCLUDED_ROUTES), set(self.get_route_kwargs()))
+
+    def test_budgets(self):
+        for route, kwargs in self.get_route_kwargs().items():
+            url = reverse(route, kwargs=kwargs)
+            budget = get_budget(route)
+
+            for user in USERS:
+                with self.subTest(route=route, user=user):
+                    self.login(user)
+                    response, queries, seconds, size = self.measure(url)
+
+                    if BENCHMARK_REPORT:
+                        print(
+                            f"{route:<36} {user:<10} {response.status_code} {queries:>4} queries "
+                            f"{seconds * 1000:>8.1f} ms {size:>9} B"
+                        )
+
+                    self.assertLess(response.status_code, 500)
+                    self.assertLessEqual(queries, budget["queries"], f"{route} ({user}): too many queries")
+
+    async def test_async_video_pings(self):
+        factory = AsyncRequestFactory()
+        kwargs = {
+            "run_slug": self.bench_run.slug,
+            "chapter_slug": self.open_chapter.slug,
+            "lecture_slug": self.open_lecture.slug,
+        }
+        url = reverse("video_ping", kwargs=kwargs)
+
+        async def ping(viewer):
+            request = factory.post(
+                url, {"video_watched_time_range": [[viewer, viewer + 10]]}, content_type="application/json"
+            )
+            request.user = self.students[viewer % len(self.students)]
+
+            return await views_ajax_async.video_lecture_submission(request, **kwargs)
+
+        start = perf_counter()
+        responses = await asyncio.gather(*(ping(viewer) for viewer in range(BENCHMARK_VIEWERS)))
+        seconds = perf_counter() - start
+
+        if BENCHMARK_REPORT:
+            print(f"{'video_ping (async)':<36} {BENCHMARK_VIEWERS} viewers {seconds * 1000:>8.1f} ms")
+
+        self.assertEqual({response.status_code for response in responses}, {200})
@@ -0,0 +1,237 @@
+from datetime import date, timedelta
+import csv
+
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+
+from courses.app_logic.syllabus import get_syllabus_stats
+from courses.models import (
+    Certificate,
+    EmailTemplate,
+    Lecture,
+    PayPalOrder,
+    Run,
+    RunUsers,
+    Submission,
+    VideoPing,
+    WatchProgress,
+)
+from courses.settings import COURSES_PAYPAL_MAX_ATTEMPTS
+
+
+def stub_video_durations(urls):
+    """
+    Local stub of the video duration provider, every video lasts 2 minutes.
+    """
+    return {url: 120 for url in urls}
+
+
+class FlushVideoPingsTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_flush_merges_pings_in_to_submission(self):
+        run = Run.objects.get(id=1)
+        lecture = Lecture.objects.get(id=1)
+        lecture.metadata = {"video_duration": 100}
+        lecture.save()
+        user = User.objects.get(id=3)
+
+        VideoPing.objects.create(run=run, lecture=lecture, author=user, time_range=[[0, 10]])
+        VideoPing.objects.create(run=run, lecture=lecture, author=user, time_range=[[5, 20], [30, 40]])
+
+        call_command("flush_video_pings", verbosity=0)
+
+        self.assertEqual(VideoPing.objects.count(), 0)
+        submission = Submission.objects.get(run=run, lecture=lecture, author=user)
+        self.assertEqual(submission.metadata["video_watched_time_range"], [[0, 20], [30, 40]])
+        self.assertEqual(submission.metadata["video_watched_percent"], 30.0)
+
+        VideoPing.objects.create(run=run, lecture=lecture, author=user, time_range=[[20, 30]])
+        call_command("flush_video_pings", verbosity=0)
+
+        submission = Submission.objects.get(run=run, lecture=lecture, author=user)
+        self.assertEqual(submission.metadata["video_watched_time_range"], [[0, 40]])
+        self.assertEqual(submission.metadata["video_watched_percent"], 40.0)
+        progress = WatchProgress.objects.get(run=run, lecture=lecture, user=user)
+        self.assertEqual((progress.watched_seconds, progress.watched_percent), (40, 40.0))
+
+    def test_invalid_pings_do_not_block_the_buffer(self):
+        run = Run.objects.get(id=1)
+        lecture = Lecture.objects.get(id=1)
+        user = User.objects.get(id=3)
+
+        VideoPing.objects.create(run=run, lecture=lecture, author=user, time_range=[["x", None]])
+        VideoPing.objects.create(run=run, lecture=lecture, author=user, time_range=[[0, 10]])
+
+        call_command("flush_video_pings", verbosity=0)
+
+        self.assertEqual(VideoPing.objects.count(), 0)
+        submission = Submission.objects.get(run=run, lecture=lecture, author=user)
+        self.assertEqual(submission.metadata["video_watched_time_range"], [[0, 10]])
+
+
+class NotifyRunStartedTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_emails_are_dispatched(self):
+        Run.objects.filter(id=1).update(start=date.today())
+        run = Run.objects.get(id=1)
+        run.course.mail_run_started = EmailTemplate.objects.create(
+            title="Run started", mail_subject="{{ course_run.title }}", mail_body_html="<p>Hi {{ user.username }}</p>"
+        )
+        run.course.save()
+        run.manager.email = "manager@example.com"
+        run.manager.save()
+        run.users.add(User.objects.get(id=3), User.objects.get(id=4), through_defaults={"price": 0})
+
+        out = StringIO()
+        call_command("notify_run_started", confirm=True, workers=1, batch_size=2, verbosity=1, stdout=out)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["manager@example.com", "tester1@example.com", "tester2@example.com"],
+        )
+        self.assertEqual(mail.outbox[0].subject, run.title)
+        self.assertIn("Sent 3 email(s).", out.getvalue())
+
+
+class GenerateCertificatePipelineTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_pipeline_creates_certificates_once(self):
+        Run.objects.filter(id=1).update(start=date.today() - timedelta(days=30), end=date.today() - timedelta(days=1))
+        run = Run.objects.get(id=1)
+        run.course.certificate_template = None
+        run.course.mail_certificate_generation = EmailTemplate.objects.create(
+            title="Certificate", mail_subject="Certificate", mail_body_html="<p>{{ certificate.uuid }}</p>"
+        )
+        run.course.save()
+        run.users.add(User.objects.get(id=3), User.objects.get(id=4), through_defaults={"price": 0})
+        Certificate.objects.filter(run=run).delete()
+
+        options = {"run_ids": "1", "user_ids": "3,4", "pipeline": True, "workers": 1, "verbosity": 0}
+        call_command("generate_certificate", **options)
+
+        self.assertEqual(set(Certificate.objects.filter(run=run).values_list("user_id", flat=True)), {3, 4})
+        self.assertEqual(len(mail.outbox), 2)
+
+        call_command("generate_certificate", **options)
+
+        self.assertEqual(Certificate.objects.filter(run=run).count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class ReconcileUsersCountTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_counters_are_reconciled(self):
+        Run.objects.filter(id__in=(1, 2)).update(users_count=10)
+
+        call_command("reconcile_users_count", verbosity=0)
+
+        for run in Run.objects.filter(id__in=(1, 2)):
+            self.assertEqual(run.users_count, run.users.count())
+
+
+class ExportRunAttendeesTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_export(self):
+        run = Run.objects.get(id=1)
+        video_count = Lecture.objects.filter(chapter__course=run.course, lecture_type="V").count()
+        # Stale video duration, the lecture counts as watched once
+        Submission.objects.create(run=run, lecture_id=1, author_id=2, metadata={"video_watched_percent": 700.0})
+        Submission.objects.create(run=run, lecture_id=2, author_id=2, metadata={"video_watched_percent": 50.0})
+        # Not a video lecture
+        Submission.objects.create(run=run, lecture_id=18, author_id=2, metadata={"video_watched_percent": 100.0})
+        certificate = Certificate.objects.get(run=run, user_id=1)
+        User.objects.filter(id=2).update(first_name="=HYPERLINK()")
+
+        out = StringIO()
+        call_command("export_run_attendees", run.slug, stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue().lstrip("\ufeff"))))
+
+        self.assertEqual([row["User ID"] for row in rows], ["1", "2"])
+        self.assertEqual(rows[0]["Certificate"], str(certificate.uuid))
+        self.assertEqual(rows[1]["Certificate"], "")
+        self.assertEqual(rows[0]["Watched (%)"], "0")
+        self.assertEqual(rows[1]["Watched (%)"], str(round((100.0 + 50.0) / video_count, 1)))
+        self.assertEqual(rows[1]["First Name"], "'=HYPERLINK()")
+
+
+class ProcessPayPalOrdersTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_order_is_paid_once(self):
+        run_user = RunUsers.objects.get(id=3)
+        PayPalOrder.objects.create(order_id="ORDER1", run_user=run_user)
+        paypal = mock.Mock()
+        paypal.get_order.return_value = {
+            "status": "COMPLETED",
+            "purchase_units": [
+                {"reference_id": str(run_user.id), "amount": {"value": "25.00", "currency_code": "EUR"}}
+            ],
+        }
+
+        with mock.patch("courses.app_logic.payments.PayPalClient.from_payment_profile", return_value=paypal):
+            call_command("process_paypal_orders", verbosity=0)
+            call_command("process_paypal_orders", verbosity=0)
+
+        self.assertEqual(paypal.get_order.call_count, 1)
+        self.assertEqual(PayPalOrder.objects.get(order_id="ORDER1").state, PayPalOrder.COMPLETED)
+        run_user.refresh_from_db()
+        self.assertEqual(run_user.payment, 25.0)
+
+    def test_not_completed_order_is_retried(self):
+        paypal_order = PayPalOrder.objects.create(order_id="ORDER2", run_user_id=3)
+        paypal = mock.Mock()
+        paypal.get_order.return_value = {"status": "APPROVED", "purchase_units": [{"reference_id": "3"}]}
+
+        with mock.patch("courses.app_logic.payments.PayPalClient.from_payment_profile", return_value=paypal):
+            call_command("process_paypal_orders", verbosity=0)
+
+        paypal_order.refresh_from_db()
+        self.assertEqual(paypal_order.state, PayPalOrder.PENDING)
+        self.assertEqual(paypal_order.attempts, 1)
+
+    def test_order_of_different_run_user(self):
+        # Someone else's order reported for RunUser 1
+        paypal_order = PayPalOrder.objects.create(order_id="ORDER3", run_user_id=1)
+        paypal = mock.Mock()
+        paypal.get_order.return_value = {"status": "COMPLETED", "purchase_units": [{"reference_id": "3"}]}
+
+        with mock.patch("courses.app_logic.payments.PayPalClient.from_payment_profile", return_value=paypal):
+            for _attempt in range(COURSES_PAYPAL_MAX_ATTEMPTS):
+                PayPalOrder.objects.filter(id=paypal_order.id).update(run_user_id=1)
+                call_command("process_paypal_orders", verbosity=0)
+
+        paypal_order.refresh_from_db()
+        self.assertEqual(paypal_order.state, PayPalOrder.PENDING)
+        self.assertEqual(paypal_order.attempts, 0)
+        self.assertIsNone(paypal_order.run_user_id)
+
+
+class BackfillVideoDurationsTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_backfill_keeps_known_durations(self):
+        Lecture.objects.filter(id=2).update(video="https://youtu.be/dQw4w9WgXcQ", metadata={"video_duration": 90})
+        Lecture.objects.filter(id=1).update(metadata={"note": "kept"})
+        course_id = Lecture.objects.get(id=1).chapter.course_id
+        self.assertEqual(get_syllabus_stats(course_id)["video_duration"], 90)
+
+        call_command(
+            "backfill_video_durations", provider="courses.tests.test_commands.stub_video_durations", verbosity=0
+        )
+
+        self.assertEqual(Lecture.objects.get(id=1).metadata, {"note": "kept", "video_duration": 120})
+        self.assertEqual(Lecture.objects.get(id=2).metadata, {"video_duration": 90})
+        self.assertFalse(Lecture.objects.exclude(video__isnull=True).exclude(video="").filter(metadata__isnull=True))
+        # Syllabus stats cache was invalidated
+        self.assertGreater(get_syllabus_stats(course_id)["video_duration"], 90)
@@ -1,7 +1,13 @@
+from datetime import date
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
-from courses.models import Run
+from courses.app_logic.courses_logic import ApplyCoupon, CouponNotValidException, resolve_subscription_states
+from courses.app_logic.syllabus import get_syllabus_stats
+from courses.app_logic.watch_progress import get_watched_percent
+from courses.models import Chapter, Coupon, Course, Lecture, Run, RunUsers, Submission, WatchProgress
 
 
 class RunTest(TestCase):
@@ -69,3 +75,321 @@ class RunTest(TestCase):
         # Default for COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS is True in django-course
         # if your project settings overwrite this value test will FAIL, since it would pick the project value
         self.assertEqual(run.get_setting("COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS"), True)
+
+    def test_settings_are_merged_once(self):
+        run = Run.objects.get(id=1)
+        run.course.metadata = {"options": {"COURSES_SHOW_FUTURE_CHAPTERS": True, "COURSES_CUSTOM_SETTING": "course"}}
+        run.metadata = {"options": {"COURSES_CUSTOM_SETTING": "run"}}
+
+        settings = run.settings
+        self.assertIs(run.settings, settings)
+        self.assertEqual(settings.COURSES_CUSTOM_SETTING, "run")
+        self.assertEqual(settings.COURSES_SHOW_FUTURE_CHAPTERS, True)
+        self.assertEqual(settings.COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS, True)
+
+        with self.assertRaises(AttributeError):
+            settings.COURSES_UNDEFINED_SETTING
+
+        # Replaced metadata is merged again
+        run.metadata = None
+        self.assertIsNot(run.settings, settings)
+        self.assertEqual(run.settings.COURSES_CUSTOM_SETTING, "course")
+
+
+class RunScheduleTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_chapter_dates(self):
+        run = Run.objects.get(id=1)
+        self.assertEqual(run.start, date(2021, 9, 28))
+
+        chapter = Chapter.objects.get(id=1)
+        self.assertEqual(run.schedule.get_dates(chapter), (date(2021, 9, 28), date(2021, 10, 4)))
+        self.assertEqual(chapter.get_run_dates(run), (date(2021, 9, 28), date(2021, 10, 4)))
+
+        chapter = Chapter.objects.get(id=3)
+        self.assertEqual(run.schedule.get_dates(chapter), (date(2021, 10, 12), date(2021, 10, 18)))
+
+    def test_chapter_dates_single_query(self):
+        run = Run.objects.get(id=1)
+        chapters = list(run.course.chapter_set.all())
+
+        with self.assertNumQueries(1):
+            for chapter in chapters:
+                run.schedule.get_dates(chapter)
+
+    def test_chapter_change_invalidates_schedule(self):
+        run = Run.objects.get(id=1)
+        chapter = Chapter.objects.get(id=3)
+        self.assertEqual(run.schedule.get_dates(chapter), (date(2021, 10, 12), date(2021, 10, 18)))
+
+        first_chapter = Chapter.objects.get(id=1)
+        first_chapter.length = 14
+        first_chapter.save()
+
+        run = Run.objects.get(id=1)
+        self.assertEqual(run.schedule.get_dates(chapter), (date(2021, 10, 19), date(2021, 10, 25)))
+
+
+class SyllabusStatsTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_syllabus_stats(self):
+        course = Course.objects.get(id=1)
+        lectures = Lecture.objects.filter(chapter__course=course)
+        lectures.update(metadata=None)
+        lecture = lectures.filter(lecture_type="V").first()
+        lecture.metadata = {"video_duration": 90.5}
+        lecture.save()
+
+        with self.assertNumQueries(1):
+            stats = get_syllabus_stats(course.id)
+
+        self.assertEqual(stats["lecture_count"], lectures.count())
+        self.assertEqual(stats["lecture_types"]["V"], lectures.filter(lecture_type="V").count())
+        self.assertEqual(stats["video_duration"], 90.5)
+
+        with self.assertNumQueries(0):
+            get_syllabus_stats(course.id)
+
+        lecture.metadata = {"video_duration": 100}
+        lecture.save()
+        self.assertEqual(get_syllabus_stats(course.id)["video_duration"], 100)
+
+
+class RunUsersCountTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_users_count_is_maintained(self):
+        run = Run.objects.get(id=1)
+        self.assertEqual(run.users_count, run.users.count())
+        users_count = run.users_count
+
+        user = User.objects.create(username="counted")
+        run.users.add(user, through_defaults={"price": 0})
+        run.refresh_from_db()
+        self.assertEqual(run.users_count, users_count + 1)
+
+        # Saving a stale instance does not overwrite the counter
+        stale_run = Run.objects.get(id=1)
+        user.run_set.remove(run)
+        stale_run.save()
+        run.refresh_from_db()
+        self.assertEqual(run.users_count, users_count)
+
+    def test_copy_is_inserted(self):
+        run = Run.objects.get(id=1)
+        run.pk = None
+        run.slug = "copy-of-run"
+        run.save()
+
+        self.assertNotEqual(run.pk, 1)
+        self.assertEqual(Run.objects.get(slug="copy-of-run").users_count, 0)
+
+    def test_run_user_moved(self):
+        run_user = RunUsers.objects.get(id=3)
+        source, target = Run.objects.get(id=1), Run.objects.get(id=4)
+
+        run_user.run = target
+        run_user.save()
+
+        for run in (source, target):
+            run.refresh_from_db()
+            self.assertEqual(run.users_count, run.users.count())
+
+    def test_enroll_respects_limit(self):
+        run = Run.objects.get(id=1)
+        run.limit = run.users_count + 1
+        run.save()
+
+        self.assertTrue(run.enroll(User.objects.create(username="first"), through_defaults={"price": 0}))
+        self.assertTrue(run.is_full)
+        self.assertFalse(run.enroll(User.objects.create(username="second"), through_defaults={"price": 0}))
+        self.assertEqual(run.users.count(), run.limit)
+
+
+class CouponRedemptionTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_coupon_usages_are_limited(self):
+        run = Run.objects.get(id=1)
+        coupon = Coupon.objects.create(
+            title="Half",
+            slug="half",
+            valid_from=date(2000, 1, 1),
+            valid_to=date(2100, 1, 1),
+            limit=1,
+            discount_type=Coupon.PERCENTAGE_DISCOUNT,
+            discount=50,
+        )
+        coupon.courses.add(run.course)
+        first = RunUsers.objects.create(run=run, user=User.objects.create(username="first"), price=100)
+        second = RunUsers.objects.create(run=run, user=User.objects.create(username="second"), price=100)
+
+        ApplyCoupon("half", first).execute()
+        first.refresh_from_db()
+        self.assertEqual((first.price, first.price_before_discount), (50, 100))
+        self.assertEqual(Coupon.objects.get(id=coupon.id).count_usages(), 1)
+
+        with self.assertRaises(CouponNotValidException):
+            ApplyCoupon("half", second).execute()
+
+        second.refresh_from_db()
+        self.assertEqual(second.price, 100)
+        self.assertIsNone(second.discount_coupon)
+
+        first.delete()
+        self.assertEqual(Coupon.objects.get(id=coupon.id).count_usages(), 0)
+
+    def test_coupon_changed_by_admin(self):
+        run = Run.objects.get(id=1)
+        coupons = [
+            Coupon.objects.create(
+                title=slug,
+                slug=slug,
+                valid_from=date(2000, 1, 1),
+                valid_to=date(2100, 1, 1),
+                limit=10,
+                discount_type=Coupon.FLAT_DISCOUNT,
+                discount=10,
+            )
+            for slug in ("first", "second")
+        ]
+        run_user = RunUsers.objects.create(
+            run=run, user=User.objects.create(username="first"), price=100, discount_coupon=coupons[0]
+        )
+        self.assertEqual([Coupon.objects.get(id=c.id).count_usages() for c in coupons], [1, 0])
+
+        run_user.discount_coupon = coupons[1]
+        run_user.save()
+        self.assertEqual([Coupon.objects.get(id=c.id).count_usages() for c in coupons], [0, 1])
+
+        run_user.price = 90
+        run_user.save()
+        self.assertEqual([Coupon.objects.get(id=c.id).count_usages() for c in coupons], [0, 1])
+
+        run_user.discount_coupon = None
+        run_user.save()
+        self.assertEqual([Coupon.objects.get(id=c.id).count_usages() for c in coupons], [0, 0])
+
+
+class SubscriptionStateTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_resolve_subscription_states(self):
+        user = User.objects.get(id=1)
+        runs = resolve_subscription_states(Run.objects.filter(id__in=(1, 2)).order_by("id"), user)
+
+        self.assertEqual(runs[0].subscription_state.subscribed, True)
+        self.assertEqual(len(runs[0].subscription_state.certificates), 1)
+        self.assertEqual(runs[1].subscription_state.subscribed, False)
+        self.assertEqual(runs[1].subscription_state.payment_status, None)
+        self.assertEqual(runs[1].subscription_state.certificates, [])
+
+    def test_resolve_subscription_states_constant_queries(self):
+        user = User.objects.get(id=1)
+
+        with self.assertNumQueries(7):
+            resolve_subscription_states(Run.objects.all(), user)
+
+
+class RunEligibilityTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_get_eligibility(self):
+        run = Run.objects.get(id=1)
+        chapter = Chapter.objects.get(id=2)
+        chapter.require_submission = "E"
+        chapter.save()
+        Chapter.objects.filter(course=run.course).exclude(id=chapter.id).update(require_submission="D")
+        Lecture.objects.filter(chapter__course=run.course).update(require_submission="N")
+
+        with self.assertNumQueries(4):
+            eligibility = run.get_eligibility()
+
+        # User 1 has submission for chapter 2 in the run 1, user 2 has not
+        self.assertEqual(eligibility[1].passed, True)
+        self.assertEqual(eligibility[2].passed, False)
+        self.assertEqual(eligibility[2].missing_chapters, {chapter.id})
+        self.assertEqual(run.passed(1), True)
+        self.assertEqual(run.passed(2), False)
+
+        lecture = Lecture.objects.get(id=8)
+        lecture.require_submission = "E"
+        lecture.save()
+
+        eligibility = run.get_eligibility()
+        self.assertEqual(eligibility[1].passed, False)
+        self.assertEqual(eligibility[1].missing_lectures, {lecture.id})
+
+
+class SubmissionVideoLinkTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_video_link_tag_is_extracted_on_save(self):
+        submission = Submission.objects.create(
+            title="Project", run_id=1, lecture_id=18, author_id=2, description="See https://youtu.be/dQw4w9WgXcQ"
+        )
+        self.assertEqual(submission.video_link_tag, "dQw4w9WgXcQ")
+
+        submission.video_link = "https://www.youtube.com/watch?v=9bZkp7q19f0"
+        submission.save(update_fields=["video_link"])
+        submission.refresh_from_db()
+        self.assertEqual(submission.video_link_tag, "9bZkp7q19f0")
+
+        submission.video_link = "https://example.com/video"
+        submission.save()
+        self.assertIsNone(submission.video_link_tag)
+
+
+class WatchProgressTest(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_progress_follows_submission(self):
+        run = Run.objects.get(id=1)
+        submission = Submission.objects.create(
+            run=run,
+            lecture_id=1,
+            author_id=2,
+            metadata={"video_watched_time_range": [[0, 10], [5, 20]], "video_watched_percent": 20.0},
+        )
+        progress = WatchProgress.objects.get(run=run, user_id=2, lecture_id=1)
+        self.assertEqual((progress.watched_seconds, progress.watched_percent), (20, 20.0))
+
+        submission.metadata = {"video_watched_time_range": [[0, 50]], "video_watched_percent": 50.0}
+        submission.save()
+        progress.refresh_from_db()
+        self.assertEqual((progress.watched_seconds, progress.watched_percent), (50, 50.0))
+
+        # Submissions without video progress (eg. projects) are not tracked
+        Submission.objects.create(run=run, lecture_id=18, author_id=2, title="Project")
+        self.assertEqual(WatchProgress.objects.filter(run=run).count(), 1)
+
+        video_count = Lecture.objects.filter(chapter__course=run.course, lecture_type="V").count()
+        self.assertEqual(get_watched_percent(run), {2: round(50.0 / video_count, 1)})
+
+        # Lecture counts at most once even if its percent is off (eg. stale video duration)
+        WatchProgress.objects.filter(run=run).update(watched_percent=700.0)
+        self.assertEqual(get_watched_percent(run), {2: round(100.0 / video_count, 1)})
+
+        submission.delete()
+        self.assertFalse(WatchProgress.objects.filter(run=run).exists())
+
+    def test_legacy_metadata(self):
+        run = Run.objects.get(id=1)
+        # Metadata used to be stored as sent by the browser
+        Submission.objects.create(
+            run=run,
+            lecture_id=1,
+            author_id=2,
+            metadata={"video_watched_time_range": [[5], [0, "10"]], "video_watched_percent": 700.0},
+        )
+
+        progress = WatchProgress.objects.get(run=run, user_id=2, lecture_id=1)
+        self.assertEqual((progress.watched_seconds, progress.watched_percent), (0, 100.0))
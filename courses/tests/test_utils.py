@@ -0,0 +1,152 @@
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.cache import cache
+from django.template import Context
+from django.test import SimpleTestCase, TestCase
+
+from courses.app_logic.paypal import PayPalClient, PayPalError
+from courses.app_logic.template_cache import get_compiled_template, template_cache
+from courses.models import EmailTemplate
+from courses.utils import IntervalSet, array_merge, get_video_watched_time_range
+
+
+class IntervalSetTest(SimpleTestCase):
+    def test_coalesce(self):
+        intervals = IntervalSet([[10, 20], [0, 5], [5, 8], [30, 40]])
+        self.assertEqual(intervals.to_list(), [[0, 8], [10, 20], [30, 40]])
+        self.assertEqual(intervals.total, 28)
+
+        intervals.add(7, 35)
+        self.assertEqual(intervals.to_list(), [[0, 40]])
+        self.assertEqual(intervals.total, 40)
+
+    def test_sorted_input(self):
+        intervals = IntervalSet([[i, i + 0.5] for i in range(50000)])
+        self.assertEqual(len(intervals), 50000)
+        self.assertEqual(intervals.total, 25000)
+
+    def test_array_merge(self):
+        self.assertEqual(array_merge([]), [])
+        self.assertEqual(array_merge([[3, 4], [1, 3], [6, 7]]), [[1, 4], [6, 7]])
+
+    def test_video_watched_time_range(self):
+        self.assertEqual(get_video_watched_time_range({"video_watched_time_range": [[0, 1.5]]}), [[0, 1.5]])
+
+        for time_range in ("0-10", [[10, 0]], [[0, "10"]], [[0, 1, 2]], [[-1, 5]], [[0, True]], [0, 10]):
+            with self.subTest(time_range=time_range):
+                with self.assertRaises(ValueError):
+                    get_video_watched_time_range({"video_watched_time_range": time_range})
+
+
+class CompiledTemplateCacheTest(TestCase):
+    def setUp(self):
+        template_cache.clear()
+
+    def test_template_is_compiled_once(self):
+        mail_template = EmailTemplate.objects.create(title="Test", mail_subject="Hi {{ user }}", mail_body_html="-")
+
+        template = get_compiled_template(mail_template, "mail_subject")
+        self.assertIs(get_compiled_template(mail_template, "mail_subject"), template)
+        self.assertEqual(template_cache.stats()["hits"], 1)
+        self.assertEqual(template_cache.stats()["misses"], 1)
+
+    def test_save_invalidates_template(self):
+        mail_template = EmailTemplate.objects.create(title="Test", mail_subject="Hi {{ user }}", mail_body_html="-")
+        get_compiled_template(mail_template, "mail_subject")
+
+        mail_template.mail_subject = "Hello {{ user }}"
+        mail_template.save()
+        self.assertEqual(template_cache.stats()["size"], 0)
+
+        template = get_compiled_template(mail_template, "mail_subject")
+        self.assertEqual(template.render(Context({"user": "Bob"})), "Hello Bob")
+
+
+class PayPalStubHandler(BaseHTTPRequestHandler):
+    """
+    Minimal PayPal API: issues tokens and returns a completed order to a valid token.
+    """
+
+    tokens = []
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        if self.path == "/v1/notifications/verify-webhook-signature":
+            data = json.loads(body)
+            valid = data["transmission_sig"] == "valid" and data["webhook_event"] == {"id": "WH-1", "value": 1.10}
+            self.respond(200, {"verification_status": "SUCCESS" if valid else "FAILURE"})
+        else:
+            self.tokens.append(f"token-{len(self.tokens)}")
+            self.respond(200, {"access_token": self.tokens[-1], "expires_in": 32400})
+
+    def do_GET(self):
+        if self.headers["Authorization"] != f"Bearer {self.tokens[-1]}":
+            self.respond(401, {"error": "invalid_token"})
+        else:
+            self.respond(200, {"id": self.path.rsplit("/", 1)[-1], "status": "COMPLETED"})
+
+
+class PayPalClientTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), PayPalStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        PayPalStubHandler.tokens = []
+        self.paypal = PayPalClient(f"http://127.0.0.1:{self.server.server_port}", "client", "secret")
+
+    def test_token_is_cached_and_renewed(self):
+        self.assertEqual(self.paypal.get_order("ORDER1")["status"], "COMPLETED")
+        self.assertEqual(self.paypal.get_order("ORDER2")["id"], "ORDER2")
+        self.assertEqual(len(PayPalStubHandler.tokens), 1)
+
+        # Token revoked at PayPal
+        PayPalStubHandler.tokens.append("token-revoked")
+        self.assertEqual(self.paypal.get_order("ORDER3")["status"], "COMPLETED")
+        self.assertEqual(len(PayPalStubHandler.tokens), 3)
+
+    def test_webhook_signature(self):
+        headers = {
+            "PayPal-Auth-Algo": "SHA256withRSA",
+            "PayPal-Cert-Url": "https://api.paypal.com/v1/notifications/certs/CERT",
+            "PayPal-Transmission-Id": "1",
+            "PayPal-Transmission-Sig": "valid",
+            "PayPal-Transmission-Time": "2026-10-18T10:00:00Z",
+        }
+        body = b'{"id": "WH-1", "value": 1.10}'
+
+        self.assertTrue(self.paypal.verify_webhook_signature("WEBHOOK", headers, body))
+        self.assertFalse(
+            self.paypal.verify_webhook_signature("WEBHOOK", {**headers, "PayPal-Transmission-Sig": "x"}, body)
+        )
+        self.assertFalse(self.paypal.verify_webhook_signature("WEBHOOK", {}, body))
+
+    def test_unavailable(self):
+        client = PayPalClient("http://127.0.0.1:9", "client", "secret", timeout=1)
+
+        with self.assertRaises(PayPalError):
+            client.get_order("ORDER1")
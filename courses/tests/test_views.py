@@ -1,8 +1,33 @@
-from django.contrib.auth.models import User
+import json
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.test import TestCase
-
-from courses.models import Run
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from courses.app_logic.attendees import get_attendees_page
+from courses.app_logic.group_feed import get_group_page
+from courses.app_logic.paypal import PayPalError
+from courses.app_logic.search import rebuild_index
+from courses.models import (
+    Certificate,
+    CertificateTemplate,
+    Chapter,
+    Course,
+    Faq,
+    Lecture,
+    PayPalOrder,
+    Run,
+    SearchEntry,
+    Submission,
+)
+from courses.views import views_ajax_async, views_htmx_async
 
 
 class TestRequiredLoginPage(TestCase):
@@ -220,3 +245,349 @@ class TestSubscribeUnsubscribePage(TestCase):
         self.assertEqual(len(messages), 1)
         self.assertEqual(str(messages[0]), "You are not subscribed to the course: %s." % run)
         self.assertEqual(run.users.count(), 2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestCertificatePDF(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        self.cert = Certificate.objects.get(id=1)
+        self.cert.data = None
+        self.cert.certificate_template = CertificateTemplate.objects.create(title="Test", html="{{ cert.user }}")
+        self.cert.save()
+
+    @mock.patch("courses.app_logic.certificates.render_pdf_from_template", return_value=b"%PDF-1.4 test")
+    def test_pdf_is_rendered_once(self, render_pdf):
+        response = self.client.get(f"/certificate/{self.cert.uuid}/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 test")
+
+        response = self.client.get(f"/certificate/{self.cert.uuid}/pdf/")
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 test")
+        self.assertEqual(render_pdf.call_count, 1)
+
+        # Stale PDF is rendered again after the certificate template changes
+        self.cert.certificate_template.html = "{{ cert.user.get_full_name }}"
+        self.cert.certificate_template.save()
+
+        self.client.get(f"/certificate/{self.cert.uuid}/pdf/")
+        self.assertEqual(render_pdf.call_count, 2)
+
+
+class TestEnrollmentContext(TestCase):
+    fixtures = ["test_data.json"]
+
+    def test_enrollment_is_loaded_once_per_request(self):
+        user = User.objects.get(id=2)
+        user.is_staff = False
+        user.save()
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/course/septembrovy-kurz/lekcia-1/uvod-do-kurzu/")
+
+        enrollment_queries = [query for query in queries if 'FROM "courses_runusers"' in query["sql"]]
+        self.assertEqual(len(enrollment_queries), 1)
+
+
+class TestSearch(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        self.course = Course.objects.create(
+            title="Astronomy", slug="astronomy", description="Stars and planets", state="O", creator_id=1
+        )
+        self.chapter = Chapter.objects.create(title="Telescopes", slug="telescopes", course=self.course, length=7)
+        self.lecture = Lecture.objects.create(
+            title="Refractor", slug="refractor", chapter=self.chapter, description="Lenses of a telescope"
+        )
+
+    def search(self, query):
+        response = self.client.get("/courses/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [(entry.kind, entry.object_id) for entry in response.context["results"]]
+
+    def test_search_is_ranked_and_maintained(self):
+        # Title matches rank first
+        self.assertEqual(self.search("telescop"), [("chapter", self.chapter.id), ("lecture", self.lecture.id)])
+
+        self.lecture.title = "Reflector"
+        self.lecture.save()
+        self.assertEqual(self.search("reflector"), [("lecture", self.lecture.id)])
+
+        self.lecture.delete()
+        self.assertEqual(self.search("reflector"), [])
+
+        Course.objects.filter(id=self.course.id).update(state="D")
+        self.assertEqual(self.search("astronomy"), [])
+
+    def test_rebuild_index(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.search("planets"), [])
+
+        rebuild_index()
+        self.assertEqual(self.search("planets"), [("course", self.course.id)])
+
+
+class TestRunAttendees(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        self.run = Run.objects.get(id=1)
+
+    def test_keyset_pagination(self):
+        user_ids = []
+        cursor = None
+
+        while True:
+            attendees, cursor = get_attendees_page(self.run, "subscribed", cursor=cursor, page_size=1)
+            user_ids += [attendee.user_id for attendee in attendees]
+
+            if cursor is None:
+                break
+
+        self.assertEqual(user_ids, list(self.run.runusers_set.order_by("id").values_list("user_id", flat=True)))
+
+    def test_filters(self):
+        # Only user 1 has a certificate (fixture)
+        attendees, cursor = get_attendees_page(self.run, filters={"certificate": "1"})
+        self.assertEqual([attendee.user_id for attendee in attendees], [1])
+        self.assertEqual(len(attendees[0].certificates), 1)
+        self.assertIsNone(cursor)
+
+        for attendee in get_attendees_page(self.run)[0]:
+            self.assertEqual(attendee.passed, self.run.passed(attendee.user_id))
+
+    def test_partial(self):
+        staff = User.objects.get(id=1)
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+
+        response = self.client.get(f"/stuff/run/{self.run.slug}/attendees/", {"partial": 1, "after": "invalid"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "courses/stuff/partial/run_attendees_rows.html")
+        self.assertTemplateNotUsed(response, "courses/stuff/run_attendees.html")
+
+
+class TestRunTabCache(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.run = Run.objects.get(id=1)
+        self.client.force_login(User.objects.get(id=2))
+        self.url = f"/course/{self.run.slug}/faq/?partial=1"
+
+    def test_fragment_is_revalidated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Faq.objects.create(question="Is it cached?", answer="Until the FAQ changes.", state="B", course=self.run.course)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Is it cached?")
+
+    def test_full_page_is_not_conditional(self):
+        response = self.client.get(f"/course/{self.run.slug}/faq/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class TestGroupFeed(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.run = Run.objects.get(id=1)
+        self.run.allow_public_submission = True
+        self.run.save()
+        Lecture.objects.filter(id=18).update(public_submission=True)
+        self.submissions = [
+            Submission.objects.create(title=f"Project {i}", run=self.run, lecture_id=18, author_id=2) for i in range(3)
+        ]
+        self.client.force_login(User.objects.get(id=2))
+
+    def test_pagination(self):
+        submissions, cursor = get_group_page(self.run, page_size=2)
+        self.assertEqual(submissions, self.submissions[:0:-1])
+
+        submissions, cursor = get_group_page(self.run, cursor=cursor, page_size=2)
+        self.assertEqual(submissions, self.submissions[:1])
+        self.assertIsNone(cursor)
+
+    def test_first_page_is_cached_until_submission_is_saved(self):
+        url = f"/course/{self.run.slug}/group/?partial=1"
+        self.assertContains(self.client.get(url), "Project 2")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        self.assertFalse([query for query in queries if 'FROM "courses_submission"' in query["sql"]])
+
+        Submission.objects.create(title="Project 3", run=self.run, lecture_id=18, author_id=2)
+        self.assertContains(self.client.get(url), "Project 3")
+
+
+class TestPayPalWebhook(TestCase):
+    fixtures = ["test_data.json"]
+
+    def post(self, data):
+        return self.client.post("/verify/paypal_webhook/1/", data, content_type="application/json")
+
+    @mock.patch("courses.views.views_subscribtion.verify_paypal_webhook", return_value=True)
+    @mock.patch("courses.views.views_subscribtion.COURSES_PAYPAL_ORDERS_BUFFERED", True)
+    def test_events_are_deduplicated(self, verify_paypal_webhook):
+        event = {
+            "event_type": "CHECKOUT.ORDER.APPROVED",
+            "resource": {"id": "ORDER1", "purchase_units": [{"reference_id": "3"}]},
+        }
+
+        self.assertEqual(self.post(json.dumps(event)).status_code, 204)
+        self.assertEqual(self.post(json.dumps(event)).status_code, 204)
+
+        paypal_order = PayPalOrder.objects.get()
+        self.assertEqual(paypal_order.order_id, "ORDER1")
+        self.assertEqual(paypal_order.run_user_id, 3)
+        self.assertEqual(paypal_order.state, PayPalOrder.PENDING)
+        self.assertEqual(verify_paypal_webhook.call_args[0][0], 1)
+
+    @mock.patch("courses.views.views_subscribtion.verify_paypal_webhook", return_value=True)
+    @mock.patch("courses.views.views_subscribtion.COURSES_PAYPAL_ORDERS_BUFFERED", True)
+    def test_event_pairs_order(self, verify_paypal_webhook):
+        # Order reported for a different RunUser before the webhook arrived
+        PayPalOrder.objects.create(order_id="ORDER1", run_user_id=1, attempts=1, error="Order is APPROVED.")
+        event = {
+            "event_type": "CHECKOUT.ORDER.COMPLETED",
+            "resource": {"id": "ORDER1", "purchase_units": [{"reference_id": "3"}]},
+        }
+
+        self.assertEqual(self.post(json.dumps(event)).status_code, 204)
+
+        paypal_order = PayPalOrder.objects.get()
+        self.assertEqual((paypal_order.run_user_id, paypal_order.attempts), (3, 0))
+        self.assertIsNone(paypal_order.error)
+
+    def test_unverified_events(self):
+        event = {
+            "event_type": "CHECKOUT.ORDER.APPROVED",
+            "resource": {"id": "ORDER1", "purchase_units": [{"reference_id": "3"}]},
+        }
+
+        # Webhook is not configured
+        self.assertEqual(self.post(json.dumps(event)).status_code, 400)
+
+        with mock.patch("courses.views.views_subscribtion.verify_paypal_webhook", return_value=False):
+            self.assertEqual(self.post(json.dumps(event)).status_code, 400)
+
+        with mock.patch("courses.views.views_subscribtion.verify_paypal_webhook", side_effect=PayPalError):
+            self.assertEqual(self.post(json.dumps(event)).status_code, 503)
+
+        self.assertFalse(PayPalOrder.objects.exists())
+
+    @mock.patch("courses.views.views_subscribtion.verify_paypal_webhook", return_value=True)
+    def test_invalid_events(self, verify_paypal_webhook):
+        self.assertEqual(self.post("not json").status_code, 400)
+        self.assertEqual(self.post(json.dumps({"event_type": "BILLING.PLAN.CREATED"})).status_code, 204)
+        self.assertEqual(self.client.get("/verify/paypal_webhook/1/").status_code, 405)
+        self.assertFalse(PayPalOrder.objects.exists())
+
+
+class TestVideoDuration(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        run = Run.objects.get(id=1)
+        run.start = date.today() - timedelta(days=3)
+        run.end = date.today() + timedelta(days=30)
+        run.save()
+        self.client.force_login(User.objects.get(id=2))
+        self.url = f"/course/{run.slug}/lekcia-1/uvod-do-kurzu/video-duration/"
+
+    def test_duration_is_written_once(self):
+        Lecture.objects.filter(id=1).update(metadata={"note": "kept"})
+
+        response = self.client.post(self.url, {"video_duration": 100}, content_type="application/json")
+        self.assertEqual(response.json(), {"Duration": "Saved"})
+
+        response = self.client.post(self.url, {"video_duration": 50}, content_type="application/json")
+        self.assertEqual(response.json(), {"Duration": "Not processed"})
+        self.assertEqual(Lecture.objects.get(id=1).metadata, {"note": "kept", "video_duration": 100})
+
+    def test_invalid_duration_is_ignored(self):
+        response = self.client.post(self.url, {"video_duration": "NaN"}, content_type="application/json")
+        self.assertEqual(response.json(), {"Duration": "Not processed"})
+        self.assertIsNone(Lecture.objects.get(id=1).metadata)
+
+        response = self.client.post(self.url, "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, [100], content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_duration_is_dropped_with_video(self):
+        self.client.post(self.url, {"video_duration": 100}, content_type="application/json")
+
+        lecture = Lecture.objects.get(id=1)
+        lecture.title = "Renamed"
+        lecture.save()
+        self.assertEqual(Lecture.objects.get(id=1).metadata, {"video_duration": 100})
+
+        lecture.video = "https://vimeo.com/76979871"
+        lecture.save()
+        self.assertEqual(Lecture.objects.get(id=1).metadata, {})
+
+        response = self.client.post(self.url, {"video_duration": 50}, content_type="application/json")
+        self.assertEqual(response.json(), {"Duration": "Saved"})
+
+
+class TestAsyncViews(TestCase):
+    fixtures = ["test_data.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.run = Run.objects.get(id=1)
+        self.run.start = date.today() - timedelta(days=3)
+        self.run.end = date.today() + timedelta(days=30)
+        self.run.save()
+        self.user = User.objects.get(id=2)
+        self.factory = AsyncRequestFactory()
+        self.lecture_kwargs = {"run_slug": self.run.slug, "chapter_slug": "lekcia-1", "lecture_slug": "uvod-do-kurzu"}
+        self.ping_url = f"/course/{self.run.slug}/lekcia-1/uvod-do-kurzu/video-ping/"
+
+    async def test_video_ping(self):
+        request = self.factory.post(
+            self.ping_url, {"video_watched_time_range": [[0, 10]]}, content_type="application/json"
+        )
+        request.user = self.user
+        response = await views_ajax_async.video_lecture_submission(request, **self.lecture_kwargs)
+        self.assertEqual(response.content, b'{"Data": "Saved"}')
+
+        submission = await sync_to_async(Submission.objects.get)(run=self.run, lecture_id=1, author=self.user)
+        self.assertEqual(submission.metadata["video_watched_time_range"], [[0, 10]])
+
+    async def test_login_required(self):
+        request = self.factory.post(self.ping_url, {}, content_type="application/json")
+        request.user = AnonymousUser()
+        response = await views_ajax_async.video_lecture_submission(request, **self.lecture_kwargs)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_run_tab(self):
+        # AsyncRequestFactory (Django 3.2) sends extra keyword arguments as raw ASGI headers and drops data of GET
+        url = f"/course/{self.run.slug}/faq/?partial=1"
+        request = self.factory.get(url)
+        request.user = self.user
+        response = await views_htmx_async.course_faq(request, run_slug=self.run.slug)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        request = self.factory.get(url, **{"If-None-Match": etag})
+        request.user = self.user
+        response = await views_htmx_async.course_faq(request, run_slug=self.run.slug)
+        self.assertEqual(response.status_code, 304)
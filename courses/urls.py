@@ -2,9 +2,15 @@ from django.urls import path
 
 from .views import views
 from .views import views_staff
-from .views import views_ajax
-from .views import views_htmx
 from .views import views_subscribtion
+from .settings import COURSES_ASYNC_VIEWS
+
+if COURSES_ASYNC_VIEWS:
+    from .views import views_ajax_async as views_ajax
+    from .views import views_htmx_async as views_htmx
+else:
+    from .views import views_ajax
+    from .views import views_htmx
 
 
 urlpatterns = [
@@ -12,18 +18,17 @@ urlpatterns = [
     path("courses/", views.courses, name="courses"),
     path("courses/open/", views.all_active_runs, name="all_active_runs"),
     path("courses/closed/", views.all_closed_runs, name="all_closed_runs"),
+    path("courses/search/", views.search, name="search"),
     path("courses/subscribed/", views.all_subscribed_runs, name="all_subscribed_runs"),
     path("courses/subscribed/open/", views.all_subscribed_active_runs, name="all_subscribed_active_runs"),
     path("courses/subscribed/closed/", views.all_subscribed_closed_runs, name="all_subscribed_closed_runs"),
     path("course/<str:course_slug>/details/", views.course_detail, name="course_detail"),
     path("course/<str:run_slug>/", views.course_run_detail, name="course_run_detail"),
-
     path("course/<str:run_slug>/overview/", views_htmx.course_run_overview, name="course_run_overview"),
     path("course/<str:run_slug>/chapters/", views_htmx.course_run_chapters, name="course_run_chapters"),
     path("course/<str:run_slug>/group/", views_htmx.course_run_group, name="course_run_group"),
     path("course/<str:run_slug>/help/", views_htmx.course_run_help, name="course_run_help"),
     path("course/<str:run_slug>/faq/", views_htmx.course_faq, name="course_faq"),
-
     path(
         "course/<str:run_slug>/subscription_levels/",
         views_subscribtion.run_subscription_levels,
@@ -39,6 +44,11 @@ urlpatterns = [
         views_subscribtion.verify_paypal_order,
         name="verify_paypal_order",
     ),
+    path(
+        "verify/paypal_webhook/<int:payment_profile_id>/",
+        views_subscribtion.paypal_webhook,
+        name="paypal_webhook",
+    ),
     path("course/<str:run_slug>/subscribe/", views_subscribtion.subscribe_to_run, name="subscribe_to_run"),
     path("course/<str:run_slug>/unsubscribe/", views_subscribtion.unsubscribe_from_run, name="unsubscribe_from_run"),
     path("course/<str:run_slug>/<str:chapter_slug>/", views.chapter_detail, name="chapter_detail"),
@@ -71,6 +81,11 @@ urlpatterns = [
         views_staff.run_attendees,
         name="run_attendees",
     ),
+    path(
+        "stuff/run/<str:run_slug>/attendees/export/",
+        views_staff.run_attendees_export,
+        name="run_attendees_export",
+    ),
     path(
         "stuff/run/<str:run_slug>/attendee/<int:user_id>/",
         views_staff.run_attendee_submissions,
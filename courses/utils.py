@@ -1,7 +1,10 @@
-import re
 import html2text
+import math
+
+from bisect import bisect_left, bisect_right
 
 from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from django.core.mail import EmailMultiAlternatives
 from django.shortcuts import get_object_or_404
 from django.template import TemplateDoesNotExist, Template, Context
@@ -10,7 +13,9 @@ from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 
 from courses.settings import COURSES_EMAIL_SUBJECT_PREFIX
-from courses.models import Chapter, Run, Certificate
+from courses.models import Chapter, Certificate
+from courses.app_logic.courses_logic import get_enrollment
+from courses.app_logic.template_cache import get_compiled_template
 from courses.settings import (
     COURSES_ALLOW_SUBMISSION_TO_CHAPTERS,
     COURSES_ALLOW_SUBMISSION_TO_LECTURES,
@@ -19,16 +24,14 @@ from courses.settings import (
 
 
 def get_run_chapter_context(request, run_slug, chapter_slug, raise_unsubscribed=True, raise_wrong_dates=True):
-    run = get_object_or_404(Run, slug=run_slug)
+    enrollment = get_enrollment(request, run_slug)
+    run = enrollment.run
     chapter = get_object_or_404(Chapter, slug=chapter_slug)
 
-    if raise_unsubscribed:
-        if request.user.is_staff:
-            raise_unsubscribed = False
-
-        run.is_subscribed(request.user, raise_unsubscribed=raise_unsubscribed)
+    if raise_unsubscribed and not request.user.is_staff and not enrollment.subscribed:
+        raise PermissionDenied(_("You are not subscribed to this course!"))
 
-    start, end = chapter.get_run_dates(run=run, raise_wrong_dates=raise_wrong_dates)
+    start, end = run.schedule.get_dates(chapter, raise_wrong_dates=raise_wrong_dates)
 
     breadcrumbs = [
         {
@@ -54,7 +57,7 @@ def get_run_chapter_context(request, run_slug, chapter_slug, raise_unsubscribed=
         "lectures": chapter.lecture_set.all().order_by("order", "title"),
         "start": start,
         "end": end,
-        "subscribed": run.is_subscribed(request.user),
+        "subscribed": enrollment.subscribed,
         "breadcrumbs": breadcrumbs,
         "COURSES_DISPLAY_CHAPTER_DETAILS": COURSES_DISPLAY_CHAPTER_DETAILS,
         "COURSES_ALLOW_SUBMISSION_TO_CHAPTERS": COURSES_ALLOW_SUBMISSION_TO_CHAPTERS,
@@ -96,13 +99,20 @@ def send_email(
 def construct_templated_email(user, mail_subject, mail_body_html, template_variables=dict()):
     """
     Construct an EmailMultiAlternatives object based on the specified HTML email template.
+    Subject and body can be passed either as a string or as an already compiled Template.
     """
     template_variables["user"] = user
     email = user.email
 
+    if not isinstance(mail_subject, Template):
+        mail_subject = Template(mail_subject)
+
+    if not isinstance(mail_body_html, Template):
+        mail_body_html = Template(mail_body_html)
+
     # Render Subject and HTML Body of the message
-    subject = Template(mail_subject).render(Context(template_variables))
-    body_html = Template(mail_body_html).render(Context(template_variables))
+    subject = mail_subject.render(Context(template_variables))
+    body_html = mail_body_html.render(Context(template_variables))
 
     # Generate plaintext version from HTML body
     h = html2text.HTML2Text()
@@ -132,56 +142,94 @@ def generate_certificate(run, user, certificate_template, notify=True):
         cert.save()
 
         if notify:
-            mail_template_variables = {
-                "certificate": cert,
-                "course_run": run,
-                "user": user,
-                "course": run.course,
-            }
-
-            mail_template = run.course.mail_certificate_generation
-
-            # If the mail_template is specified, send a subscription email
-            if mail_template:
-                send_templated_email(
-                    user,
-                    mail_subject=mail_template.mail_subject,
-                    mail_body_html=mail_template.mail_body_html,
-                    template_variables=mail_template_variables,
-                )
-            # If the mail_template is not specified, notify the Course creator
-            else:
-                send_templated_email(
-                    run.course.creator,
-                    mail_subject="Course mail_certificate_generation not specified!",
-                    mail_body_html="The mail_certificate_generation template is missing for {{ course|safe }}!\n\n"
-                                   "The user {{ user|safe }} did not receive an Certificate Generation email.",
-                    template_variables=mail_template_variables,
-                )
+            send_certificate_email(cert)
 
         return True
 
     return False
 
 
-def array_partition(array, start, end):
-    pivot_index = start
+def send_certificate_email(cert):
+    """
+    Notifies the user about generated certificate (or the Course creator if the email template is missing).
+    """
+    run = cert.run
+    user = cert.user
+    mail_template_variables = {
+        "certificate": cert,
+        "course_run": run,
+        "user": user,
+        "course": run.course,
+    }
+
+    mail_template = run.course.mail_certificate_generation
+
+    # If the mail_template is specified, send a subscription email
+    if mail_template:
+        send_templated_email(
+            user,
+            mail_subject=get_compiled_template(mail_template, "mail_subject"),
+            mail_body_html=get_compiled_template(mail_template, "mail_body_html"),
+            template_variables=mail_template_variables,
+        )
+    # If the mail_template is not specified, notify the Course creator
+    else:
+        send_templated_email(
+            run.course.creator,
+            mail_subject="Course mail_certificate_generation not specified!",
+            mail_body_html="The mail_certificate_generation template is missing for {{ course|safe }}!\n\n"
+                           "The user {{ user|safe }} did not receive an Certificate Generation email.",
+            template_variables=mail_template_variables,
+        )
+
+
+class IntervalSet:
+    """
+    Sorted set of non-overlapping [start, end] intervals (eg. watched video time ranges).
+
+    Inserting an interval finds the overlapping intervals with binary search and coalesces them, total length of
+    all intervals is maintained on each insert.
+
+    Intervals are kept in two plain lists, so the search is O(log n) but replacing the coalesced slice shifts the
+    following items, O(n) in the worst case. Watched ranges are coalesced to a few intervals in practice, so the
+    shift is a cheap memmove and a balanced tree (or a new dependency) isn't worth it.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        self.total = 0
+        self.update(intervals)
+
+    def add(self, start, end):
+        if start > end:
+            start, end = end, start
+
+        # Intervals [first:last] overlap (or touch) with the new one
+        first = bisect_left(self._ends, start)
+        last = bisect_right(self._starts, end)
 
-    for i in range(start, end):
-        if array[i][0] <= array[end][0]:
-            array[i], array[pivot_index] = array[pivot_index], array[i]
-            pivot_index += 1
+        if first < last:
+            self.total -= sum(self._ends[i] - self._starts[i] for i in range(first, last))
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
 
-    array[end], array[pivot_index] = array[pivot_index], array[end]
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+        self.total += end - start
 
-    return pivot_index
+    def update(self, intervals):
+        for start, end in intervals:
+            self.add(start, end)
 
+    def to_list(self):
+        return [[start, end] for start, end in zip(self._starts, self._ends)]
 
-def array_quicksort(array, start, end):
-    if start < end:
-        partition_index = array_partition(array, start, end)
-        array_quicksort(array, start, partition_index - 1)
-        array_quicksort(array, partition_index + 1, end)
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        return len(self._starts)
 
 
 def array_merge(intervals):
@@ -190,52 +238,85 @@ def array_merge(intervals):
     :type intervals: list[interval]
     :rtype: list[interval]
     """
-    if len(intervals) == 0:
-        return []
+    return IntervalSet(intervals).to_list()
 
-    array_quicksort(intervals, 0, len(intervals) - 1)
-    stack = []
-    stack.append(intervals[0])
 
-    for i in range(1, len(intervals)):
-        last_element = stack[len(stack) - 1]
+def is_video_watched_time_range(time_range):
+    """
+    Whether the time range is a list of [start, end] intervals of (finite, non negative) seconds, start <= end.
+    """
+    if not isinstance(time_range, list):
+        return False
 
-        if last_element[1] >= intervals[i][0]:
-            last_element[1] = max(intervals[i][1], last_element[1])
-            stack.pop(len(stack) - 1)
-            stack.append(last_element)
-        else:
-            stack.append(intervals[i])
+    for interval in time_range:
+        if not isinstance(interval, list) or len(interval) != 2:
+            return False
 
-    return stack
+        for value in interval:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+                return False
 
+        if interval[0] > interval[1]:
+            return False
 
-def submissions_get_video_links(submissions):
+    return True
+
+
+def get_video_duration(data):
     """
-    Runs through submissions and finds YouTube video link tags,
-    which are then added to the original object
+    Returns video duration from the data posted by video_tracking.js (not validated, see
+    courses.app_logic.video_tracking.is_video_duration), raises ValueError if the data is not recognized.
     """
-    # TODO: Add support for other platforms (such as Vimeo, OneDrive, ...)
+    if not isinstance(data, dict):
+        raise ValueError("Unrecognized video duration.")
 
-    regex = re.compile(
-        r'.*(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)'
-        r'/(watch\?v=|embed/|v/|.+\?v=)?(?P<id>[A-Za-z0-9\-=_]{11}).*', re.DOTALL
-    )
+    return data.get("video_duration")
 
-    for submission in submissions:
 
-        if submission.description:
-            # If there is not a vide link specified, try to find one in the submission description
-            if not submission.video_link:
-                match = regex.match(submission.description)
-                if match:
-                    submission.video_link_tag = match.group('id')
-                    submission.video_link = f"https://youtu.be/{submission.video_link_tag}"
-
-            # If a video link is specified, extract the youtube tag/ID of the video
-            else:
-                match = regex.match(submission.video_link)
-                if match:
-                    submission.video_link_tag = match.group('id')
+def get_video_watched_time_range(data):
+    """
+    Returns video watched time range from the data posted by video_tracking.js, raises ValueError if it is not valid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Unrecognized video watched time range.")
+    elif "video_watched_time_range" in data:
+        time_range = data["video_watched_time_range"]
+    elif "watched_video_time_range" in data:
+        # Deprecated! Just for those who have old cached JS!
+        time_range = data["watched_video_time_range"]
+    else:
+        raise ValueError("Unrecognized video watched time range.")
+
+    if not is_video_watched_time_range(time_range):
+        raise ValueError("Invalid video watched time range.")
+
+    return time_range
+
+
+def update_video_watched_metadata(submission, lecture, time_range):
+    """
+    Merges video watched time range in to the submission metadata and recalculates the watched percent.
+    Submission is not saved.
+    """
+    if not submission.metadata:
+        submission.metadata = {}
+
+    video_watched = IntervalSet(submission.metadata.get("video_watched_time_range", ()))
+    video_watched.update(time_range)
+    submission.metadata["video_watched_time_range"] = video_watched.to_list()
+
+    if lecture.metadata and "video_duration" in lecture.metadata and lecture.metadata["video_duration"]:
+        video_watched_percent = video_watched.total / lecture.metadata["video_duration"] * 100
+        submission.metadata["video_watched_percent"] = round(video_watched_percent, 1)
+
+
+def submissions_get_video_links(submissions):
+    """
+    Runs through submissions and fills in the video link of those with a YouTube video found in the description
+    (video_link_tag is extracted when the submission is saved).
+    """
+    for submission in submissions:
+        if submission.video_link_tag and not submission.video_link:
+            submission.video_link = f"https://youtu.be/{submission.video_link_tag}"
 
     return submissions
@@ -5,24 +5,32 @@ from time import strftime
 
 from django.db.models import Q, F
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
+from django.core.paginator import Paginator
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
-from django.template import Template, Context
-from django.http import HttpResponseNotFound
-
-from wkhtmltopdf.views import PDFTemplateView
+from django.http import FileResponse, HttpResponseNotFound
+from django.views import View
 
 from courses.decorators import verify_payment
 from courses.forms import SubmissionForm, SubscribeForm
 from courses.models import Course, Run, Submission, Lecture, Certificate, SubscriptionLevel
 from courses.utils import get_run_chapter_context, submissions_get_video_links
 
-from courses.settings import COURSES_LANDING_PAGE_URL, COURSES_LANDING_PAGE_URL_AUTHORIZED
+from courses.settings import COURSES_LANDING_PAGE_URL, COURSES_LANDING_PAGE_URL_AUTHORIZED, COURSES_SEARCH_PAGE_SIZE
 
-from courses.app_logic.courses_logic import get_public_courses, get_category, get_course
+from courses.app_logic.courses_logic import (
+    get_public_courses,
+    get_category,
+    get_course,
+    get_enrollment,
+    resolve_subscription_states,
+)
+from courses.app_logic.certificates import get_certificate_pdf, render_certificate_content
+from courses.app_logic.search import search as search_courses
+from courses.app_logic.syllabus import get_syllabus_stats
 
 
 def index(request):
@@ -60,6 +68,29 @@ def courses(request, category_slug=None):
     return render(request, os.path.join("courses", "courses_list.html"), context)
 
 
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = Paginator(search_courses(query), COURSES_SEARCH_PAGE_SIZE).get_page(request.GET.get("page"))
+
+    context = {
+        "query": query,
+        "page": page,
+        "results": page.object_list,
+        "breadcrumbs": [
+            {
+                "url": reverse("courses"),
+                "title": _("Courses"),
+            },
+            {
+                "title": _("Search"),
+            },
+        ],
+        "page_tab_title": _("Search"),
+    }
+
+    return render(request, "courses/search.html", context)
+
+
 def course_detail(request, course_slug):
     course = get_object_or_404(Course, slug=course_slug)
 
@@ -80,10 +111,6 @@ def course_detail(request, course_slug):
         "page_tab_title": course.title,
     }
 
-    total_lecture_count = 0
-    video_lecture_count = 0
-    total_video_lecture_duration = 0
-
     for chapter in course.chapter_set.order_by('order').all():
         context["chapters"].append(
             {
@@ -91,15 +118,13 @@ def course_detail(request, course_slug):
                 "title": chapter.title,
             }
         )
-        total_lecture_count += chapter.lecture_set.count()
-        video_lecture_count += chapter.lecture_set.filter(lecture_type="V").count()
 
-        for lecture in chapter.lecture_set.all():
-            total_video_lecture_duration += lecture.video_duration_seconds()
+    syllabus_stats = get_syllabus_stats(course.id)
 
-    context['total_lecture_count'] = total_lecture_count
-    context['video_lecture_count'] = video_lecture_count
-    context['total_video_lecture_duration'] = strftime("%-Hh %-Mm %Ss", gmtime(total_video_lecture_duration))
+    context['syllabus_stats'] = syllabus_stats
+    context['total_lecture_count'] = syllabus_stats["lecture_count"]
+    context['video_lecture_count'] = syllabus_stats["lecture_types"].get("V", 0)
+    context['total_video_lecture_duration'] = strftime("%-Hh %-Mm %Ss", gmtime(syllabus_stats["video_duration"]))
 
     return render(request, "courses/course_detail.html", context)
 
@@ -112,7 +137,7 @@ def all_active_runs(request):
         .order_by("start")
     )
     context = {
-        "runs": course_runs,
+        "runs": resolve_subscription_states(course_runs, request.user),
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -134,7 +159,7 @@ def all_subscribed_runs(request):
         .order_by("start")
     )
     context = {
-        "runs": course_runs,
+        "runs": resolve_subscription_states(course_runs, request.user),
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -159,7 +184,7 @@ def all_subscribed_active_runs(request):
         .order_by("start")
     )
     context = {
-        "runs": course_runs,
+        "runs": resolve_subscription_states(course_runs, request.user),
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -187,7 +212,7 @@ def all_subscribed_closed_runs(request):
         .order_by("-start")
     )
     context = {
-        "runs": course_runs,
+        "runs": resolve_subscription_states(course_runs, request.user),
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -213,7 +238,7 @@ def all_closed_runs(request):
         .order_by("-start")
     )
     context = {
-        "runs": course_runs,
+        "runs": resolve_subscription_states(course_runs, request.user),
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -229,7 +254,8 @@ def all_closed_runs(request):
 
 
 def course_run_detail(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
+    enrollment = get_enrollment(request, run_slug)
+    run = enrollment.run
     subscription_levels = SubscriptionLevel.objects.filter(run=run)
     form = SubscribeForm(
         initial={"sender": request.user.username, "run_slug": run_slug},
@@ -241,7 +267,7 @@ def course_run_detail(request, run_slug):
         "subscription_levels": subscription_levels.all(),
         "chapters": [],
         "form": form,
-        "subscribed": run.is_subscribed(request.user),
+        "subscribed": enrollment.subscribed,
         "breadcrumbs": [
             {
                 "url": reverse("courses"),
@@ -257,11 +283,14 @@ def course_run_detail(request, run_slug):
         ],
     }
 
+    show_future_chapters = run.settings.COURSES_SHOW_FUTURE_CHAPTERS
+    allow_access_to_passed_chapters = run.settings.COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS
+
     for chapter in run.course.chapter_set.order_by('order').all():
-        start, end = chapter.get_run_dates(run=run)
+        start, end = run.schedule.get_dates(chapter)
 
-        if (run.get_setting("COURSES_SHOW_FUTURE_CHAPTERS") or start <= datetime.date.today()) and (
-            run.get_setting("COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS") or end > datetime.date.today()
+        if (show_future_chapters or start <= datetime.date.today()) and (
+            allow_access_to_passed_chapters or end > datetime.date.today()
         ):
             context["chapters"].append(
                 {
@@ -425,19 +454,16 @@ def certificate(request, uuid):
     if not cert.certificate_template:
         return HttpResponseNotFound(_("Certificate template not specified!"))
 
-    template = Template(cert.certificate_template.html)
-    context = Context({"cert": cert})
-    cert_content = template.render(context)
+    return render(request, "courses/certificate.html", {"cert_content": render_certificate_content(cert)})
 
-    return render(request, "courses/certificate.html", {"cert_content": cert_content})
 
+class CertificatePDF(View):
+    """
+    Certificate PDF is rendered on the first request (or when the certificate template changes) and stored to
+    Certificate.data, following requests are streamed from the storage.
+    """
 
-class CertificatePDF(PDFTemplateView):
     filename = "certifikat.pdf"
-    template_name = "courses/certificate.html"  # only a "blank" template where the real template is later inserter
-    cmd_options = {
-        "margin-top": 3,
-    }
 
     def get(self, request, uuid, *args, **kwargs):
         cert = get_object_or_404(Certificate, uuid=uuid)
@@ -445,9 +471,6 @@ class CertificatePDF(PDFTemplateView):
         if not cert.certificate_template:
             return HttpResponseNotFound(_("Certificate template not specified!"))
 
-        # The actual template rendering happens here, it is later inserted in to a wrapper template
-        template = Template(cert.certificate_template.html)
-        context = Context({"cert": cert})
-        cert_content = template.render(context)
+        pdf = get_certificate_pdf(cert, request=request)
 
-        return super().get(request, *args, cert=cert, cert_content=cert_content, **kwargs)
+        return FileResponse(pdf.open("rb"), as_attachment=True, filename=self.filename, content_type="application/pdf")
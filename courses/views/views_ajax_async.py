@@ -0,0 +1,47 @@
+"""
+Async variants of views_ajax (used if COURSES_ASYNC_VIEWS is enabled and the project is served by ASGI).
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest
+
+from courses.app_logic.video_tracking import get_video_lecture, save_video_duration, save_video_ping
+from courses.decorators import async_login_required
+from courses.utils import get_video_duration, get_video_watched_time_range
+
+
+@async_login_required
+async def video_lecture_duration(request, run_slug, chapter_slug, lecture_slug):
+    if request.method == "POST":
+        try:
+            duration = get_video_duration(json.loads(request.body))
+        except ValueError:
+            return HttpResponseBadRequest('{"Duration": "Invalid"}', content_type="application/json")
+
+        if await sync_to_async(save_video_duration)(request, run_slug, chapter_slug, lecture_slug, duration):
+            return HttpResponse('{"Duration": "Saved"}', content_type="application/json")
+
+        return HttpResponse('{"Duration": "Not processed"}', content_type="application/json")
+    else:
+        await sync_to_async(get_video_lecture)(request, run_slug, chapter_slug, lecture_slug)
+
+        return HttpResponse('{"Duration": "Not processed"}', content_type="application/json")
+
+
+@async_login_required
+async def video_lecture_submission(request, run_slug, chapter_slug, lecture_slug):
+    if request.method == "POST":
+        try:
+            time_range = get_video_watched_time_range(json.loads(request.body))
+        except ValueError:
+            return HttpResponseBadRequest('{"Data": "Invalid"}', content_type="application/json")
+
+        result = await sync_to_async(save_video_ping)(request, run_slug, chapter_slug, lecture_slug, time_range)
+
+        return HttpResponse(f'{{"Data": "{result}"}}', content_type="application/json")
+    else:
+        await sync_to_async(get_video_lecture)(request, run_slug, chapter_slug, lecture_slug)
+
+        return HttpResponse('{"Data": "Not processed"}', content_type="application/json")
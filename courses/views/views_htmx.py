@@ -5,7 +5,9 @@ from django.db.models import Q, F
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse
+from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 
@@ -13,47 +15,40 @@ from wkhtmltopdf.views import PDFTemplateView
 
 from courses.decorators import verify_payment
 from courses.forms import SubmissionForm, SubscribeForm
-from courses.models import Course, Run, Submission, Lecture, Certificate, SubscriptionLevel
-from courses.utils import get_run_chapter_context, submissions_get_video_links
+from courses.models import Course, Lecture, Certificate, SubscriptionLevel
+from courses.utils import get_run_chapter_context
+from courses.app_logic.courses_logic import get_enrollment
+from courses.app_logic.fragments import render_run_tab, run_tab_condition
+from courses.app_logic.group_feed import get_group_first_page, get_group_page
 
 from courses.settings import COURSES_LANDING_PAGE_URL, COURSES_LANDING_PAGE_URL_AUTHORIZED
 
 
-@login_required
-@verify_payment
-def course_run_overview(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
-
-    context = {
-        "run": run,
+def get_run_tab_context(enrollment, **extra):
+    """
+    Context shared by all the run tabs (sync and async views).
+    """
+    return {
+        "run": enrollment.run,
         "chapters": [],
-        "subscribed": run.is_subscribed(request.user),
-        "page_tab_title": run.title,
+        "subscribed": enrollment.subscribed,
+        "page_tab_title": enrollment.run.title,
+        **extra,
     }
 
-    if request.GET.get('partial', False):
-        return render(request, "courses/run/partial/overview.html", context)
-    else:
-        return render(request, "courses/run/overview.html", context)
 
+def get_chapters_context(enrollment):
+    run = enrollment.run
+    context = get_run_tab_context(enrollment)
 
-@login_required
-@verify_payment
-def course_run_chapters(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
-
-    context = {
-        "run": run,
-        "chapters": [],
-        "subscribed": run.is_subscribed(request.user),
-        "page_tab_title": run.title,
-    }
+    show_future_chapters = run.settings.COURSES_SHOW_FUTURE_CHAPTERS
+    allow_access_to_passed_chapters = run.settings.COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS
 
     for chapter in run.course.chapter_set.order_by('order').all():
-        start, end = chapter.get_run_dates(run=run)
+        start, end = run.schedule.get_dates(chapter)
 
-        if (run.get_setting("COURSES_SHOW_FUTURE_CHAPTERS") or start <= datetime.date.today()) and (
-            run.get_setting("COURSES_ALLOW_ACCESS_TO_PASSED_CHAPTERS") or end > datetime.date.today()
+        if (show_future_chapters or start <= datetime.date.today()) and (
+            allow_access_to_passed_chapters or end > datetime.date.today()
         ):
             context["chapters"].append(
                 {
@@ -71,68 +66,107 @@ def course_run_chapters(request, run_slug):
                 }
             )
 
-    if request.GET.get('partial', False):
-        return render(request, "courses/run/partial/chapters.html", context)
+    return context
+
+
+def get_faq_context(enrollment):
+    return get_run_tab_context(
+        enrollment, questions=enrollment.run.course.faq_set.filter(state__in=("S", "B")).all()
+    )
+
+
+def render_run_group(request, enrollment):
+    """
+    Renders the "My group" tab, its htmx partial (first page of the feed, cached) or next page of the feed.
+    """
+    run = enrollment.run
+    cursor = request.GET.get("after")
+
+    def get_context():
+        submissions, next_cursor = get_group_page(run, cursor)
+
+        return get_run_tab_context(
+            enrollment, page_tab_title=_("My group"), submissions=submissions, next_cursor=next_cursor
+        )
+
+    if cursor:
+        # Next page of the feed (infinite scroll)
+        return render(request, "courses/run/partial/group_submissions.html", get_context())
+    elif request.GET.get('partial', False):
+        return HttpResponse(
+            get_group_first_page(
+                run, lambda: render_to_string("courses/run/partial/group.html", get_context(), request)
+            )
+        )
     else:
-        return render(request, "courses/run/chapters.html", context)
+        return render(request, "courses/run/group.html", get_context())
 
 
 @login_required
 @verify_payment
-def course_run_group(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
+@run_tab_condition("overview")
+def course_run_overview(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
 
-    context = {
-        "run": run,
-        "chapters": [],
-        "subscribed": run.is_subscribed(request.user),
-        "page_tab_title": _("My group"),
-    }
+    return render_run_tab(
+        request,
+        "overview",
+        enrollment,
+        lambda: get_run_tab_context(enrollment),
+        "courses/run/overview.html",
+        "courses/run/partial/overview.html",
+    )
 
-    submissions = Submission.objects.filter(run__slug=run_slug)\
-        .filter(lecture__public_submission=True).filter(lecture__lecture_type="P")\
-        .filter(run__allow_public_submission=True).order_by("-timestamp_added")
 
-    context["submissions"] = submissions_get_video_links(submissions)
+@login_required
+@verify_payment
+@run_tab_condition("chapters")
+def course_run_chapters(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
 
-    if request.GET.get('partial', False):
-        return render(request, "courses/run/partial/group.html", context)
-    else:
-        return render(request, "courses/run/group.html", context)
+    return render_run_tab(
+        request,
+        "chapters",
+        enrollment,
+        lambda: get_chapters_context(enrollment),
+        "courses/run/chapters.html",
+        "courses/run/partial/chapters.html",
+    )
 
 
 @login_required
 @verify_payment
-def course_run_help(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
+def course_run_group(request, run_slug):
+    return render_run_group(request, get_enrollment(request, run_slug))
 
-    context = {
-        "run": run,
-        "chapters": [],
-        "subscribed": run.is_subscribed(request.user),
-        "page_tab_title": run.title,
-    }
 
-    if request.GET.get('partial', False):
-        return render(request, "courses/run/partial/help.html", context)
-    else:
-        return render(request, "courses/run/help.html", context)
+@login_required
+@verify_payment
+@run_tab_condition("help")
+def course_run_help(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
+
+    return render_run_tab(
+        request,
+        "help",
+        enrollment,
+        lambda: get_run_tab_context(enrollment),
+        "courses/run/help.html",
+        "courses/run/partial/help.html",
+    )
 
 
 @login_required
 @verify_payment
+@run_tab_condition("faq")
 def course_faq(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
-
-    context = {
-        "run": run,
-        "questions": run.course.faq_set.filter(state__in=("S", "B")).all(),
-        "chapters": [],
-        "subscribed": run.is_subscribed(request.user),
-        "page_tab_title": run.title,
-    }
-
-    if request.GET.get('partial', False):
-        return render(request, "courses/run/partial/faq.html", context)
-    else:
-        return render(request, "courses/run/faq.html", context)
+    enrollment = get_enrollment(request, run_slug)
+
+    return render_run_tab(
+        request,
+        "faq",
+        enrollment,
+        lambda: get_faq_context(enrollment),
+        "courses/run/faq.html",
+        "courses/run/partial/faq.html",
+    )
@@ -0,0 +1,77 @@
+"""
+Async variants of views_htmx run tabs (used if COURSES_ASYNC_VIEWS is enabled and the project is served by ASGI).
+"""
+
+from asgiref.sync import sync_to_async
+
+from courses.app_logic.courses_logic import get_enrollment
+from courses.app_logic.fragments import render_run_tab_async
+from courses.decorators import async_login_required, async_verify_payment
+from courses.views.views_htmx import get_chapters_context, get_faq_context, get_run_tab_context, render_run_group
+
+
+@async_login_required
+@async_verify_payment
+async def course_run_overview(request, run_slug):
+    # Enrollment has been loaded by async_verify_payment
+    enrollment = get_enrollment(request, run_slug)
+
+    return await render_run_tab_async(
+        request,
+        "overview",
+        enrollment,
+        lambda: get_run_tab_context(enrollment),
+        "courses/run/overview.html",
+        "courses/run/partial/overview.html",
+    )
+
+
+@async_login_required
+@async_verify_payment
+async def course_run_chapters(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
+
+    return await render_run_tab_async(
+        request,
+        "chapters",
+        enrollment,
+        lambda: get_chapters_context(enrollment),
+        "courses/run/chapters.html",
+        "courses/run/partial/chapters.html",
+    )
+
+
+@async_login_required
+@async_verify_payment
+async def course_run_group(request, run_slug):
+    return await sync_to_async(render_run_group)(request, get_enrollment(request, run_slug))
+
+
+@async_login_required
+@async_verify_payment
+async def course_run_help(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
+
+    return await render_run_tab_async(
+        request,
+        "help",
+        enrollment,
+        lambda: get_run_tab_context(enrollment),
+        "courses/run/help.html",
+        "courses/run/partial/help.html",
+    )
+
+
+@async_login_required
+@async_verify_payment
+async def course_faq(request, run_slug):
+    enrollment = get_enrollment(request, run_slug)
+
+    return await render_run_tab_async(
+        request,
+        "faq",
+        enrollment,
+        lambda: get_faq_context(enrollment),
+        "courses/run/faq.html",
+        "courses/run/partial/faq.html",
+    )
@@ -2,10 +2,14 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.utils.http import urlencode
 
+from courses.app_logic.attendees import get_attendees_page, get_attendees_params
+from courses.app_logic.export import iter_csv, iter_run_attendees
 from courses.forms import ReviewForm, MailForm
 from courses.models import Run, Submission, Lecture
 from courses.utils import get_run_chapter_context, generate_certificate, send_email, submissions_get_video_links
@@ -31,10 +35,22 @@ def runs(request):
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def run_attendees(request, run_slug):
-    run = Run.objects.filter(slug=run_slug).order_by("-end").get()
+    run = get_object_or_404(Run, slug=run_slug)
+    ordering, filters = get_attendees_params(request.GET)
+    attendees, next_cursor = get_attendees_page(run, ordering, filters, cursor=request.GET.get("after"))
 
     context = {}
     context["run"] = run
+    context["attendees"] = attendees
+    context["next_cursor"] = next_cursor
+    context["ordering"] = ordering
+    context["filters"] = filters
+    # Sort and filters of the next page request
+    context["query"] = urlencode({"sort": ordering, **filters})
+
+    if request.GET.get("partial", False):
+        return render(request, "courses/stuff/partial/run_attendees_rows.html", context)
+
     context["breadcrumbs"] = [
         {
             "url": reverse("runs"),
@@ -51,13 +67,25 @@ def run_attendees(request, run_slug):
     return render(request, "courses/stuff/run_attendees.html", context)
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def run_attendees_export(request, run_slug):
+    run = get_object_or_404(Run, slug=run_slug)
+
+    response = StreamingHttpResponse(iter_csv(iter_run_attendees(run)), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{run.slug}-attendees.csv"'
+
+    return response
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def run_attendee_submissions(request, run_slug, user_id):
     User = get_user_model()
     atendee = User.objects.filter(id=user_id).get()
     run = Run.objects.filter(slug=run_slug).order_by("-end").get()
-    passed = run.passed(user_id)
+    run.eligibility = run.get_eligibility(user_ids=[user_id])
+    passed = run.eligibility[user_id].passed
 
     context = {}
     context["run"] = run
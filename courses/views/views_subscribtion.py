@@ -1,5 +1,4 @@
-import base64
-import requests
+import json
 import logging
 
 from django.contrib import messages
@@ -10,13 +9,29 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from django.urls import reverse
 from django.core.exceptions import BadRequest
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from courses.forms import SubscribeForm, DiscountForm
-from courses.models import Run, SubscriptionLevel, RunUsers
+from courses.models import PayPalOrder, Run, SubscriptionLevel, RunUsers
 from courses.utils import send_templated_email
 from profiles.models import Profile
-from courses.app_logic.courses_logic import ApplyCoupon, CouponNotValidException, CouponAlreadyAppliedException
+from courses.app_logic.courses_logic import (
+    ApplyCoupon,
+    CouponNotValidException,
+    CouponAlreadyAppliedException,
+    get_enrollment,
+)
+from courses.app_logic.payments import (
+    process_paypal_order,
+    record_paypal_event,
+    record_paypal_order,
+    verify_paypal_webhook,
+)
+from courses.app_logic.paypal import PayPalClient, PayPalError
+from courses.app_logic.template_cache import get_compiled_template
+from courses.settings import COURSES_PAYPAL_ORDERS_BUFFERED
 
 
 logger = logging.getLogger(__name__)
@@ -24,8 +39,9 @@ logger = logging.getLogger(__name__)
 
 @login_required
 def run_subscription_levels(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
-    subscribed = run.is_subscribed(request.user)
+    enrollment = get_enrollment(request, run_slug)
+    run = enrollment.run
+    subscribed = enrollment.subscribed
 
     subscription_levels = SubscriptionLevel.objects.filter(run=run).order_by('price')
     if subscription_levels.count() == 0:
@@ -37,10 +53,10 @@ def run_subscription_levels(request, run_slug):
     elif subscribed:
         total_subscription = 0
 
-        for level in run.get_subscription_level(request.user):
+        for level in enrollment.subscription_levels:
             total_subscription += level[1].price
 
-        if run.user_payment(request.user) >= total_subscription:
+        if enrollment.payment >= total_subscription:
             return redirect("course_run_detail", run_slug=run_slug)
         else:
             messages.warning(request, _("You are already subscribed to course: %(run)s.") % {"run": run})
@@ -81,10 +97,15 @@ def run_subscription_levels(request, run_slug):
 
 @login_required
 def run_payment_instructions(request, run_slug):
-    run = get_object_or_404(Run, slug=run_slug)
-    run_user = get_object_or_404(RunUsers, run=run, user=request.user)
+    enrollment = get_enrollment(request, run_slug)
+    run = enrollment.run
+
+    if not enrollment.subscribed:
+        raise Http404(_("You are not subscribed to this course!"))
+
+    run_user = enrollment.run_users[0]
     user_profile = get_object_or_404(Profile, user=request.user)
-    run_subscription_levels = run.get_subscription_level(request.user)  # Potentially delete
+    run_subscription_levels = enrollment.subscription_levels  # Potentially delete
     payment = run_user.payment
     total_subscription = run_user.price
 
@@ -101,7 +122,7 @@ def run_payment_instructions(request, run_slug):
     context = {
         "request": request,
         "run": run,
-        "subscribed": run.is_subscribed(request.user),
+        "subscribed": enrollment.subscribed,
         "subscribed_levels": run_subscription_levels,
         "run_user": run_user,
         "total_paid": payment,
@@ -180,69 +201,66 @@ def run_payment_instructions(request, run_slug):
 @login_required
 def verify_paypal_order(request, run_user_id, order_id):
 
-    run_user = get_object_or_404(RunUsers, id=run_user_id)
-    payment_profile = run_user.run.course.payment_profile
+    run_user = get_object_or_404(RunUsers.objects.select_related("run"), id=run_user_id, user=request.user)
 
     # Check whether PayPal is configured for the RunUser.Run.Course
-    if payment_profile and payment_profile.paypal and payment_profile.paypal.enabled \
-            and payment_profile.paypal.base_url and payment_profile.paypal.client_id and payment_profile.paypal.secret:
-        paypal = payment_profile.paypal
-    else:
+    if PayPalClient.from_payment_profile(run_user.run.course.payment_profile) is None:
         raise Http404(_("PayPal is not configured."))
 
-    consumer_key_secret = f"{paypal.client_id}:{paypal.secret}"
-    consumer_key_secret_enc = base64.b64encode(consumer_key_secret.encode()).decode()
+    paypal_order = record_paypal_order(order_id[:64], run_user_id=run_user.id)
 
-    headersAuth = {
-        "Authorization": 'Basic ' + str(consumer_key_secret_enc),
-    }
+    if not COURSES_PAYPAL_ORDERS_BUFFERED:
+        process_paypal_order(paypal_order)
 
-    data = {
-        "grant_type": "client_credentials",
-    }
+    if paypal_order.state == PayPalOrder.COMPLETED:
+        messages.success(request, _("Thank you for your payment."))
+    elif paypal_order.state == PayPalOrder.PENDING:
+        messages.info(
+            request, _("Thank you, your payment is being processed. ORDER ID: %(order_id)s") % {"order_id": order_id}
+        )
+    else:
+        raise BadRequest(_("Something went wrong with the order. Please contact support with ORDER ID: %s" % order_id))
 
-    # Authentication request
-    response = requests.post(f"{paypal.base_url}/v1/oauth2/token", headers=headersAuth, data=data, verify=True)
-    j = response.json()
+    return redirect("course_run_overview", run_slug=run_user.run.slug)
 
-    if "access_token" not in j:
-        raise BadRequest(_("PayPal Access Token missing. Please contact support with ORDER ID: %s" % order_id))
 
-    headersAPI = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {j['access_token']}",
-    }
+@csrf_exempt
+@require_POST
+def paypal_webhook(request, payment_profile_id):
+    """
+    Receives PayPal webhook events of the PaymentProfile, events verified by PayPal (see COURSES_PAYPAL_WEBHOOK_IDS)
+    are stored to the ledger and their orders are verified with PayPal API (right away or by `process_paypal_orders`
+    management command, see COURSES_PAYPAL_ORDERS_BUFFERED).
+    """
+    try:
+        event = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
 
-    response = requests.get(f"{paypal.base_url}/v2/checkout/orders/{order_id}", headers=headersAPI, verify=True)
-    order = response.json()
+    try:
+        verified = verify_paypal_webhook(payment_profile_id, request.headers, request.body)
+    except PayPalError:
+        # PayPal retries the event later
+        return HttpResponse(status=503)
 
-    if 'purchase_units' not in order:
-        raise BadRequest(_("Something went wrong with the order. Please contact support with ORDER ID: %s" % order_id))
-    else:
-        if 'reference_id' not in order['purchase_units'][0]:
-            raise BadRequest(_("Missing reference_id, can not pair with payment. Please contact support with "
-                               "ORDER ID: %s" % order_id))
-        # RunUsers.id == reference_id
-        if order['status'] != 'COMPLETED':
-            raise BadRequest(_("Order is not COMPLETED. If you have finished the payment please contact support with "
-                               "ORDER ID: %s" % order_id))
-
-        subscription = RunUsers.objects.get(id=order['purchase_units'][0]['reference_id'])
-        subscription.payment = order['purchase_units'][0]['amount']['value']
-        subscription.save()
-
-        logger.info("PayPal Order %s was matched with RunUser ID %s and updated with payment of %s %s", order_id,
-                    subscription.id, subscription.payment, order['purchase_units'][0]['amount']['currency_code'])
-        messages.success(request, _("Thank you for your payment."))
+    if not verified:
+        return HttpResponseBadRequest()
+
+    paypal_order = record_paypal_event(event)
+
+    if paypal_order is not None and not COURSES_PAYPAL_ORDERS_BUFFERED:
+        process_paypal_order(paypal_order)
 
-    return redirect("course_run_overview", run_slug=subscription.run.slug)
+    # PayPal retries events until it gets 2xx, repeated events are deduplicated by the ledger
+    return HttpResponse(status=204)
 
 
 @login_required
 def subscribe_to_run(request, run_slug):
-    if request.method == "POST":
-        run = get_object_or_404(Run, slug=run_slug)
+    # Needed by the redirect below even if the form has not been submitted
+    run = get_object_or_404(Run, slug=run_slug)
 
+    if request.method == "POST":
         if run.is_full:
             messages.error(request, _("Subscribed user's limit has been reached."))
         elif not run.get_setting("COURSES_ALLOW_SUBSCRIPTION_TO_RUNNING_COURSE") and run.start <= timezone.now().date():
@@ -276,13 +294,11 @@ def subscribe_to_run(request, run_slug):
                 defaults["subscription_level_id"] = form.cleaned_data["subscription_level"]
                 defaults["price"] = subscribed_level.price
 
-            # in M2M add will store to DB!
-            run.users.add(
-                request.user,
-                through_defaults=defaults,
-            )
+            # Checks the limit once more, atomically (concurrent subscriptions might have filled the run meanwhile)
+            if not run.enroll(request.user, through_defaults=defaults):
+                messages.error(request, _("Subscribed user's limit has been reached."))
+                return redirect("course_run_detail", run_slug=run_slug)
 
-            # run.save()  # No need to save run
             messages.success(request, _("You have been subscribed to course: %(run)s.") % {"run": run})
 
             mail_template = run.course.mail_subscription
@@ -291,8 +307,8 @@ def subscribe_to_run(request, run_slug):
             if mail_template:
                 send_templated_email(
                     request.user,
-                    mail_subject=mail_template.mail_subject,
-                    mail_body_html=mail_template.mail_body_html,
+                    mail_subject=get_compiled_template(mail_template, "mail_subject"),
+                    mail_body_html=get_compiled_template(mail_template, "mail_body_html"),
                     template_variables={
                         "user": request.user,
                         "course_run": run,